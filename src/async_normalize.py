@@ -0,0 +1,321 @@
+import asyncio
+import os
+import random
+import time
+from typing import AsyncIterator
+
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from compact_graph import CompactGraph
+from pre_normalize import DEFAULT_LABEL_SIMILARITY, PreNormalizationStats, label_similarity_from_args
+from normalize_bpmn import (
+    BATCH_PROMPT,
+    MALFORMED_BATCH_ERRORS,
+    PROMPT,
+    NormalizationRequest,
+    TokenUsage,
+    batch_completion_arguments,
+    cached_name_mapping,
+    combine_mappings,
+    completion_arguments,
+    lookup_prompts,
+    mapping_from_completion,
+    mappings_from_batch_completion,
+    pack_batches,
+    prepare_normalization,
+    store_name_mapping,
+    write_normalized_graphs,
+)
+
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_MAX_RETRIES = 6
+
+# Exponential backoff: BASE * 2^attempt seconds (plus jitter), capped at MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter: `rate` requests per second with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def backoff_delay(exc: Exception, attempt: int) -> float:
+    """
+    Delay before the next attempt; a Retry-After header from the server takes precedence.
+    """
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(BACKOFF_BASE * 2**attempt, BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+class AsyncNormalizer:
+    """
+    Normalizes many graph pairs concurrently with one shared AsyncOpenAI client (and connection pool).
+    At most `max_in_flight` requests run at once, requests are rate limited by a token bucket and
+    429/5xx/connection errors are retried with exponential backoff. Cached mappings skip the API
+    entirely; the client is only created on the first cache miss. `base_url` points the client at a
+    compatible server, e.g. a local mock (OPENAI_BASE_URL is honoured as well).
+    With `batch_tokens`, `normalize_pairs` packs several pairs into one request.
+    Labels matched locally (see `pre_normalize`) are sent once per match; `stats` records the savings
+    and `usage` the tokens spent. `requests` and `request_seconds` count the API calls and their
+    round-trip time, including retries.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        cache_path: str | None = None,
+        cache_only: bool = False,
+        base_url: str | None = None,
+        batch_tokens: int = 0,
+        label_similarity: float | None = DEFAULT_LABEL_SIMILARITY,
+    ):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        rate = requests_per_minute / 60.0
+        self.bucket = TokenBucket(rate, capacity=max(1.0, min(rate, max_in_flight)))
+        self.max_retries = max_retries
+        self.cache_path = cache_path
+        self.cache_only = cache_only
+        self.base_url = base_url
+        self.batch_tokens = batch_tokens
+        self.label_similarity = label_similarity
+        self.stats = PreNormalizationStats()
+        self.usage = TokenUsage()
+        self.requests = 0
+        self.request_seconds = 0.0
+        self.client: AsyncOpenAI | None = None
+
+    async def __aenter__(self) -> "AsyncNormalizer":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self.client is not None:
+            await self.client.close()
+
+    def _get_client(self) -> AsyncOpenAI:
+        if self.client is None:
+            load_dotenv(override=True)
+            # Retries are handled here so that they respect the rate limiter
+            self.client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=self.base_url or os.getenv("OPENAI_BASE_URL"),
+                max_retries=0,
+            )
+        return self.client
+
+    async def complete(self, completion_args: dict):
+        client = self._get_client()
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                for attempt in range(self.max_retries + 1):
+                    await self.bucket.acquire()
+                    try:
+                        return await client.beta.chat.completions.parse(**completion_args)
+                    except Exception as exc:
+                        if attempt == self.max_retries or not is_retryable(exc):
+                            raise
+                        await asyncio.sleep(backoff_delay(exc, attempt))
+            finally:
+                self.requests += 1
+                self.request_seconds += time.perf_counter() - start
+
+    async def name_mapping(self, graph1: CompactGraph, graph2: CompactGraph) -> dict:
+        pre_normalization, request = prepare_normalization(graph1, graph2, self.label_similarity)
+        self.stats.add(pre_normalization)
+        if request is None:
+            return pre_normalization.mapping
+
+        name_mapping = cached_name_mapping(request, self.cache_path, self.cache_only)
+        if name_mapping is None:
+            completion = await self.complete(completion_arguments(request))
+            name_mapping, usage = mapping_from_completion(completion, request)
+            self.usage.add(usage)
+            store_name_mapping(request, self.cache_path, name_mapping)
+        return combine_mappings(pre_normalization, name_mapping)
+
+    async def request_batch(self, requests: list[NormalizationRequest]) -> list[tuple[dict, TokenUsage, str]]:
+        """
+        Async counterpart of `normalize_bpmn.request_batch`; the halves of a malformed batch run concurrently.
+        """
+        if len(requests) == 1:
+            completion = await self.complete(completion_arguments(requests[0]))
+            return [(*mapping_from_completion(completion, requests[0]), PROMPT)]
+        try:
+            completion = await self.complete(batch_completion_arguments(requests))
+            return [
+                (*result, BATCH_PROMPT) for result in mappings_from_batch_completion(completion, requests)
+            ]
+        except MALFORMED_BATCH_ERRORS as e:
+            print(f"Malformed batch response for {len(requests)} pairs, splitting: {e}")
+        half = len(requests) // 2
+        first, second = await asyncio.gather(
+            self.request_batch(requests[:half]), self.request_batch(requests[half:])
+        )
+        return first + second
+
+    async def normalize(
+        self, graph1: CompactGraph, graph2: CompactGraph, source_file: str
+    ) -> tuple[CompactGraph, CompactGraph]:
+        name_mapping = await self.name_mapping(graph1, graph2)
+        return self._apply_mapping(graph1, graph2, name_mapping, source_file)
+
+    def _apply_mapping(
+        self, graph1: CompactGraph, graph2: CompactGraph, name_mapping: dict, source_file: str
+    ) -> tuple[CompactGraph, CompactGraph]:
+        graph1_normalized = graph1.normalize(name_mapping)
+        graph2_normalized = graph2.normalize(name_mapping)
+        write_normalized_graphs(graph1_normalized, graph2_normalized, name_mapping, source_file)
+        return graph1_normalized, graph2_normalized
+
+    async def normalize_pairs(
+        self, pairs: list[tuple[CompactGraph, CompactGraph, str]]
+    ) -> AsyncIterator[tuple[int, tuple[CompactGraph, CompactGraph] | Exception, TokenUsage, float]]:
+        """
+        Normalize (graph1, graph2, source_file) triples and yield (index, normalized pair, token usage,
+        seconds) as soon as each pair is done: resolved and cached pairs first, the others as their
+        batch request completes. A pair that fails is yielded with its exception instead of the
+        normalized pair. `seconds` is the time spent on the pair itself; the duration of a batch
+        request, including retries, is shared evenly between its pairs like the token usage.
+        """
+        prepared = [
+            prepare_normalization(graph1, graph2, self.label_similarity) for graph1, graph2, _ in pairs
+        ]
+        requests = [request for _, request in prepared]
+        prompts = lookup_prompts(self.batch_tokens)
+        missing = []
+        for index, (pre_normalization, request) in enumerate(prepared):
+            start = time.perf_counter()
+            self.stats.add(pre_normalization)
+            graph1, graph2, source_file = pairs[index]
+            try:
+                name_mapping = (
+                    cached_name_mapping(request, self.cache_path, self.cache_only, prompts)
+                    if request is not None
+                    else {}
+                )
+            except Exception as e:
+                yield index, e, TokenUsage(), time.perf_counter() - start
+                continue
+            if name_mapping is None:
+                missing.append(index)
+            else:
+                name_mapping = combine_mappings(pre_normalization, name_mapping)
+                normalized = self._apply_mapping(graph1, graph2, name_mapping, source_file)
+                yield index, normalized, TokenUsage(), time.perf_counter() - start
+
+        async def run(
+            indices: list[int],
+        ) -> tuple[list[int], list[tuple[dict, TokenUsage, str]] | Exception, float]:
+            start = time.perf_counter()
+            try:
+                results = await self.request_batch([requests[i] for i in indices])
+            except Exception as e:
+                results = e
+            return indices, results, time.perf_counter() - start
+
+        batches = pack_batches([requests[i] for i in missing], self.batch_tokens)
+        tasks = [run([missing[i] for i in batch]) for batch in batches]
+        for future in asyncio.as_completed(tasks):
+            indices, results, seconds = await future
+            seconds /= len(indices)
+            for position, index in enumerate(indices):
+                if isinstance(results, Exception):
+                    yield index, results, TokenUsage(), seconds
+                    continue
+                start = time.perf_counter()
+                name_mapping, usage, prompt = results[position]
+                self.usage.add(usage)
+                graph1, graph2, source_file = pairs[index]
+                store_name_mapping(requests[index], self.cache_path, name_mapping, prompt)
+                name_mapping = combine_mappings(prepared[index][0], name_mapping)
+                normalized = self._apply_mapping(graph1, graph2, name_mapping, source_file)
+                yield index, normalized, usage, seconds + time.perf_counter() - start
+
+
+def add_async_normalization_arguments(parser) -> None:
+    """
+    Add the options of the asynchronous normalization stage shared by the folder tools.
+    """
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help=f"Maximum concurrent normalization requests (default: {DEFAULT_MAX_IN_FLIGHT})",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=DEFAULT_REQUESTS_PER_MINUTE,
+        help=f"Rate limit for normalization requests (default: {DEFAULT_REQUESTS_PER_MINUTE})",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f"Retries on rate limit, server and connection errors (default: {DEFAULT_MAX_RETRIES})",
+    )
+    parser.add_argument(
+        "--openai-base-url",
+        type=str,
+        default=None,
+        help="Base URL of the OpenAI-compatible API, e.g. a local mock server (default: OPENAI_BASE_URL or the OpenAI API)",
+    )
+    parser.add_argument(
+        "--batch-tokens",
+        type=int,
+        default=0,
+        help="Pack several pairs into one normalization request of at most this many estimated payload tokens (default: 0, one request per pair)",
+    )
+
+
+def normalizer_from_args(args, cache_path: str | None) -> AsyncNormalizer:
+    return AsyncNormalizer(
+        max_in_flight=args.max_in_flight,
+        requests_per_minute=args.requests_per_minute,
+        max_retries=args.max_retries,
+        cache_path=cache_path,
+        cache_only=args.cache_only,
+        base_url=args.openai_base_url,
+        batch_tokens=args.batch_tokens,
+        label_similarity=label_similarity_from_args(args),
+    )
@@ -1,6 +1,10 @@
 """
 Compute the average similarity from a CSV file.
 
+Rows of failed pairs (a non-empty `error` column) are skipped. When a resumed run has written
+several rows for the same filename, only the last one counts. Empty values are skipped, and
+`--column passed` averages the outcomes of a --threshold run (True as 1), i.e. its pass rate.
+
 Usage:
     python src/average_similarity.py path/to/file.csv [--column similarity]
 """
@@ -11,15 +15,27 @@ from pathlib import Path
 from typing import Iterable
 
 
+def latest_rows(rows: Iterable[dict]) -> list[dict]:
+    latest: dict = {}
+    for index, row in enumerate(rows):
+        latest[row.get("filename", index)] = row
+    return list(latest.values())
+
+
 def read_column(rows: Iterable[dict], column: str) -> list[float]:
     values: list[float] = []
-    for row in rows:
+    for row in latest_rows(rows):
+        if row.get("error"):
+            continue
         if column not in row:
             raise ValueError(f"Column '{column}' not found in CSV headers: {list(row.keys())}")
+        value = row[column]
+        if value in ("", None):
+            continue
         try:
-            values.append(float(row[column]))
+            values.append(float({"True": 1, "False": 0}.get(str(value), value)))
         except ValueError as exc:
-            raise ValueError(f"Could not parse '{row[column]}' in column '{column}' as float") from exc
+            raise ValueError(f"Could not parse '{value}' in column '{column}' as float") from exc
     return values
 
 
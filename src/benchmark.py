@@ -0,0 +1,233 @@
+"""
+Benchmark the pipeline stages on synthetic model pairs from `bpmn_generator`.
+
+For every size, pairs are generated, written to a temporary folder and run through parsing,
+normalization (an offline oracle in place of the LLM), `to_digraph`, GED with every engine and,
+if pm4py is installed, `conformance_eval.process_file_pair`. The runner reports the mean and
+maximum time, the peak traced memory and, for the GED engines, the share of proven optimal results.
+
+Usage:
+    python src/benchmark.py --sizes 5 10 20 --pairs 5 --engines astar bipartite --output bench.csv
+"""
+
+import argparse
+import csv
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from bpmn_generator import add_generator_arguments, generate_pair, oracle_name_mapping
+from ged import GED_ENGINES, compare_graphs
+from parse_bpmn import parse_bpmn_compact
+
+STAGES = ("parse", "normalize", "to_digraph", "ged", "conformance")
+
+# Shorter than the default budget of the tools, so that a run over all sizes finishes in minutes
+BENCHMARK_TIME_BUDGET = 10.0
+
+
+@dataclass
+class Measurement:
+    stage: str
+    engine: str
+    size: int
+    pair: int
+    nodes: int
+    seconds: float
+    peak_mb: float | None
+    optimal: bool | None = None
+    ged: float | None = None
+
+
+def measure(fn: Callable[[], Any], trace_memory: bool) -> tuple[Any, float, float | None]:
+    """
+    Run `fn` once for its wall time and, with `trace_memory`, once more under tracemalloc for
+    its peak allocation, so that the tracing overhead does not distort the timing.
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    if not trace_memory:
+        return result, seconds, None
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+def conformance_stage() -> Callable[[dict], tuple] | None:
+    try:
+        from conformance_eval import process_file_pair
+    except ImportError:
+        return None
+    return process_file_pair
+
+
+def run_benchmark(
+    sizes: list[int],
+    pairs: int,
+    perturbation: float,
+    seed: int,
+    engines: list[str],
+    time_budget: float = BENCHMARK_TIME_BUDGET,
+    stages: tuple[str, ...] | list[str] = STAGES,
+    trace_memory: bool = True,
+    traces: int = 50,
+) -> list[Measurement]:
+    measurements = []
+    conformance = conformance_stage() if "conformance" in stages else None
+    if "conformance" in stages and conformance is None:
+        print("pm4py is not installed; skipping the conformance stage")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for i in range(pairs):
+                ground_truth, generated, renames = generate_pair(size, perturbation, seed + 1000 * size + 2 * i)
+                paths = []
+                for role, model in (("ground_truth", ground_truth), ("generated", generated)):
+                    path = Path(directory) / f"{role}_{size}_{i}.bpmn"
+                    path.write_text(model.to_xml())
+                    paths.append(str(path))
+
+                def record(stage: str, fn: Callable[[], Any], engine: str = "") -> Any:
+                    result, seconds, peak = measure(fn, trace_memory)
+                    measurements.append(
+                        Measurement(stage, engine, size, i, len(ground_truth.nodes), seconds, peak)
+                    )
+                    return result
+
+                graph_1, graph_2 = record(
+                    "parse", lambda: (parse_bpmn_compact(paths[0]), parse_bpmn_compact(paths[1]))
+                )
+                name_mapping = oracle_name_mapping(graph_1.labels() | graph_2.labels(), renames)
+                normalized_1, normalized_2 = record(
+                    "normalize", lambda: (graph_1.normalize(name_mapping), graph_2.normalize(name_mapping))
+                )
+                if "to_digraph" in stages:
+                    record("to_digraph", lambda: (normalized_1.to_digraph(), normalized_2.to_digraph()))
+                if "ged" in stages:
+                    for engine in engines:
+                        result = record(
+                            "ged", lambda: compare_graphs(normalized_1, normalized_2, engine, time_budget), engine
+                        )
+                        measurements[-1].optimal = result.optimal
+                        measurements[-1].ged = result.ged
+                if conformance is not None:
+                    args = {
+                        "filename": f"{size}_{i}",
+                        "ground_truth_path": paths[0],
+                        "generated_path": paths[1],
+                        "traces": traces,
+                        "max_trace_length": 50,
+                        "seed": seed,
+                        "mapping": name_mapping,
+                        "artifact_cache": None,
+                        "instrument": False,
+                    }
+                    _, error = record("conformance", lambda: conformance(args))
+                    if error:
+                        print(f"Conformance failed for size {size}, pair {i}: {error}")
+
+    return [m for m in measurements if m.stage in stages]
+
+
+def summarize(measurements: list[Measurement]) -> list[dict]:
+    groups: dict[tuple, list[Measurement]] = defaultdict(list)
+    for m in measurements:
+        groups[(m.stage, m.engine, m.size)].append(m)
+    rows = []
+    for (stage, engine, size), group in groups.items():
+        peaks = [m.peak_mb for m in group if m.peak_mb is not None]
+        optimal = [m.optimal for m in group if m.optimal is not None]
+        rows.append({
+            "stage": stage,
+            "engine": engine,
+            "size": size,
+            "nodes": round(statistics.mean(m.nodes for m in group), 1),
+            "runs": len(group),
+            "mean_s": statistics.mean(m.seconds for m in group),
+            "max_s": max(m.seconds for m in group),
+            "peak_mb": max(peaks) if peaks else None,
+            "optimal_rate": sum(optimal) / len(optimal) if optimal else None,
+        })
+    return rows
+
+
+def print_summary(rows: list[dict]) -> None:
+    print(f"{'stage':<12}{'engine':<11}{'size':>5}{'nodes':>7}{'runs':>6}{'mean s':>10}{'max s':>10}{'peak MB':>9}{'optimal':>9}")
+    for row in rows:
+        peak = f"{row['peak_mb']:.2f}" if row["peak_mb"] is not None else "-"
+        optimal = f"{row['optimal_rate']:.0%}" if row["optimal_rate"] is not None else "-"
+        print(
+            f"{row['stage']:<12}{row['engine']:<11}{row['size']:>5}{row['nodes']:>7}{row['runs']:>6}"
+            f"{row['mean_s']:>10.4f}{row['max_s']:>10.4f}{peak:>9}{optimal:>9}"
+        )
+
+
+def write_measurements(measurements: list[Measurement], output_file: str) -> None:
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(asdict(measurements[0]).keys()))
+        writer.writeheader()
+        writer.writerows(asdict(m) for m in measurements)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark parsing, GED and conformance on synthetic BPMN pairs")
+    add_generator_arguments(parser)
+    parser.add_argument(
+        "--engines",
+        choices=GED_ENGINES,
+        nargs="+",
+        default=list(GED_ENGINES),
+        help="GED engines to benchmark (default: all)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=BENCHMARK_TIME_BUDGET,
+        help=f"Seconds an exact GED search may run per pair (default: {BENCHMARK_TIME_BUDGET:g})",
+    )
+    parser.add_argument(
+        "--stages",
+        choices=STAGES,
+        nargs="+",
+        default=list(STAGES),
+        help="Stages to benchmark (default: all; conformance needs pm4py)",
+    )
+    parser.add_argument(
+        "--traces", type=int, default=50, help="Simulated traces per pair in the conformance stage (default: 50)"
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Skip the second, memory-traced run of every stage",
+    )
+    parser.add_argument("--output", type=str, default=None, help="CSV file for the individual measurements")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    measurements = run_benchmark(
+        args.sizes,
+        args.pairs,
+        args.perturbation,
+        args.seed,
+        args.engines,
+        args.time_budget,
+        args.stages,
+        not args.no_memory,
+        args.traces,
+    )
+    print_summary(summarize(measurements))
+    if args.output and measurements:
+        write_measurements(measurements, args.output)
+        print(f"Measurements saved to: {args.output}")
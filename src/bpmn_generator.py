@@ -0,0 +1,249 @@
+import argparse
+import json
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+from pre_normalize import canonical_label
+
+# Verbs with their synonyms; a synonym rename keeps the meaning, so normalization should undo it
+VERBS = {
+    "Receive": ["Get", "Accept"],
+    "Check": ["Verify", "Inspect"],
+    "Send": ["Dispatch", "Transmit"],
+    "Create": ["Prepare", "Draft"],
+    "Approve": ["Authorize", "Confirm"],
+    "Update": ["Modify", "Amend"],
+    "Archive": ["Store", "File"],
+    "Notify": ["Inform", "Alert"],
+    "Calculate": ["Compute", "Determine"],
+    "Review": ["Assess", "Evaluate"],
+    "Register": ["Record", "Log"],
+    "Cancel": ["Abort", "Revoke"],
+}
+OBJECTS = [
+    "order", "invoice", "payment", "customer", "shipment", "contract", "claim", "request",
+    "report", "account", "delivery", "application", "quote", "refund", "ticket", "document",
+]
+CONDITIONS = [("approved", "rejected"), ("yes", "no"), ("in stock", "out of stock"), ("valid", "invalid")]
+
+BLOCK_KINDS = ("sequence", "xor", "and", "loop")
+
+
+@dataclass
+class GeneratedModel:
+    """
+    A generated BPMN process: nodes as id -> (type, name) and flows as (source, target, name).
+    """
+
+    nodes: dict[str, tuple[str, str | None]] = field(default_factory=dict)
+    flows: list[tuple[str, str, str | None]] = field(default_factory=list)
+
+    def add_node(self, node_type: str, name: str | None = None) -> str:
+        node_id = f"{node_type[0].upper()}{node_type[1:]}_{len(self.nodes) + 1}"
+        while node_id in self.nodes:
+            node_id += "_"
+        self.nodes[node_id] = (node_type, name)
+        return node_id
+
+    def tasks(self) -> list[str]:
+        return [node_id for node_id, (node_type, _) in self.nodes.items() if node_type == "task"]
+
+    def to_xml(self, process_id: str = "Process_1") -> str:
+        elements = [
+            f"    <{node_type} id={quoteattr(node_id)}" + (f" name={quoteattr(name)}" if name else "") + " />"
+            for node_id, (node_type, name) in self.nodes.items()
+        ]
+        elements += [
+            f"    <sequenceFlow id=\"Flow_{i}\" sourceRef={quoteattr(source)} targetRef={quoteattr(target)}"
+            + (f" name={quoteattr(name)}" if name else "") + " />"
+            for i, (source, target, name) in enumerate(self.flows, 1)
+        ]
+        return "\n".join([
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL" '
+            'id="Definitions_1" targetNamespace="http://bpmn.io/schema/bpmn">',
+            f'  <process id="{process_id}" isExecutable="false">',
+            *elements,
+            "  </process>",
+            "</definitions>",
+            "",
+        ])
+
+
+class _Generator:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.model = GeneratedModel()
+        labels = [f"{verb} {obj}" for verb in VERBS for obj in OBJECTS]
+        rng.shuffle(labels)
+        self.labels = iter(labels)
+
+    def task(self) -> tuple[str, str]:
+        node = self.model.add_node("task", next(self.labels))
+        return node, node
+
+    def block(self, tasks: int, depth: int) -> tuple[str, str]:
+        """
+        Build a single-entry-single-exit block with about `tasks` tasks; returns its entry and exit nodes.
+        """
+        if tasks <= 1:
+            return self.task()
+        kind = "sequence" if depth >= 3 or tasks < 3 else self.rng.choice(BLOCK_KINDS)
+        if kind == "loop":
+            merge = self.model.add_node("exclusiveGateway")
+            entry, exit = self.block(tasks - 1, depth + 1)
+            split = self.model.add_node("exclusiveGateway")
+            self.model.flows += [(merge, entry, None), (exit, split, None), (split, merge, "repeat")]
+            return merge, split
+
+        parts = self.split(tasks, 2 if kind == "sequence" else self.rng.choice((2, 2, 3)))
+        children = [self.block(part, depth + 1) for part in parts]
+        if kind == "sequence":
+            for (_, exit), (entry, _) in zip(children, children[1:]):
+                self.model.flows.append((exit, entry, None))
+            return children[0][0], children[-1][1]
+
+        gateway = "exclusiveGateway" if kind == "xor" else "parallelGateway"
+        split = self.model.add_node(gateway)
+        join = self.model.add_node(gateway)
+        conditions = list(self.rng.choice(CONDITIONS)) + ["otherwise"] if kind == "xor" else []
+        for i, (entry, exit) in enumerate(children):
+            self.model.flows += [(split, entry, conditions[i] if conditions else None), (exit, join, None)]
+        return split, join
+
+    def split(self, tasks: int, parts: int) -> list[int]:
+        parts = min(parts, tasks)
+        cuts = sorted(self.rng.sample(range(1, tasks), parts - 1))
+        return [end - start for start, end in zip([0] + cuts, cuts + [tasks])]
+
+
+def generate_model(tasks: int, seed: int) -> GeneratedModel:
+    """
+    Generate a valid, block-structured BPMN process with `tasks` tasks (at most the vocabulary size):
+    sequences, XOR and AND gateway blocks with labeled conditions, and loops, between one start and
+    one end event. The same seed always gives the same model.
+    """
+    generator = _Generator(random.Random(seed))
+    start = generator.model.add_node("startEvent", "Start")
+    entry, exit = generator.block(min(tasks, len(VERBS) * len(OBJECTS)), 0)
+    end = generator.model.add_node("endEvent", "End")
+    generator.model.flows += [(start, entry, None), (exit, end, None)]
+    return generator.model
+
+
+def perturb_model(model: GeneratedModel, level: float, seed: int) -> tuple[GeneratedModel, dict[str, str]]:
+    """
+    Copy of the model with about `level` times its task count random edits, as a generated model
+    would differ from its ground truth: synonym renames, spelling variants (case and punctuation),
+    deleted, inserted and swapped tasks. Returns the copy and the renames as variant -> original
+    label, i.e. the mapping a perfect normalization would find.
+    """
+    rng = random.Random(seed)
+    perturbed = GeneratedModel(dict(model.nodes), list(model.flows))
+    renames: dict[str, str] = {}
+    inserted_tasks = 0
+    for _ in range(round(level * len(model.tasks()))):
+        tasks = perturbed.tasks()
+        if not tasks:
+            break
+        edit = rng.choice(("synonym", "spelling", "delete", "insert", "swap"))
+        node = rng.choice(tasks)
+        node_type, name = perturbed.nodes[node]
+        if edit == "synonym":
+            verb, _, rest = name.partition(" ")
+            if verb in VERBS:
+                variant = f"{rng.choice(VERBS[verb])} {rest}"
+                renames[variant] = renames.pop(name, name)
+                perturbed.nodes[node] = (node_type, variant)
+        elif edit == "spelling":
+            variant = rng.choice((name.lower(), name.upper(), f"{name}.", f"{name}!"))
+            perturbed.nodes[node] = (node_type, variant)
+            if name in renames:
+                renames[variant] = renames.pop(name)
+        elif edit == "delete":
+            incoming = [flow for flow in perturbed.flows if flow[1] == node]
+            outgoing = [flow for flow in perturbed.flows if flow[0] == node]
+            if len(incoming) == 1 and len(outgoing) == 1:
+                perturbed.flows = [flow for flow in perturbed.flows if node not in flow[:2]]
+                perturbed.flows.append((incoming[0][0], outgoing[0][1], incoming[0][2]))
+                del perturbed.nodes[node]
+        elif edit == "insert":
+            inserted_tasks += 1
+            index = rng.randrange(len(perturbed.flows))
+            source, target, name = perturbed.flows[index]
+            inserted = perturbed.add_node("task", f"Handle exception {inserted_tasks}")
+            perturbed.flows[index : index + 1] = [(source, inserted, name), (inserted, target, None)]
+        else:
+            other = rng.choice(tasks)
+            perturbed.nodes[node], perturbed.nodes[other] = perturbed.nodes[other], perturbed.nodes[node]
+    return perturbed, renames
+
+
+def generate_pair(tasks: int, level: float, seed: int) -> tuple[GeneratedModel, GeneratedModel, dict[str, str]]:
+    """
+    A ground-truth model and a perturbed "generated" counterpart, with the renames between them.
+    """
+    ground_truth = generate_model(tasks, seed)
+    generated, renames = perturb_model(ground_truth, level, seed + 1)
+    return ground_truth, generated, renames
+
+
+def oracle_name_mapping(labels: set[str], renames: dict[str, str]) -> dict[str, str]:
+    """
+    Offline stand-in for the LLM normalization of a generated pair: every label is mapped to the
+    canonical form of its original label, so synonyms and spelling variants get the same name.
+    """
+    return {label: canonical_label(renames.get(label, label)) for label in labels}
+
+
+def write_pairs(output_dir: str, sizes: list[int], pairs: int, level: float, seed: int) -> None:
+    """
+    Write ground_truth/ and generated/ folders for the folder tools, with `pairs` pairs per size,
+    and renames.json with the renames of every pair.
+    """
+    ground_truth_dir = Path(output_dir) / "ground_truth"
+    generated_dir = Path(output_dir) / "generated"
+    ground_truth_dir.mkdir(parents=True, exist_ok=True)
+    generated_dir.mkdir(parents=True, exist_ok=True)
+    all_renames = {}
+    for size in sizes:
+        for i in range(pairs):
+            filename = f"model_{size:04d}_{i:03d}.bpmn"
+            ground_truth, generated, renames = generate_pair(size, level, seed + 1000 * size + 2 * i)
+            (ground_truth_dir / filename).write_text(ground_truth.to_xml())
+            (generated_dir / filename).write_text(generated.to_xml())
+            all_renames[filename] = renames
+    with open(Path(output_dir) / "renames.json", "w") as f:
+        json.dump(all_renames, f, indent=2)
+
+
+def add_generator_arguments(parser) -> None:
+    """
+    Add the synthetic model options shared by the generator and the benchmark.
+    """
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[5, 10, 20, 40],
+        help="Numbers of tasks of the generated models (default: 5 10 20 40)",
+    )
+    parser.add_argument("--pairs", type=int, default=5, help="Pairs per size (default: 5)")
+    parser.add_argument(
+        "--perturbation",
+        type=float,
+        default=0.2,
+        help="Edits of a generated model per task of its ground truth (default: 0.2)",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic ground-truth/generated BPMN pairs")
+    parser.add_argument("output_dir", type=str, help="Directory for the ground_truth and generated folders")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    write_pairs(args.output_dir, args.sizes, args.pairs, args.perturbation, args.seed)
+    print(f"Wrote {len(args.sizes) * args.pairs} pairs to {args.output_dir}")
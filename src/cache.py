@@ -0,0 +1,286 @@
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import time
+from typing import Any
+
+DEFAULT_CACHE_DIR = ".cache"
+
+# Size limit of the values stored in one cache table before the least recently used entries are evicted
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+DEFAULT_NORMALIZATION_CACHE = os.path.join(DEFAULT_CACHE_DIR, "normalization.sqlite")
+NORMALIZATION_TABLE = "normalizations"
+
+DEFAULT_PARSE_CACHE = os.path.join(DEFAULT_CACHE_DIR, "parsed")
+
+DEFAULT_CONFORMANCE_CACHE = os.path.join(DEFAULT_CACHE_DIR, "conformance")
+
+# GED results share the database file of the normalization mappings by default
+DEFAULT_GED_CACHE = DEFAULT_NORMALIZATION_CACHE
+GED_TABLE = "ged"
+
+
+class SQLiteCache:
+    """
+    Persistent key-value store for JSON-serialisable values, backed by one SQLite table.
+    Several tables (e.g. normalization mappings and GED results) can share a database file.
+    Once the stored values exceed `max_bytes`, the least recently used entries are evicted.
+    Hit and miss counters are persisted, so statistics cover all processes using the cache.
+    """
+
+    def __init__(self, path: str, table: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path, timeout=60.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_counters ("
+                "name TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0)"
+            )
+            self.connection.execute(
+                "INSERT OR IGNORE INTO cache_counters (name) VALUES (?)", (table,)
+            )
+
+    def get(self, key: str, count: bool = True) -> Any | None:
+        """
+        Look up `key`. With `count=False` the lookup is not added to the hit and miss counters, so a
+        caller probing several keys for one value can record a single outcome with `count_lookup`.
+        """
+        row = self.connection.execute(
+            f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        with self.connection:
+            if row is not None:
+                self.connection.execute(
+                    f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (time.time(), key)
+                )
+            if count:
+                self._count(row is not None)
+        return json.loads(row[0]) if row is not None else None
+
+    def count_lookup(self, hit: bool) -> None:
+        with self.connection:
+            self._count(hit)
+
+    def _count(self, hit: bool) -> None:
+        column = "hits" if hit else "misses"
+        self.connection.execute(
+            f"UPDATE cache_counters SET {column} = {column} + 1 WHERE name = ?", (self.table,)
+        )
+
+    def put(self, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self.connection.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY last_access ASC"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.connection.executemany(f"DELETE FROM {self.table} WHERE key = ?", evicted)
+
+    def stats(self) -> dict:
+        entries, size = self.connection.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()
+        hits, misses = self.connection.execute(
+            "SELECT hits, misses FROM cache_counters WHERE name = ?", (self.table,)
+        ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": hits, "misses": misses}
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class PickleDirCache:
+    """
+    Persistent store for Python objects (parsed graphs, Petri nets, ...) as one pickle file per key.
+    Files are written atomically, so several processes can share the directory. Unreadable entries
+    count as misses. Keys must be content hashes that change whenever the value would; there is no
+    eviction, the directory can simply be deleted.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+    def get(self, key: str) -> Any | None:
+        try:
+            with open(self._path(key), "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def stats(self) -> dict:
+        entries = size = 0
+        for directory, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".pkl"):
+                    entries += 1
+                    size += os.path.getsize(os.path.join(directory, name))
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+def cache_stats(path: str | None, table: str) -> dict | None:
+    # Use a short-lived connection so that no SQLite handle is inherited by forked workers
+    if not path:
+        return None
+    cache = SQLiteCache(path, table)
+    try:
+        return cache.stats()
+    finally:
+        cache.close()
+
+
+def print_cache_stats(label: str, before: dict | None, after: dict | None) -> None:
+    """
+    Print the hits and misses between two `cache_stats` snapshots, i.e. those of one run.
+    """
+    if before is None or after is None:
+        return
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    print(
+        f"{label} cache: {hits} hits, {misses} misses "
+        f"({after['entries']} entries, {after['bytes'] / 1e6:.1f} MB)"
+    )
+
+
+def add_normalization_cache_arguments(parser) -> None:
+    """
+    Add the normalization cache options shared by the command line tools.
+    """
+    parser.add_argument(
+        "--normalization-cache",
+        type=str,
+        default=DEFAULT_NORMALIZATION_CACHE,
+        help=f"SQLite file caching LLM label mappings (default: {DEFAULT_NORMALIZATION_CACHE})",
+    )
+    parser.add_argument(
+        "--no-normalization-cache",
+        action="store_true",
+        help="Always call the LLM and do not read or write the normalization cache.",
+    )
+    parser.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Offline mode: use cached normalizations only and fail pairs that are not cached.",
+    )
+
+
+def normalization_cache_path(args) -> str | None:
+    if args.no_normalization_cache:
+        if args.cache_only:
+            raise SystemExit("--cache-only cannot be combined with --no-normalization-cache")
+        return None
+    return args.normalization_cache
+
+
+def add_parse_cache_arguments(parser) -> None:
+    """
+    Add the parsed-graph cache options shared by the command line tools.
+    """
+    parser.add_argument(
+        "--parse-cache",
+        type=str,
+        default=DEFAULT_PARSE_CACHE,
+        help=f"Directory caching parsed BPMN graphs by file content (default: {DEFAULT_PARSE_CACHE})",
+    )
+    parser.add_argument(
+        "--no-parse-cache",
+        action="store_true",
+        help="Always parse the BPMN files and do not read or write the parse cache.",
+    )
+
+
+def parse_cache_dir(args) -> str | None:
+    return None if args.no_parse_cache else args.parse_cache
+
+
+def add_ged_cache_arguments(parser) -> None:
+    """
+    Add the GED result cache options shared by the command line tools.
+    """
+    parser.add_argument(
+        "--ged-cache",
+        type=str,
+        default=DEFAULT_GED_CACHE,
+        help=f"SQLite file caching GED results by graph fingerprint (default: {DEFAULT_GED_CACHE})",
+    )
+    parser.add_argument(
+        "--no-ged-cache",
+        action="store_true",
+        help="Always compute the GED and do not read or write the GED cache.",
+    )
+
+
+def ged_cache_path(args) -> str | None:
+    return None if args.no_ged_cache else args.ged_cache
+
+
+def add_conformance_cache_arguments(parser) -> None:
+    """
+    Add the options of the cache for Petri nets and simulated logs used by conformance checking.
+    """
+    parser.add_argument(
+        "--conformance-cache",
+        type=str,
+        default=DEFAULT_CONFORMANCE_CACHE,
+        help=f"Directory caching converted Petri nets and simulated logs (default: {DEFAULT_CONFORMANCE_CACHE})",
+    )
+    parser.add_argument(
+        "--no-conformance-cache",
+        action="store_true",
+        help="Always convert the models and simulate the logs, and do not read or write the cache.",
+    )
+
+
+def conformance_cache_dir(args) -> str | None:
+    return None if args.no_conformance_cache else args.conformance_cache
@@ -0,0 +1,234 @@
+import sys
+from typing import Iterable
+
+import networkx as nx
+import numpy as np
+
+from schemas import BPMNGraph, Edge, NormalizedBPMNGraph, NormalizedEdge, NormalizedNode, Node
+
+
+def _intern(value: str | None) -> str | None:
+    return sys.intern(value) if value is not None else None
+
+
+class CompactGraph:
+    """
+    Array-backed BPMN graph, built once per file and shared by normalization, GED and conformance code.
+    Node attributes are stored as parallel tuples of interned strings, edges as arrays of node indices.
+    `normalized_names` and `edge_normalized_names` are None until the graph has been normalized.
+    Edges follow DiGraph semantics: at most one edge per (source, target) pair, the last one wins.
+    """
+
+    __slots__ = (
+        "ids",
+        "types",
+        "names",
+        "normalized_names",
+        "sources",
+        "targets",
+        "edge_names",
+        "edge_normalized_names",
+    )
+
+    def __init__(
+        self,
+        ids: tuple,
+        types: tuple,
+        names: tuple,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        edge_names: tuple,
+        normalized_names: tuple | None = None,
+        edge_normalized_names: tuple | None = None,
+    ):
+        self.ids = ids
+        self.types = types
+        self.names = names
+        self.normalized_names = normalized_names
+        self.sources = sources
+        self.targets = targets
+        self.edge_names = edge_names
+        self.edge_normalized_names = edge_normalized_names
+
+    @classmethod
+    def build(
+        cls,
+        nodes: Iterable[tuple[str, str, str | None]],
+        edges: Iterable[tuple[str, str, str | None]],
+        normalized_nodes: Iterable[str | None] | None = None,
+        normalized_edges: Iterable[str | None] | None = None,
+    ) -> "CompactGraph":
+        """
+        Build a graph from (id, type, name) node tuples and (source, target, name) edge tuples,
+        optionally with the normalized names of the nodes and edges in the same order.
+        """
+        nodes = list(nodes)
+        ids = tuple(sys.intern(node_id) for node_id, _, _ in nodes)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        if len(index) != len(ids):
+            raise ValueError("Duplicate node ids in BPMN graph.")
+
+        edge_list = list(edges)
+        edge_normalized = list(normalized_edges) if normalized_edges is not None else [None] * len(edge_list)
+        unique_edges: dict[tuple[int, int], tuple[str | None, str | None]] = {}
+        for (source, target, name), normalized_name in zip(edge_list, edge_normalized):
+            if source not in index or target not in index:
+                raise ValueError(f"Edge {source} -> {target} references an unknown node.")
+            unique_edges[(index[source], index[target])] = (_intern(name), _intern(normalized_name))
+
+        endpoints = np.array(list(unique_edges.keys()), dtype=np.int32).reshape(-1, 2)
+        return cls(
+            ids=ids,
+            types=tuple(sys.intern(node_type) for _, node_type, _ in nodes),
+            names=tuple(_intern(name) for _, _, name in nodes),
+            sources=endpoints[:, 0].copy(),
+            targets=endpoints[:, 1].copy(),
+            edge_names=tuple(name for name, _ in unique_edges.values()),
+            normalized_names=(
+                tuple(_intern(name) for name in normalized_nodes) if normalized_nodes is not None else None
+            ),
+            edge_normalized_names=(
+                tuple(name for _, name in unique_edges.values()) if normalized_edges is not None else None
+            ),
+        )
+
+    @classmethod
+    def from_bpmn_graph(cls, graph: BPMNGraph) -> "CompactGraph":
+        return cls.build(
+            ((node.id, node.type, node.name) for node in graph.nodes),
+            ((edge.source, edge.target, edge.name) for edge in graph.edges),
+        )
+
+    @classmethod
+    def from_normalized_graph(cls, graph: NormalizedBPMNGraph) -> "CompactGraph":
+        return cls.build(
+            ((node.id, node.type, node.original_name) for node in graph.nodes),
+            ((edge.source, edge.target, edge.original_name) for edge in graph.edges),
+            (node.normalized_name for node in graph.nodes),
+            (edge.normalized_name for edge in graph.edges),
+        )
+
+    @property
+    def is_normalized(self) -> bool:
+        return self.normalized_names is not None
+
+    def number_of_nodes(self) -> int:
+        return len(self.ids)
+
+    def number_of_edges(self) -> int:
+        return len(self.sources)
+
+    def labels(self) -> set[str]:
+        """
+        All node and edge labels (original names) of the graph.
+        """
+        return {name for name in self.names + self.edge_names if name}
+
+    def normalize(self, name_mapping: dict) -> "CompactGraph":
+        """
+        Return a copy of the graph whose normalized names are looked up in `name_mapping`.
+        Unlabeled elements and labels missing from the mapping get no normalized name.
+        """
+        return CompactGraph(
+            ids=self.ids,
+            types=self.types,
+            names=self.names,
+            sources=self.sources,
+            targets=self.targets,
+            edge_names=self.edge_names,
+            normalized_names=tuple(_intern(name_mapping.get(name)) if name else None for name in self.names),
+            edge_normalized_names=tuple(
+                _intern(name_mapping.get(name)) if name else None for name in self.edge_names
+            ),
+        )
+
+    def subgraph(self, nodes: Iterable[int]) -> "CompactGraph":
+        """
+        Return the subgraph induced by the given node indices, keeping their ids and normalized names.
+        """
+        nodes = np.asarray(sorted(nodes), dtype=np.int64)
+        index = np.full(len(self.ids), -1, dtype=np.int64)
+        index[nodes] = np.arange(len(nodes))
+        kept = np.nonzero((index[self.sources] >= 0) & (index[self.targets] >= 0))[0].tolist()
+
+        def pick(values: tuple | None, indices: list[int]) -> tuple | None:
+            return tuple(values[i] for i in indices) if values is not None else None
+
+        selected = nodes.tolist()
+        return CompactGraph(
+            ids=pick(self.ids, selected),
+            types=pick(self.types, selected),
+            names=pick(self.names, selected),
+            sources=index[self.sources[kept]].astype(np.int32),
+            targets=index[self.targets[kept]].astype(np.int32),
+            edge_names=pick(self.edge_names, kept),
+            normalized_names=pick(self.normalized_names, selected),
+            edge_normalized_names=pick(self.edge_normalized_names, kept),
+        )
+
+    def edges(self) -> Iterable[tuple[str, str]]:
+        return ((self.ids[s], self.ids[t]) for s, t in zip(self.sources.tolist(), self.targets.tolist()))
+
+    def to_bpmn_graph(self) -> BPMNGraph:
+        # The compact graph is already consistent, so the pydantic models skip validation
+        return BPMNGraph.model_construct(
+            nodes=[
+                Node.model_construct(id=node_id, type=node_type, name=name)
+                for node_id, node_type, name in zip(self.ids, self.types, self.names)
+            ],
+            edges=[
+                Edge.model_construct(source=source, target=target, name=name)
+                for (source, target), name in zip(self.edges(), self.edge_names)
+            ],
+        )
+
+    def to_normalized_graph(self) -> NormalizedBPMNGraph:
+        if not self.is_normalized:
+            raise ValueError("Graph has not been normalized.")
+        return NormalizedBPMNGraph.model_construct(
+            nodes=[
+                NormalizedNode.model_construct(
+                    id=node_id, type=node_type, original_name=name, normalized_name=normalized_name
+                )
+                for node_id, node_type, name, normalized_name in zip(
+                    self.ids, self.types, self.names, self.normalized_names
+                )
+            ],
+            edges=[
+                NormalizedEdge.model_construct(
+                    source=source, target=target, original_name=name, normalized_name=normalized_name
+                )
+                for (source, target), name, normalized_name in zip(
+                    self.edges(), self.edge_names, self.edge_normalized_names
+                )
+            ],
+        )
+
+    def to_digraph(self) -> nx.DiGraph:
+        """
+        Convert a normalized graph into a DiGraph with the node and edge attributes used by the GED costs.
+        """
+        if not self.is_normalized:
+            raise ValueError("Graph has not been normalized.")
+        G = nx.DiGraph()
+        G.add_nodes_from(
+            (node_id, {"type": node_type, "original_name": name, "normalized_name": normalized_name})
+            for node_id, node_type, name, normalized_name in zip(
+                self.ids, self.types, self.names, self.normalized_names
+            )
+        )
+        G.add_edges_from(
+            (source, target, {"original_name": name, "normalized_name": normalized_name})
+            for (source, target), name, normalized_name in zip(
+                self.edges(), self.edge_names, self.edge_normalized_names
+            )
+        )
+        return G
+
+
+def as_compact(graph: BPMNGraph | NormalizedBPMNGraph | CompactGraph) -> CompactGraph:
+    if isinstance(graph, CompactGraph):
+        return graph
+    if isinstance(graph, NormalizedBPMNGraph):
+        return CompactGraph.from_normalized_graph(graph)
+    return CompactGraph.from_bpmn_graph(graph)
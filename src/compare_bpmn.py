@@ -1,29 +1,105 @@
 import argparse
+import sys
 
-from ged import compute_ged, compute_rged
-from parse_bpmn import parse_bpmn
-from schemas import BPMNGraph
-from normalize_bpmn import normalize_graphs
+from ged import DEFAULT_TIME_BUDGET, GED_ENGINES, compare_graphs, similarity_at_least
+from compact_graph import CompactGraph
+from fragments import add_decomposition_arguments, max_fragment_size
+from parse_bpmn import parse_bpmn_compact
+from cache import (
+    add_ged_cache_arguments,
+    add_normalization_cache_arguments,
+    add_parse_cache_arguments,
+    ged_cache_path,
+    normalization_cache_path,
+    parse_cache_dir,
+)
+from normalize_bpmn import TokenUsage, normalize_compact_graphs
+from scheduler import DEFAULT_WORKERS
+from pre_normalize import PreNormalizationStats, add_pre_normalization_arguments, label_similarity_from_args
 
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Compare two BPMN files")
     parser.add_argument("file1", type=str, help="Path to the first BPMN file")
     parser.add_argument("file2", type=str, help="Path to the second BPMN file")
+    parser.add_argument(
+        "--ged-engine",
+        choices=GED_ENGINES,
+        default="exact",
+        help="GED engine: exact networkx search, exact A* search or fast bipartite approximation (default: exact)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=DEFAULT_TIME_BUDGET,
+        help=f"Seconds the exact GED search may run before reporting its best bound (default: {DEFAULT_TIME_BUDGET:g})",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Only decide whether the similarity is at least this value; exits with 0 if it is, 1 if not "
+        "and 2 if the time budget runs out first",
+    )
+    add_normalization_cache_arguments(parser)
+    add_parse_cache_arguments(parser)
+    add_ged_cache_arguments(parser)
+    add_decomposition_arguments(parser)
+    parser.add_argument(
+        "--fragment-workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Processes searching fragment pairs in parallel with --decompose (default: {DEFAULT_WORKERS})",
+    )
+    add_pre_normalization_arguments(parser)
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_arguments()
 
-    graph_1: BPMNGraph = parse_bpmn(args.file1)
-    graph_2: BPMNGraph = parse_bpmn(args.file2)
+    graph_1: CompactGraph = parse_bpmn_compact(args.file1, parse_cache_dir(args))
+    graph_2: CompactGraph = parse_bpmn_compact(args.file2, parse_cache_dir(args))
 
-    normalized_graph_1, normalized_graph_2 = normalize_graphs(graph_1, graph_2, args.file1)
+    pre_normalization_stats = PreNormalizationStats()
+    token_usage = TokenUsage()
+    normalized_graph_1, normalized_graph_2 = normalize_compact_graphs(
+        graph_1,
+        graph_2,
+        args.file1,
+        normalization_cache_path(args),
+        args.cache_only,
+        label_similarity_from_args(args),
+        pre_normalization_stats,
+        token_usage,
+    )
+    pre_normalization_stats.print()
+    token_usage.print()
 
-    ged = compute_ged(normalized_graph_1, normalized_graph_2)
-    rged = compute_rged(normalized_graph_1, normalized_graph_2)
+    if args.threshold is not None:
+        gate = similarity_at_least(normalized_graph_1, normalized_graph_2, args.threshold, args.time_budget)
+        outcome = {True: "passed", False: "failed", None: "undecided"}[gate.passed]
+        print(f"Similarity >= {args.threshold:g}: {outcome} (decided by {gate.decided_by})")
+        print(f"GED budget: {gate.ged_budget}, GED bounds: [{gate.lower_bound}, {gate.upper_bound}]")
+        print(f"Gate computation time: {gate.elapsed:.3f}s")
+        sys.exit({True: 0, False: 1, None: 2}[gate.passed])
 
-    print(f"Graph Edit Distance (GED): {ged}")
-    print(f"Relative Graph Edit Distance (RGED): {rged:.5f}")
-    print(f"Graph Similarity: {1 - rged:.5f}")
+    result = compare_graphs(
+        normalized_graph_1,
+        normalized_graph_2,
+        args.ged_engine,
+        args.time_budget,
+        on_improvement=lambda bound: print(f"GED upper bound: {bound}"),
+        ged_cache=ged_cache_path(args),
+        max_fragment_size=max_fragment_size(args),
+        fragment_workers=args.fragment_workers,
+    )
+
+    if result.fragments is not None:
+        print(f"Fragments: {result.fragments[0]} and {result.fragments[1]}")
+
+    print(f"Graph Edit Distance (GED): {result.ged}")
+    print(f"GED lower bound: {result.lower_bound} ({'optimal' if result.optimal else 'not proven optimal, the GED is an upper bound'})")
+    print(f"Relative Graph Edit Distance (RGED): {result.rged:.5f}")
+    print(f"Graph Similarity: {result.similarity:.5f}")
+    print(f"GED computation time: {result.elapsed:.3f}s")
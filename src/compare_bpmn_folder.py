@@ -1,21 +1,137 @@
 import os
 import csv
+import json
+import asyncio
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, fields, replace
 from typing import Dict, Any
-from parse_bpmn import parse_bpmn
-from normalize_bpmn import normalize_graphs
-from ged import compute_ged, compute_rged
+from parse_bpmn import parse_bpmn_compact, parse_cache_stats
+from async_normalize import AsyncNormalizer, add_async_normalization_arguments, normalizer_from_args
+from normalize_bpmn import TokenUsage
+from pre_normalize import add_pre_normalization_arguments
+from cache import (
+    GED_TABLE,
+    NORMALIZATION_TABLE,
+    add_ged_cache_arguments,
+    add_normalization_cache_arguments,
+    add_parse_cache_arguments,
+    cache_stats,
+    ged_cache_path,
+    normalization_cache_path,
+    parse_cache_dir,
+    print_cache_stats,
+)
+from ged import DEFAULT_TIME_BUDGET, GED_ENGINES, SearchStats, compare_graphs, estimate_ged_cost, similarity_at_least
+from instrumentation import (
+    Instrumentation,
+    RunSummary,
+    StageTiming,
+    TraceWriter,
+    add_instrumentation_arguments,
+    instrumentation_enabled,
+)
+from fragments import add_decomposition_arguments, max_fragment_size
+from scheduler import Scheduler, add_scheduler_arguments, scheduler_from_args
 import argparse
 from datetime import datetime
 
 @dataclass
 class ComparisonResult:
     filename: str
-    ged: float
-    rged: float
-    similarity: float
+    ged: float | None
+    rged: float | None
+    similarity: float | None
+    ged_time: float | None
+    lower_bound: float | None
+    optimal: bool | None
+    ged_engine: str | None
+    prompt_tokens: int
+    reasoning_tokens: int
+    completion_tokens: int
+    error: str = ""
+    passed: bool | None = None
+    # Filled in with --instrument, except for the GED search statistics
+    parse_s: float | None = None
+    normalize_s: float | None = None
+    ged_cpu_s: float | None = None
+    to_digraph_s: float | None = None
+    peak_rss_mb: float | None = None
+    states_expanded: int | None = None
+    timed_out: bool | None = None
+
+    @classmethod
+    def failed(cls, filename: str, error: str, token_usage: Dict[str, int] | None = None) -> "ComparisonResult":
+        return cls(
+            filename=filename,
+            ged=None,
+            rged=None,
+            similarity=None,
+            ged_time=None,
+            lower_bound=None,
+            optimal=None,
+            ged_engine=None,
+            **(token_usage or asdict(TokenUsage())),
+            error=error,
+        )
+
+RESULT_FIELDS = [field.name for field in fields(ComparisonResult)]
+
+class ResultWriter:
+    """
+    Appends results to a CSV file, or a JSONL file if the path ends in .jsonl, and flushes
+    after every pair, so that an interrupted run keeps all results written so far.
+    """
+
+    def __init__(self, path: str):
+        self.jsonl = path.endswith(".jsonl")
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists and not self.jsonl:
+            with open(path, newline='') as f:
+                header = next(csv.reader(f), [])
+            if header != RESULT_FIELDS:
+                raise SystemExit(f"Cannot append to {path}: its columns differ from {RESULT_FIELDS}")
+        self.file = open(path, 'a', newline='')
+        if not self.jsonl:
+            self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if not exists:
+                self.writer.writeheader()
+
+    def write(self, result: ComparisonResult) -> None:
+        if self.jsonl:
+            self.file.write(json.dumps(asdict(result)) + "\n")
+        else:
+            self.writer.writerow(asdict(result))
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def read_results(path: str) -> list[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+def completed_filenames(path: str) -> set[str]:
+    """
+    Pairs that already have a successful result in the output file; failed pairs are retried.
+    """
+    return {row['filename'] for row in read_results(path) if not row.get('error')}
+
+def print_gate_summary(path: str, threshold: float) -> None:
+    latest = {row['filename']: row for row in read_results(path) if not row.get('error')}
+    outcomes = [str(row.get('passed')) for row in latest.values()]
+    undecided = len(outcomes) - outcomes.count('True') - outcomes.count('False')
+    print(f"Similarity >= {threshold:g}: {outcomes.count('True')} passed, {outcomes.count('False')} failed"
+          + (f", {undecided} undecided within the time budget" if undecided else ""))
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Compare BPMN files from two directories")
@@ -27,37 +143,274 @@ def parse_arguments():
         default=None,
         help="Output CSV file path (default: evaluation_results_TIMESTAMP.csv)"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--ged-engine",
+        choices=GED_ENGINES,
+        default="exact",
+        help="GED engine: exact networkx search, exact A* search or fast bipartite approximation (default: exact)"
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=DEFAULT_TIME_BUDGET,
+        help=f"Seconds the exact GED search may run per pair (default: {DEFAULT_TIME_BUDGET:g})"
+    )
+    add_normalization_cache_arguments(parser)
+    add_parse_cache_arguments(parser)
+    add_ged_cache_arguments(parser)
+    add_decomposition_arguments(parser)
+    add_pre_normalization_arguments(parser)
+    add_async_normalization_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_instrumentation_arguments(parser)
+    parser.add_argument(
+        "--fallback-engine",
+        choices=GED_ENGINES + ("none",),
+        default="bipartite",
+        help="GED engine used to retry a pair whose worker hit --task-timeout or --task-memory (default: bipartite)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Only decide whether each pair's similarity is at least this value (the passed column); "
+             "the GED is searched only when cheap bounds cannot decide"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Append to an existing --output file and skip the pairs it already has results for; failed pairs are retried"
+    )
+    args = parser.parse_args()
+    if args.resume and args.output is None:
+        parser.error("--resume requires --output")
+    return args
 
-def process_file_pair(args: Dict[str, Any]) -> ComparisonResult | None:
+def with_worker_measurements(result: ComparisonResult, instrumentation: Instrumentation) -> ComparisonResult:
+    if not instrumentation.timings:
+        return result
+    timing = instrumentation.timings[-1]
+    return replace(result, ged_cpu_s=round(timing.cpu_s, 6), peak_rss_mb=round(timing.peak_rss_mb, 1))
+
+def process_file_pair(args: Dict[str, Any]) -> ComparisonResult:
+    # Runs in a worker process on a pair that has already been normalized by the main process
+    instrumentation = Instrumentation(args['instrument'])
     try:
-        # Parse both BPMN files
-        graph_1 = parse_bpmn(str(args['ground_truth_path']))
-        graph_2 = parse_bpmn(str(args['comparison_path']))
-        
-        # Normalize and compare
-        normalized_graph_1, normalized_graph_2 = normalize_graphs(
-            graph_1, 
-            graph_2, 
-            str(args['ground_truth_path'])
-        )
-        
-        ged = compute_ged(normalized_graph_1, normalized_graph_2)
-        rged = compute_rged(normalized_graph_1, normalized_graph_2)
-        similarity = 1 - rged
+        if args['threshold'] is not None:
+            with instrumentation.stage("ged"):
+                gate = similarity_at_least(
+                    args['normalized_graph_1'],
+                    args['normalized_graph_2'],
+                    args['threshold'],
+                    args['time_budget']
+                )
+            result = ComparisonResult(
+                filename=args['filename'],
+                ged=None,
+                rged=None,
+                similarity=None,
+                ged_time=round(gate.elapsed, 3),
+                lower_bound=gate.lower_bound,
+                optimal=None,
+                ged_engine=None,
+                **args['token_usage'],
+                passed=gate.passed,
+                timed_out=gate.decided_by == "timeout"
+            )
+            return with_worker_measurements(result, instrumentation)
+
+        search_stats = SearchStats()
+        with instrumentation.stage("ged"):
+            comparison = compare_graphs(
+                args['normalized_graph_1'],
+                args['normalized_graph_2'],
+                args['ged_engine'],
+                args['time_budget'],
+                ged_cache=args['ged_cache'],
+                max_fragment_size=args['max_fragment_size'],
+                search_stats=search_stats
+            )
         
-        return ComparisonResult(
+        result = ComparisonResult(
             filename=args['filename'],
-            ged=ged,
-            rged=round(rged, 5),
-            similarity=round(similarity, 5)
+            ged=comparison.ged,
+            rged=round(comparison.rged, 5),
+            similarity=round(comparison.similarity, 5),
+            ged_time=round(comparison.elapsed, 3),
+            lower_bound=comparison.lower_bound,
+            optimal=comparison.optimal,
+            ged_engine=args['ged_engine'],
+            **args['token_usage'],
+            states_expanded=search_stats.expanded,
+            timed_out=search_stats.timed_out
         )
+        if instrumentation.enabled:
+            result.to_digraph_s = round(search_stats.to_digraph_s, 6)
+        return with_worker_measurements(result, instrumentation)
         
+    except MemoryError:
+        # Left to the scheduler, which retries the pair with the fallback engine
+        raise
     except Exception as e:
-        print(f"Error processing {args['filename']}: {str(e)}")
-        return None
+        return ComparisonResult.failed(args['filename'], f"Error processing: {str(e)}", args['token_usage'])
+
+def record_measurements(
+    result: ComparisonResult, instrumentation: Instrumentation, trace: TraceWriter | None, summary: RunSummary
+) -> ComparisonResult:
+    """
+    Add the stages measured in this process to the result, and all stages of the pair to the trace and summary.
+    """
+    result = replace(
+        result, parse_s=instrumentation.seconds("parse"), normalize_s=instrumentation.seconds("normalize")
+    )
+    timings = list(instrumentation.timings)
+    if result.ged_time is not None:
+        timings.append(StageTiming("ged", result.ged_time, result.ged_cpu_s, result.peak_rss_mb))
+    if result.to_digraph_s:
+        timings.append(StageTiming("to_digraph", result.to_digraph_s))
+    for timing in timings:
+        summary.add(timing)
+    summary.count("prompt_tokens", result.prompt_tokens)
+    summary.count("reasoning_tokens", result.reasoning_tokens)
+    summary.count("completion_tokens", result.completion_tokens)
+    summary.count("states_expanded", result.states_expanded or 0)
+    summary.count("ged_timeouts", bool(result.timed_out))
+    summary.count("failed_pairs", bool(result.error))
+    if trace is not None:
+        trace.write(
+            result.filename,
+            timings,
+            prompt_tokens=result.prompt_tokens,
+            reasoning_tokens=result.reasoning_tokens,
+            completion_tokens=result.completion_tokens,
+            states_expanded=result.states_expanded,
+            timed_out=result.timed_out,
+            error=result.error,
+        )
+    return result
+
+async def normalize_and_compare(
+    process_args: list[Dict[str, Any]],
+    normalizer: AsyncNormalizer,
+    scheduler: Scheduler,
+    writer: ResultWriter,
+    fallback_engine: str | None = "bipartite",
+    trace: TraceWriter | None = None,
+    summary: RunSummary | None = None
+) -> int:
+    """
+    Normalize all pairs concurrently (optionally in batches) and hand each pair to the GED workers
+    as soon as its mapping arrives, so that LLM latency overlaps with the CPU-bound comparisons.
+    The scheduler runs the most expensive pending pairs first and retries runaway pairs with the
+    fallback engine. Every result is written as soon as it is available; returns the number of failed pairs.
+    With a run summary, the stage measurements of every pair are added to it and to the trace.
+    """
+    total_files = len(process_args)
+    completed = 0
+    failed = 0
+    instrumentations = {args['filename']: Instrumentation(summary is not None) for args in process_args}
+
+    def report(result: ComparisonResult) -> None:
+        nonlocal completed, failed
+        completed += 1
+        if summary is not None:
+            result = record_measurements(result, instrumentations[result.filename], trace, summary)
+        writer.write(result)
+        if result.error:
+            failed += 1
+            print(f"[{completed}/{total_files}] Failed {result.filename}: {result.error}")
+        elif result.similarity is None:
+            print(f"[{completed}/{total_files}] Processed {result.filename} - "
+                  f"Passed: {'undecided' if result.passed is None else result.passed}")
+        else:
+            print(f"[{completed}/{total_files}] Processed {result.filename} - "
+                  f"Similarity: {result.similarity}")
+
+    async def compare(args: Dict[str, Any], normalized_graphs, usage: TokenUsage) -> None:
+        normalized_graph_1, normalized_graph_2 = normalized_graphs
+        task_args = {
+            **args,
+            'normalized_graph_1': normalized_graph_1,
+            'normalized_graph_2': normalized_graph_2,
+            'token_usage': asdict(usage),
+        }
+        fallback_args = (
+            {**task_args, 'ged_engine': fallback_engine}
+            if fallback_engine and fallback_engine != args['ged_engine'] else None
+        )
+        cost = estimate_ged_cost(normalized_graph_1, normalized_graph_2, args['ged_engine'])
+        try:
+            result = await scheduler.submit(process_file_pair, task_args, cost, fallback_args)
+        except Exception as e:
+            result = ComparisonResult.failed(args['filename'], f"Error processing: {str(e)}", asdict(usage))
+        report(result)
+
+    # Parse both BPMN files of every pair
+    pairs = []
+    parsed_args = []
+    for args in process_args:
+        try:
+            with instrumentations[args['filename']].stage("parse"):
+                graph_1 = parse_bpmn_compact(str(args['ground_truth_path']), args['parse_cache'])
+                graph_2 = parse_bpmn_compact(str(args['comparison_path']), args['parse_cache'])
+            if graph_1 is None or graph_2 is None:
+                raise ValueError("no process found")
+        except Exception as e:
+            report(ComparisonResult.failed(args['filename'], f"Error parsing: {str(e)}"))
+            continue
+        pairs.append((graph_1, graph_2, str(args['ground_truth_path'])))
+        parsed_args.append(args)
+
+    comparisons = []
+    # Normalization is asynchronous, so each pair records the time spent on its own mapping
+    async for index, normalized_graphs, usage, seconds in normalizer.normalize_pairs(pairs):
+        args = parsed_args[index]
+        instrumentations[args['filename']].record("normalize", seconds)
+        if isinstance(normalized_graphs, Exception):
+            report(ComparisonResult.failed(args['filename'], f"Error normalizing: {str(normalized_graphs)}"))
+        else:
+            comparisons.append(asyncio.ensure_future(compare(args, normalized_graphs, usage)))
+    await asyncio.gather(*comparisons)
+    return failed
+
+async def run_pipeline(
+    process_args: list[Dict[str, Any]],
+    normalizer: AsyncNormalizer,
+    scheduler: Scheduler,
+    writer: ResultWriter,
+    fallback_engine: str | None = "bipartite",
+    trace: TraceWriter | None = None,
+    summary: RunSummary | None = None
+) -> int:
+    async with scheduler, normalizer:
+        return await normalize_and_compare(
+            process_args, normalizer, scheduler, writer, fallback_engine, trace, summary
+        )
+
+def evaluate_bpmn_directories(
+    ground_truth_dir: str,
+    comparison_dir: str,
+    output_file: str | None = None,
+    ged_engine: str = "exact",
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    cache_path: str | None = None,
+    cache_only: bool = False,
+    normalizer: AsyncNormalizer | None = None,
+    parse_cache: str | None = None,
+    resume: bool = False,
+    scheduler: Scheduler | None = None,
+    fallback_engine: str | None = "bipartite",
+    ged_cache: str | None = None,
+    max_fragment_size: int | None = None,
+    threshold: float | None = None,
+    instrument: bool = False,
+    trace_file: str | None = None
+):
+    if normalizer is None:
+        normalizer = AsyncNormalizer(cache_path=cache_path, cache_only=cache_only)
+    if scheduler is None:
+        scheduler = Scheduler()
 
-def evaluate_bpmn_directories(ground_truth_dir: str, comparison_dir: str, output_file: str | None = None):
     results_dir = "evaluation_results"
     os.makedirs(results_dir, exist_ok=True)
 
@@ -66,10 +419,16 @@ def evaluate_bpmn_directories(ground_truth_dir: str, comparison_dir: str, output
         output_file = os.path.join(results_dir, f"evaluation_results_{timestamp}.csv")
 
     ground_truth_files = {f.name: f for f in Path(ground_truth_dir).glob("*.bpmn")}
+
+    completed = completed_filenames(output_file) if resume else set()
+    if completed:
+        print(f"Resuming: skipping {len(completed)} pairs already in {output_file}")
     
     # Prepare arguments for parallel processing
     process_args = []
     for filename, ground_truth_path in ground_truth_files.items():
+        if filename in completed:
+            continue
         comparison_path = Path(comparison_dir) / filename
         
         if not comparison_path.exists():
@@ -80,45 +439,64 @@ def evaluate_bpmn_directories(ground_truth_dir: str, comparison_dir: str, output
             'filename': filename,
             'ground_truth_path': ground_truth_path,
             'comparison_path': comparison_path,
+            'ged_engine': ged_engine,
+            'time_budget': time_budget,
+            'parse_cache': parse_cache,
+            'ged_cache': ged_cache,
+            'max_fragment_size': max_fragment_size,
+            'threshold': threshold,
+            'instrument': instrument,
         })
 
-    results = []
-    total_files = len(process_args)
-    completed = 0
+    stats_before = cache_stats(cache_path, NORMALIZATION_TABLE)
+    parse_stats_before = parse_cache_stats(parse_cache)
+    ged_stats_before = cache_stats(ged_cache, GED_TABLE)
+
+    # Normalization runs as async I/O in this process, GED in a process pool; results are appended as they complete
+    if not resume and os.path.exists(output_file):
+        os.remove(output_file)
+    summary = RunSummary() if instrument else None
+    with ResultWriter(output_file) as writer, TraceWriter(trace_file) as trace:
+        failed = asyncio.run(
+            run_pipeline(process_args, normalizer, scheduler, writer, fallback_engine, trace, summary)
+        )
+        if summary is not None:
+            summary.count("normalization_requests", normalizer.requests)
+            summary.count("normalization_request_s", round(normalizer.request_seconds, 3))
+            trace.write_summary(summary)
 
-    # Use ProcessPoolExecutor for parallel processing
-    with ProcessPoolExecutor(max_workers=4) as executor:
-        futures = {executor.submit(process_file_pair, args): args['filename'] 
-                  for args in process_args}
-        
-        for future in as_completed(futures):
-            filename = futures[future]
-            completed += 1
-            
-            try:
-                result = future.result()
-                if result:
-                    results.append(result)
-                    print(f"[{completed}/{total_files}] Processed {filename} - "
-                          f"Similarity: {result.similarity}")
-            except Exception as e:
-                print(f"[{completed}/{total_files}] Error processing {filename}: {str(e)}")
-
-    # Write results to CSV
-    if results:
-        with open(output_file, 'w', newline='') as csvfile:
-            fieldnames = ['filename', 'ged', 'rged', 'similarity']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for result in results:
-                writer.writerows([vars(result)])
-    
     print(f"\nEvaluation complete. Results saved to: {output_file}")
+    if failed:
+        print(f"{failed} of {len(process_args)} pairs failed; rerun with --resume to retry them")
+    if threshold is not None:
+        print_gate_summary(output_file, threshold)
+    print_cache_stats("Parse", parse_stats_before, parse_cache_stats(parse_cache))
+    print_cache_stats("Normalization", stats_before, cache_stats(cache_path, NORMALIZATION_TABLE))
+    print_cache_stats("GED", ged_stats_before, cache_stats(ged_cache, GED_TABLE))
+    normalizer.stats.print()
+    normalizer.usage.print()
+    if summary is not None:
+        summary.print()
 
 if __name__ == "__main__":
     args = parse_arguments()
+    cache_path = normalization_cache_path(args)
     evaluate_bpmn_directories(
         args.ground_truth_dir,
         args.comparison_dir,
-        args.output
+        args.output,
+        args.ged_engine,
+        args.time_budget,
+        cache_path,
+        args.cache_only,
+        normalizer_from_args(args, cache_path),
+        parse_cache_dir(args),
+        args.resume,
+        scheduler_from_args(args),
+        None if args.fallback_engine == "none" else args.fallback_engine,
+        ged_cache_path(args),
+        max_fragment_size(args),
+        args.threshold,
+        instrumentation_enabled(args),
+        args.trace
     )
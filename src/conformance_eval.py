@@ -1,15 +1,48 @@
 import argparse
+import asyncio
+import copy
 import csv
 import hashlib
 import json
 import random
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
 
 import pm4py
+from pm4py.objects.bpmn.obj import BPMN
+from pm4py.objects.bpmn.util import label_replacing
+from pm4py.objects.log.obj import EventLog
+
+from async_normalize import AsyncNormalizer, add_async_normalization_arguments, normalizer_from_args
+from instrumentation import (
+    Instrumentation,
+    RunSummary,
+    StageTiming,
+    TraceWriter,
+    add_instrumentation_arguments,
+    instrumentation_enabled,
+)
+from parse_bpmn import parse_bpmn_compact, parse_cache_stats
+from scheduler import Scheduler, add_scheduler_arguments, scheduler_from_args
+from pre_normalize import add_pre_normalization_arguments
+from cache import (
+    NORMALIZATION_TABLE,
+    PickleDirCache,
+    add_conformance_cache_arguments,
+    add_normalization_cache_arguments,
+    add_parse_cache_arguments,
+    cache_stats,
+    conformance_cache_dir,
+    normalization_cache_path,
+    parse_cache_dir,
+    print_cache_stats,
+)
+
+# Bump whenever the cached Petri nets or simulated logs change, so that old entries are invalidated
+ARTIFACT_VERSION = 2
 
 @dataclass
 class ConformanceResult:
@@ -19,6 +52,48 @@ class ConformanceResult:
     perc_fit_traces: float
     precision: float
     f1: float
+    prompt_tokens: int = 0
+    reasoning_tokens: int = 0
+    completion_tokens: int = 0
+    # Stage measurements with --instrument; the worker stages come from the worker process
+    timings: List[StageTiming] = field(default_factory=list)
+
+
+@dataclass
+class GroundTruthRun:
+    """
+    Outcome of the worker task of one ground-truth file: the stages shared by its candidates, the
+    (result, error) of every candidate, and the conformance cache lookups of the task.
+    """
+    timings: List[StageTiming]
+    results: List[tuple[Optional[ConformanceResult], Optional[str]]]
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+@dataclass
+class ConformanceTarget:
+    """
+    A generated folder evaluated with raw or normalized labels, with its own results and summary.
+    """
+    generated_dir: str
+    normalized: bool
+    results: List[ConformanceResult] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+    @property
+    def mode(self) -> str:
+        return "normalized" if self.normalized else "raw"
+
+    @property
+    def label(self) -> str:
+        return f"{self.generated_dir} ({self.mode})"
+
+
+# Stages measured per pair: parsing and normalization in the main process, the rest in the worker
+STAGES = ("parse", "normalize", "petri_nets", "simulate", "replay")
+
+MODES = ("raw", "normalized")
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -26,7 +101,12 @@ def parse_arguments() -> argparse.Namespace:
         description="Semantic conformance evaluation using PM4Py (token-based replay)."
     )
     parser.add_argument("ground_truth_dir", type=str, help="Ground truth BPMN folder")
-    parser.add_argument("generated_dir", type=str, help="Generated BPMN folder")
+    parser.add_argument(
+        "generated_dirs",
+        type=str,
+        nargs="+",
+        help="Generated BPMN folders; all are evaluated against one simulation of each ground-truth model",
+    )
     parser.add_argument(
         "--traces", type=int, default=200, help="Number of traces to simulate per model"
     )
@@ -42,19 +122,27 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument(
         "--normalize",
         action="store_true",
-        help="Normalize labels using GPT mapping before conformance checking.",
+        help="Normalize labels using GPT mapping before conformance checking (same as --modes normalized).",
     )
     parser.add_argument(
-        "--workers",
-        type=int,
+        "--modes",
+        choices=MODES,
+        nargs="+",
         default=None,
-        help="Number of parallel workers (default: 4, or 20 when --normalize is set)",
+        help="Evaluate every generated folder raw, normalized or both (default: normalized with --normalize, else raw)",
     )
+    add_normalization_cache_arguments(parser)
+    add_parse_cache_arguments(parser)
+    add_conformance_cache_arguments(parser)
+    add_pre_normalization_arguments(parser)
+    add_async_normalization_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_instrumentation_arguments(parser)
     parser.add_argument(
         "--output",
         type=str,
         default=None,
-        help="Output CSV file path (requires --write-csv). Default: evaluation_results/conformance_results_TIMESTAMP.csv",
+        help="Output CSV file path for a single target (requires --write-csv). Default: evaluation_results/conformance_results_TIMESTAMP.csv",
     )
     parser.add_argument(
         "--write-csv",
@@ -65,7 +153,7 @@ def parse_arguments() -> argparse.Namespace:
         "--summary-output",
         type=str,
         default=None,
-        help="Output JSON file path (default: evaluation_results/conformance_summary_TIMESTAMP.json)",
+        help="Output JSON file path for a single target (default: evaluation_results/conformance_summary_TIMESTAMP.json)",
     )
     return parser.parse_args()
 
@@ -78,15 +166,133 @@ def simulate_log(net, im, fm, traces: int, max_trace_length: int):
     return pm4py.sim.play_out(net, im, fm, parameters=parameters)
 
 
-def compute_conformance(log, net, im, fm) -> tuple[float, float, float, float, float]:
-    fitness = pm4py.fitness_token_based_replay(log, net, im, fm)
-    precision = pm4py.precision_token_based_replay(log, net, im, fm)
+@lru_cache(maxsize=None)
+def get_artifact_cache(directory: str) -> PickleDirCache:
+    return PickleDirCache(directory)
+
 
-    fitness_log = float(fitness.get("log_fitness", 0.0))
-    avg_trace_fitness = float(fitness.get("average_trace_fitness", 0.0))
-    perc_fit_traces = float(
-        fitness.get("perc_fit_traces", fitness.get("percentage_of_fitting_traces", 0.0))
+def artifact_key(kind: str, data: bytes, *params) -> str:
+    """
+    Hash of the artifact kind and parameters, the BPMN file content and the pm4py version.
+    """
+    digest = hashlib.blake2b(
+        f"{kind}:{ARTIFACT_VERSION}:{pm4py.__version__}:{params!r}:".encode(), digest_size=20
     )
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class ModelLoader:
+    """
+    Loads the models of one worker task. Each file is read once and parsed by pm4py at most once,
+    and not at all when its nets are cached. The parsed BPMN graphs, Petri nets (per label mapping)
+    and simulated logs are stored in the conformance cache.
+    """
+
+    def __init__(self, cache: Optional[PickleDirCache]):
+        self.cache = cache
+        self.contents: dict[Path, bytes] = {}
+        self.graphs: dict[Path, object] = {}
+
+    def _cached(self, key: str, build):
+        value = self.cache.get(key) if self.cache is not None else None
+        if value is None:
+            value = build()
+            if self.cache is not None:
+                self.cache.put(key, value)
+        return value
+
+    def content(self, path: Path) -> bytes:
+        if path not in self.contents:
+            self.contents[path] = path.read_bytes()
+        return self.contents[path]
+
+    def bpmn(self, path: Path):
+        if path not in self.graphs:
+            self.graphs[path] = self._cached(
+                artifact_key("bpmn", self.content(path)), lambda: pm4py.read_bpmn(str(path))
+            )
+        return self.graphs[path]
+
+    def petri_net(self, path: Path, mapping: Optional[dict] = None):
+        """
+        The Petri net, initial and final marking of a BPMN file, with its tasks renamed by `mapping`
+        before conversion.
+        """
+        def convert():
+            bpmn = self.bpmn(path)
+            # Only task names become transition labels, so renamed tasks give the mapped net directly
+            return pm4py.convert_to_petri_net(label_replacing.apply(bpmn, mapping) if mapping else bpmn)
+
+        renames = tuple(sorted(mapping.items())) if mapping else None
+        return self._cached(artifact_key("petri_net", self.content(path), renames), convert)
+
+    def simulated_log(self, path: Path, seed: int, traces: int, max_trace_length: int):
+        """
+        The log simulated from the unmapped ground-truth net. The log only depends on the model and
+        the simulation parameters, so it is cached by those and shared by raw and normalized runs.
+        """
+        def simulate():
+            random.seed(seed)
+            try:  # optional numpy seeding
+                import numpy as np
+
+                np.random.seed(seed)
+            except Exception:
+                pass
+            return simulate_log(*self.petri_net(path), traces, max_trace_length)
+
+        return self._cached(
+            artifact_key("simulated_log", self.content(path), seed, traces, max_trace_length), simulate
+        )
+
+
+def log_variants(log) -> tuple[list, list[int]]:
+    """
+    One trace per distinct activity sequence of the log, with the number of traces that have it.
+    """
+    variants: dict[tuple, list] = {}
+    for trace in log:
+        key = tuple(event["concept:name"] for event in trace)
+        if key in variants:
+            variants[key][1] += 1
+        else:
+            variants[key] = [trace, 1]
+    return [trace for trace, _ in variants.values()], [count for _, count in variants.values()]
+
+
+def variant_fitness(log, net, im, fm) -> tuple[float, float, float]:
+    """
+    Token-based replay fitness with every variant replayed once. The per-variant results are
+    weighted by the variant counts, which gives the log fitness, average trace fitness and
+    percentage of fitting traces of `pm4py.fitness_token_based_replay` on the full log.
+    """
+    traces, counts = log_variants(log)
+    replayed = pm4py.conformance_diagnostics_token_based_replay(EventLog(traces), net, im, fm)
+
+    traces_count = sum(counts)
+    fit_traces = 0
+    sum_fitness = missing = consumed = remaining = produced = 0.0
+    for result, count in zip(replayed, counts):
+        if result["trace_is_fit"]:
+            fit_traces += count
+        sum_fitness += result["trace_fitness"] * count
+        missing += result["missing_tokens"] * count
+        consumed += result["consumed_tokens"] * count
+        remaining += result["remaining_tokens"] * count
+        produced += result["produced_tokens"] * count
+
+    # Same guard as pm4py's fitness evaluation
+    if not traces_count or not consumed or not produced:
+        return 0.0, 0.0, 0.0
+    fitness_log = 0.5 * (1 - missing / consumed) + 0.5 * (1 - remaining / produced)
+    return fitness_log, sum_fitness / traces_count, 100.0 * fit_traces / traces_count
+
+
+def compute_conformance(log, net, im, fm) -> tuple[float, float, float, float, float]:
+    fitness_log, avg_trace_fitness, perc_fit_traces = variant_fitness(log, net, im, fm)
+    # ETConformance already replays each distinct prefix of the log once, weighted by its count
+    precision = pm4py.precision_token_based_replay(log, net, im, fm)
 
     f1 = (
         (2 * fitness_log * precision / (fitness_log + precision))
@@ -101,31 +307,71 @@ def derive_seed(base_seed: int, filename: str) -> int:
     return base_seed + (int(digest, 16) % 1_000_000)
 
 
-def build_label_mapping(ground_truth_path: Path, generated_path: Path) -> dict:
-    from normalize_bpmn import normalize_graphs
-    from parse_bpmn import parse_bpmn
+def parse_label_graph(path: str, cache_dir: Optional[str] = None):
+    """
+    The label graph of a BPMN file, or None if it cannot be parsed; pm4py reports the error of raw pairs.
+    """
+    try:
+        return parse_bpmn_compact(path, cache_dir)
+    except Exception:
+        return None
+
+
+def estimate_conformance_cost(gt_graph, gen_graph) -> float:
+    """
+    Simulation and token replay grow roughly linearly with the size of the two models.
+    """
+    return float(
+        gt_graph.number_of_nodes() + gt_graph.number_of_edges()
+        + gen_graph.number_of_nodes() + gen_graph.number_of_edges()
+    )
 
-    gt_graph = parse_bpmn(str(ground_truth_path))
-    gen_graph = parse_bpmn(str(generated_path))
 
-    if gt_graph is None or gen_graph is None:
-        raise ValueError("Unable to parse BPMN for normalization.")
+def pm4py_task_name(node_type: str, name: Optional[str]) -> Optional[str]:
+    """
+    The name pm4py gives a flow node, or None if pm4py does not read it as a task. pm4py reads every
+    element whose tag ends in "task" as a task and removes line breaks from its name.
+    """
+    if not name or not node_type.lower().endswith("task"):
+        return None
+    return name.replace("\r", "").replace("\n", "")
 
-    normalized_gt, normalized_gen = normalize_graphs(
-        gt_graph, gen_graph, str(ground_truth_path)
-    )
 
+def build_label_mapping(normalized_gt, normalized_gen) -> dict:
+    """
+    Normalized names of the tasks of both graphs, keyed by their pm4py task names. Only tasks become
+    transition labels, so other nodes are left out.
+    """
     mapping: dict[str, str] = {}
-    for node in list(normalized_gt.nodes) + list(normalized_gen.nodes):
-        if node.original_name and node.normalized_name:
-            mapping[node.original_name] = node.normalized_name
+    for graph in (normalized_gt, normalized_gen):
+        for node_type, original_name, normalized_name in zip(
+            graph.types, graph.names, graph.normalized_names
+        ):
+            task_name = pm4py_task_name(node_type, original_name)
+            if task_name and normalized_name:
+                mapping[task_name] = normalized_name
     return mapping
 
 
-def apply_label_mapping(net, mapping: dict) -> None:
-    for transition in net.transitions:
-        if transition.label and transition.label in mapping:
-            transition.label = mapping[transition.label]
+def unmatched_labels(mapping: dict, *bpmn_graphs) -> List[str]:
+    """
+    Mapping keys that name no task of the given pm4py BPMN graphs. These renames would be skipped.
+    """
+    names = {
+        node.get_name() for bpmn in bpmn_graphs for node in bpmn.get_nodes() if isinstance(node, BPMN.Task)
+    }
+    return sorted(label for label in mapping if label not in names)
+
+
+def apply_log_mapping(log, mapping: dict) -> None:
+    """
+    Rename the activities of a simulated log, as if it had been simulated from the mapped net.
+    """
+    for trace in log:
+        for event in trace:
+            name = event.get("concept:name")
+            if name in mapping:
+                event["concept:name"] = mapping[name]
 
 
 def summarize_results(results: List[ConformanceResult]) -> dict:
@@ -138,6 +384,9 @@ def summarize_results(results: List[ConformanceResult]) -> dict:
             "average_perc_fit_traces": 0.0,
             "average_precision": 0.0,
             "average_f1": 0.0,
+            "prompt_tokens": 0,
+            "reasoning_tokens": 0,
+            "completion_tokens": 0,
         }
 
     return {
@@ -151,9 +400,28 @@ def summarize_results(results: List[ConformanceResult]) -> dict:
         ),
         "average_precision": round(sum(r.precision for r in results) / count, 5),
         "average_f1": round(sum(r.f1 for r in results) / count, 5),
+        "prompt_tokens": sum(r.prompt_tokens for r in results),
+        "reasoning_tokens": sum(r.reasoning_tokens for r in results),
+        "completion_tokens": sum(r.completion_tokens for r in results),
     }
 
 
+def timing_columns(timings: List[StageTiming]) -> dict:
+    """
+    Per-stage wall time, total CPU time and peak RSS of a pair as CSV columns; empty without instrumentation.
+    """
+    if not timings:
+        return {}
+    columns: dict = {}
+    for timing in timings:
+        columns[f"{timing.stage}_s"] = columns.get(f"{timing.stage}_s", 0.0) + timing.wall_s
+    columns = {name: round(seconds, 6) for name, seconds in columns.items()}
+    columns["cpu_s"] = round(sum(timing.cpu_s for timing in timings if timing.cpu_s is not None), 6)
+    peaks = [timing.peak_rss_mb for timing in timings if timing.peak_rss_mb is not None]
+    columns["peak_rss_mb"] = round(max(peaks), 1) if peaks else None
+    return columns
+
+
 def write_csv(results: List[ConformanceResult], output_file: str) -> None:
     with open(output_file, "w", newline="") as csvfile:
         fieldnames = [
@@ -163,6 +431,12 @@ def write_csv(results: List[ConformanceResult], output_file: str) -> None:
             "perc_fit_traces",
             "precision",
             "f1",
+            "prompt_tokens",
+            "reasoning_tokens",
+            "completion_tokens",
+            *(f"{stage}_s" for stage in STAGES),
+            "cpu_s",
+            "peak_rss_mb",
         ]
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
@@ -175,6 +449,10 @@ def write_csv(results: List[ConformanceResult], output_file: str) -> None:
                     "perc_fit_traces": round(result.perc_fit_traces, 5),
                     "precision": round(result.precision, 5),
                     "f1": round(result.f1, 5),
+                    "prompt_tokens": result.prompt_tokens,
+                    "reasoning_tokens": result.reasoning_tokens,
+                    "completion_tokens": result.completion_tokens,
+                    **timing_columns(result.timings),
                 }
             )
 
@@ -203,47 +481,50 @@ def write_summary_json(
         json.dump(payload, f, indent=2)
 
 
-def process_file_pair(args: dict) -> tuple[Optional[ConformanceResult], Optional[str]]:
+def evaluate_candidate(
+    filename: str,
+    ground_truth_path: Path,
+    candidate: dict,
+    log,
+    loader: ModelLoader,
+    instrument: bool,
+) -> tuple[Optional[ConformanceResult], Optional[str]]:
+    """
+    Replay the ground-truth log on one candidate net, converted with the candidate's label mapping.
+    """
     try:
-        seed = args["seed"]
-        random.seed(seed)
-        try:  # optional numpy seeding
-            import numpy as np
-
-            np.random.seed(seed)
-        except Exception:
-            pass
-
-        gt_path = Path(args["ground_truth_path"])
-        gen_path = Path(args["generated_path"])
-
-        gt_bpmn = pm4py.read_bpmn(str(gt_path))
-        gt_net, gt_im, gt_fm = pm4py.convert_to_petri_net(gt_bpmn)
-
-        gen_bpmn = pm4py.read_bpmn(str(gen_path))
-        gen_net, gen_im, gen_fm = pm4py.convert_to_petri_net(gen_bpmn)
-
-        if args["normalize"]:
-            mapping = build_label_mapping(gt_path, gen_path)
-            apply_label_mapping(gt_net, mapping)
-            apply_label_mapping(gen_net, mapping)
-
-        log = simulate_log(
-            gt_net, gt_im, gt_fm, args["traces"], args["max_trace_length"]
-        )
-
-        fitness_log, avg_trace_fitness, perc_fit_traces, precision, f1 = (
-            compute_conformance(log, gen_net, gen_im, gen_fm)
-        )
+        gen_path = Path(candidate["generated_path"])
+        instrumentation = Instrumentation(instrument)
+        mapping = candidate["mapping"]
+
+        with instrumentation.stage("petri_nets"):
+            gen_net, gen_im, gen_fm = loader.petri_net(gen_path, mapping)
+
+        if mapping is not None:
+            unmatched = unmatched_labels(mapping, loader.bpmn(ground_truth_path), loader.bpmn(gen_path))
+            if unmatched:
+                print(
+                    f"Warning: {len(unmatched)} normalized label(s) of {filename} match no task "
+                    f"and are not applied: {', '.join(map(repr, unmatched))}"
+                )
+            # The unmapped log is shared with the other candidates
+            log = copy.deepcopy(log)
+            apply_log_mapping(log, mapping)
+
+        with instrumentation.stage("replay"):
+            fitness_log, avg_trace_fitness, perc_fit_traces, precision, f1 = (
+                compute_conformance(log, gen_net, gen_im, gen_fm)
+            )
 
         return (
             ConformanceResult(
-                filename=args["filename"],
+                filename=filename,
                 fitness_log=fitness_log,
                 avg_trace_fitness=avg_trace_fitness,
                 perc_fit_traces=perc_fit_traces,
                 precision=precision,
                 f1=f1,
+                timings=instrumentation.timings,
             ),
             None,
         )
@@ -251,110 +532,371 @@ def process_file_pair(args: dict) -> tuple[Optional[ConformanceResult], Optional
         return None, str(exc)
 
 
+def process_ground_truth(args: dict) -> GroundTruthRun:
+    """
+    Evaluate all candidates of one ground-truth file. Its simulated log is loaded once and replayed
+    on every candidate net; a file evaluated raw and normalized is parsed once for both.
+    """
+    instrumentation = Instrumentation(args["instrument"])
+    cache = get_artifact_cache(args["artifact_cache"]) if args["artifact_cache"] else None
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    loader = ModelLoader(cache)
+    try:
+        # The ground-truth net is only converted when its log is not cached
+        with instrumentation.stage("simulate"):
+            log = loader.simulated_log(
+                Path(args["ground_truth_path"]), args["seed"], args["traces"], args["max_trace_length"]
+            )
+
+        results = [
+            evaluate_candidate(
+                args["filename"], Path(args["ground_truth_path"]), candidate, log, loader, args["instrument"]
+            )
+            for candidate in args["candidates"]
+        ]
+    except Exception as exc:
+        results = [(None, str(exc))] * len(args["candidates"])
+
+    return GroundTruthRun(
+        instrumentation.timings,
+        results,
+        cache.hits - hits if cache is not None else 0,
+        cache.misses - misses if cache is not None else 0,
+    )
+
+
+def process_file_pair(args: dict) -> tuple[Optional[ConformanceResult], Optional[str]]:
+    """
+    Evaluate a single pair, with the ground-truth stages included in its timings.
+    """
+    run = process_ground_truth(
+        {**args, "candidates": [{"generated_path": args["generated_path"], "mapping": args["mapping"]}]}
+    )
+    result, error = run.results[0]
+    if result:
+        result = replace(result, timings=run.timings + result.timings)
+    return result, error
+
+
+def record_measurements(
+    filename: str,
+    target: ConformanceTarget,
+    result: Optional[ConformanceResult],
+    error: Optional[str],
+    timings: List[StageTiming],
+    shared: List[StageTiming],
+    trace: Optional[TraceWriter],
+    summary: RunSummary,
+) -> Optional[ConformanceResult]:
+    """
+    Add the stages of a pair, measured in this process and in the worker, to the trace and the run
+    summary. The result keeps the ground-truth stages shared with other targets as well, so that
+    its CSV columns cover the whole pair; the summary counts those once per ground-truth file.
+    """
+    timings = timings + (result.timings if result else [])
+    for timing in timings:
+        summary.add(timing)
+    summary.count("failed_pairs", result is None)
+    details = {"target": target.label, "error": error or ""}
+    if result:
+        result = replace(result, timings=shared + timings)
+        details = {
+            "prompt_tokens": result.prompt_tokens,
+            "reasoning_tokens": result.reasoning_tokens,
+            "completion_tokens": result.completion_tokens,
+            **details,
+        }
+        summary.count("prompt_tokens", result.prompt_tokens)
+        summary.count("reasoning_tokens", result.reasoning_tokens)
+        summary.count("completion_tokens", result.completion_tokens)
+    if trace is not None:
+        trace.write(filename, timings, **details)
+    return result
+
+
+async def collect_results(
+    tasks: List[dict],
+    targets: List[ConformanceTarget],
+    scheduler: Scheduler,
+    normalizer: Optional[AsyncNormalizer],
+    trace: Optional[TraceWriter] = None,
+    summary: Optional[RunSummary] = None,
+) -> tuple[int, int]:
+    """
+    Evaluate every ground-truth file with all its candidates in one worker task, largest first.
+    With a normalizer, label mappings are requested concurrently in this process, and a task is
+    queued as soon as the mappings of all its normalized candidates have arrived. Results are added
+    to their targets. With a run summary, the stage measurements of every pair are added to it and
+    to the trace. Returns the conformance cache hits and misses of the workers.
+    """
+    total_pairs = sum(len(task["candidates"]) for task in tasks)
+    completed = 0
+    cache_hits = cache_misses = 0
+    instrument = summary is not None
+    shared = [Instrumentation(instrument) for _ in tasks]
+    instrumentations = [[Instrumentation(instrument) for _ in task["candidates"]] for task in tasks]
+    mappings: List[dict] = [{} for _ in tasks]
+    failed: List[set] = [set() for _ in tasks]
+    waiting = [0] * len(tasks)
+    costs = [0.0] * len(tasks)
+
+    def report(
+        index: int,
+        candidate: int,
+        result: Optional[ConformanceResult],
+        error: Optional[str],
+        shared_timings: Optional[List[StageTiming]] = None,
+    ) -> None:
+        nonlocal completed
+        completed += 1
+        filename = tasks[index]["filename"]
+        target = targets[tasks[index]["candidates"][candidate]["target"]]
+        if summary is not None:
+            result = record_measurements(
+                filename,
+                target,
+                result,
+                error,
+                instrumentations[index][candidate].timings,
+                shared_timings or [],
+                trace,
+                summary,
+            )
+        name = f"{target.label} {filename}" if len(targets) > 1 else filename
+        if result:
+            target.results.append(result)
+            print(
+                f"[{completed}/{total_pairs}] {name} - "
+                f"Fitness: {result.fitness_log:.5f} Precision: {result.precision:.5f} F1: {result.f1:.5f}"
+            )
+        else:
+            print(f"[{completed}/{total_pairs}] Error processing {name}: {error}")
+            target.skipped.append(filename)
+
+    async def evaluate(index: int) -> None:
+        nonlocal cache_hits, cache_misses
+        task = tasks[index]
+        active = [i for i in range(len(task["candidates"])) if i not in failed[index]]
+        if not active:
+            return
+        candidates = [
+            {**task["candidates"][i], "mapping": mappings[index].get(i, (None, None))[0]} for i in active
+        ]
+        try:
+            run = await scheduler.submit(process_ground_truth, {**task, "candidates": candidates}, costs[index])
+        except Exception as exc:
+            run = GroundTruthRun([], [(None, str(exc))] * len(active))
+        cache_hits += run.cache_hits
+        cache_misses += run.cache_misses
+
+        shared_timings = shared[index].timings + run.timings
+        if summary is not None:
+            for timing in shared_timings:
+                summary.add(timing)
+            if trace is not None:
+                trace.write(task["filename"], shared_timings, target="ground_truth")
+        for i, (result, error) in zip(active, run.results):
+            usage = mappings[index].get(i, (None, None))[1]
+            if result and usage is not None:
+                result = replace(result, **asdict(usage))
+            report(index, i, result, error, shared_timings)
+
+    async with scheduler:
+        pairs = []
+        pair_keys = []
+        # A generated file evaluated in several modes is parsed once
+        graphs: dict = {}
+        for index, task in enumerate(tasks):
+            with shared[index].stage("parse"):
+                gt_graph = parse_label_graph(task["ground_truth_path"], task["parse_cache"])
+            for i, candidate in enumerate(task["candidates"]):
+                path = candidate["generated_path"]
+                with instrumentations[index][i].stage("parse"):
+                    if path not in graphs:
+                        graphs[path] = parse_label_graph(path, task["parse_cache"])
+                gen_graph = graphs[path]
+                if gt_graph is not None and gen_graph is not None:
+                    costs[index] += estimate_conformance_cost(gt_graph, gen_graph)
+                if not targets[candidate["target"]].normalized:
+                    continue
+                if gt_graph is None or gen_graph is None:
+                    report(index, i, None, "Unable to parse BPMN for normalization.")
+                    failed[index].add(i)
+                    continue
+                pairs.append((gt_graph, gen_graph, task["ground_truth_path"]))
+                pair_keys.append((index, i))
+                waiting[index] += 1
+
+        evaluations = [asyncio.ensure_future(evaluate(index)) for index in range(len(tasks)) if not waiting[index]]
+        if pairs:
+            async with normalizer:
+                # Each pair records the time spent on its own asynchronous label mapping
+                async for key, normalized, usage, seconds in normalizer.normalize_pairs(pairs):
+                    index, i = pair_keys[key]
+                    instrumentations[index][i].record("normalize", seconds)
+                    if isinstance(normalized, Exception):
+                        report(index, i, None, str(normalized))
+                        failed[index].add(i)
+                    else:
+                        mappings[index][i] = (build_label_mapping(*normalized), usage)
+                    waiting[index] -= 1
+                    if not waiting[index]:
+                        evaluations.append(asyncio.ensure_future(evaluate(index)))
+        await asyncio.gather(*evaluations)
+    return cache_hits, cache_misses
+
+
+def conformance_targets(args) -> List[ConformanceTarget]:
+    modes = list(dict.fromkeys(args.modes)) if args.modes else [MODES[1] if args.normalize else MODES[0]]
+    return [
+        ConformanceTarget(generated_dir, mode == "normalized")
+        for generated_dir in dict.fromkeys(args.generated_dirs)
+        for mode in modes
+    ]
+
+
+def target_outputs(
+    args, targets: List[ConformanceTarget], results_dir: Path, timestamp: str
+) -> List[tuple[Optional[str], str]]:
+    """
+    The CSV (with --write-csv) and summary JSON paths of every target. A single target keeps the
+    paths of --output and --summary-output. Several targets are written as
+    evaluation_results/<generated folder>/conformance_summary_<parent>_<mode>_TIMESTAMP.json,
+    the layout read by summarize_conformance.py.
+    """
+    if len(targets) == 1:
+        output_file = (
+            args.output or str(results_dir / f"conformance_results_{timestamp}.csv")
+            if args.write_csv
+            else None
+        )
+        summary_output = args.summary_output or str(results_dir / f"conformance_summary_{timestamp}.json")
+        return [(output_file, summary_output)]
+
+    if args.output or args.summary_output:
+        raise SystemExit("--output and --summary-output need a single generated dir and mode")
+    outputs = []
+    for target in targets:
+        generated_dir = Path(target.generated_dir).resolve()
+        model_dir = results_dir / generated_dir.name
+        model_dir.mkdir(exist_ok=True)
+        suffix = f"{generated_dir.parent.name}_{target.mode}_{timestamp}"
+        outputs.append(
+            (
+                str(model_dir / f"conformance_results_{suffix}.csv") if args.write_csv else None,
+                str(model_dir / f"conformance_summary_{suffix}.json"),
+            )
+        )
+    return outputs
+
+
 def main() -> None:
     args = parse_arguments()
     ground_truth_dir = Path(args.ground_truth_dir)
-    generated_dir = Path(args.generated_dir)
+    targets = conformance_targets(args)
 
     if not ground_truth_dir.exists():
         raise SystemExit(f"Ground truth dir not found: {ground_truth_dir}")
-    if not generated_dir.exists():
-        raise SystemExit(f"Generated dir not found: {generated_dir}")
+    for generated_dir in args.generated_dirs:
+        if not Path(generated_dir).exists():
+            raise SystemExit(f"Generated dir not found: {generated_dir}")
 
     results_dir = Path("evaluation_results")
     results_dir.mkdir(exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = (
-        args.output
-        or str(results_dir / f"conformance_results_{timestamp}.csv")
-        if args.write_csv
-        else None
-    )
-    summary_output = args.summary_output or str(
-        results_dir / f"conformance_summary_{timestamp}.json"
-    )
+    outputs = target_outputs(args, targets, results_dir, timestamp)
+
+    normalize = any(target.normalized for target in targets)
+    cache_path = normalization_cache_path(args) if normalize else None
 
     ground_truth_files = {f.name: f for f in ground_truth_dir.glob("*.bpmn")}
-    results: List[ConformanceResult] = []
-    skipped: List[str] = []
 
-    process_args: List[dict] = []
+    # One task per ground-truth file, with a candidate for every target that has a matching file
+    tasks: List[dict] = []
     for filename, gt_path in sorted(ground_truth_files.items()):
-        gen_path = generated_dir / filename
-        if not gen_path.exists():
-            print(
-                f"Warning: No matching file found for {filename} in generated directory"
-            )
-            skipped.append(filename)
+        candidates = []
+        for index, target in enumerate(targets):
+            gen_path = Path(target.generated_dir) / filename
+            if not gen_path.exists():
+                print(f"Warning: No matching file found for {filename} in {target.label}")
+                target.skipped.append(filename)
+                continue
+            candidates.append({"target": index, "generated_path": str(gen_path)})
+        if not candidates:
             continue
-        process_args.append(
+        tasks.append(
             {
                 "filename": filename,
                 "ground_truth_path": str(gt_path),
-                "generated_path": str(gen_path),
+                "candidates": candidates,
                 "traces": args.traces,
                 "max_trace_length": args.max_trace_length,
-                "normalize": args.normalize,
                 "seed": derive_seed(args.seed, filename),
+                "parse_cache": parse_cache_dir(args),
+                "artifact_cache": conformance_cache_dir(args),
+                "instrument": instrumentation_enabled(args),
             }
         )
 
-    total_files = len(process_args)
-    completed = 0
-
-    if total_files == 0:
+    if not tasks:
         print("No matching BPMN files to evaluate.")
         return
 
-    max_workers = args.workers if args.workers is not None else (20 if args.normalize else 4)
+    normalizer = normalizer_from_args(args, cache_path) if normalize else None
+    stats_before = cache_stats(cache_path, NORMALIZATION_TABLE)
+    parse_stats_before = parse_cache_stats(parse_cache_dir(args))
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(process_file_pair, args_dict): args_dict["filename"]
-            for args_dict in process_args
-        }
-        for future in as_completed(futures):
-            filename = futures[future]
-            completed += 1
-            try:
-                result, error = future.result()
-                if result:
-                    results.append(result)
-                    print(
-                        f"[{completed}/{total_files}] {filename} - "
-                        f"Fitness: {result.fitness_log:.5f} Precision: {result.precision:.5f} F1: {result.f1:.5f}"
-                    )
-                else:
-                    print(
-                        f"[{completed}/{total_files}] Error processing {filename}: {error}"
-                    )
-                    skipped.append(filename)
-            except Exception as exc:
-                print(f"[{completed}/{total_files}] Error processing {filename}: {exc}")
-                skipped.append(filename)
-
-    if results:
-        if args.write_csv and output_file:
-            write_csv(results, output_file)
-        summary = summarize_results(results)
-        summary["skipped_files"] = len(skipped)
+    run_summary = RunSummary() if instrumentation_enabled(args) else None
+    with TraceWriter(args.trace) as trace:
+        cache_hits, cache_misses = asyncio.run(
+            collect_results(tasks, targets, scheduler_from_args(args), normalizer, trace, run_summary)
+        )
+        if run_summary is not None:
+            if normalizer is not None:
+                run_summary.count("normalization_requests", normalizer.requests)
+                run_summary.count("normalization_request_s", round(normalizer.request_seconds, 3))
+            trace.write_summary(run_summary)
+
+    print("\nEvaluation complete.")
+    for target, (output_file, summary_output) in zip(targets, outputs):
+        if not target.results:
+            print(f"No results to write for {target.label}.")
+            continue
+        if output_file:
+            write_csv(target.results, output_file)
+        summary = summarize_results(target.results)
+        summary["skipped_files"] = len(target.skipped)
+        if run_summary is not None:
+            summary["instrumentation"] = run_summary.as_dict()
         write_summary_json(
             summary,
             summary_output,
             str(ground_truth_dir),
-            str(generated_dir),
+            target.generated_dir,
             args.traces,
             args.max_trace_length,
             args.seed,
-            args.normalize,
+            target.normalized,
         )
-        print("\nEvaluation complete.")
-        if args.write_csv and output_file:
+        if len(targets) > 1:
+            print(f"{target.label}:")
+        if output_file:
             print(f"Metrics CSV: {output_file}")
         print(f"Summary JSON: {summary_output}")
-    else:
-        print("No results to write.")
+    print_cache_stats("Parse", parse_stats_before, parse_cache_stats(parse_cache_dir(args)))
+    print_cache_stats("Normalization", stats_before, cache_stats(cache_path, NORMALIZATION_TABLE))
+    if conformance_cache_dir(args):
+        print_cache_stats(
+            "Conformance",
+            {"hits": 0, "misses": 0},
+            {**get_artifact_cache(conformance_cache_dir(args)).stats(), "hits": cache_hits, "misses": cache_misses},
+        )
+    if normalizer is not None:
+        normalizer.stats.print()
+        normalizer.usage.print()
+    if run_summary is not None:
+        run_summary.print()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+import hashlib
+
+import networkx as nx
+
+from compact_graph import CompactGraph
+
+
+def _digest(*parts) -> str:
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def wl_colors(graph: CompactGraph) -> list[str]:
+    """
+    Weisfeiler-Lehman colors of the nodes of a normalized graph. Nodes start with their
+    (type, normalized name) and are refined with the labels and colors of their outgoing and
+    incoming edges until the partition into colors stops changing. Isomorphic graphs get the
+    same colors on corresponding nodes.
+    """
+    if not graph.is_normalized:
+        raise ValueError("Graph has not been normalized.")
+    n = graph.number_of_nodes()
+    outgoing: list[list] = [[] for _ in range(n)]
+    incoming: list[list] = [[] for _ in range(n)]
+    for source, target, label in zip(graph.sources.tolist(), graph.targets.tolist(), graph.edge_normalized_names):
+        outgoing[source].append((label, target))
+        incoming[target].append((label, source))
+
+    colors = [_digest(node_type, name) for node_type, name in zip(graph.types, graph.normalized_names)]
+    classes = len(set(colors))
+    for _ in range(n):
+        colors = [
+            _digest(
+                colors[i],
+                sorted((repr(label), colors[j]) for label, j in outgoing[i]),
+                sorted((repr(label), colors[j]) for label, j in incoming[i]),
+            )
+            for i in range(n)
+        ]
+        refined = len(set(colors))
+        if refined == classes:
+            break
+        classes = refined
+    return colors
+
+
+def wl_fingerprint(graph: CompactGraph) -> str:
+    """
+    Hash of the multiset of Weisfeiler-Lehman colors. Isomorphic graphs always share a fingerprint;
+    different fingerprints prove that two graphs are not isomorphic.
+    """
+    return _digest(graph.number_of_edges(), sorted(wl_colors(graph)))
+
+
+def _colored_digraph(graph: CompactGraph, colors: list[str]) -> nx.DiGraph:
+    G = nx.DiGraph()
+    G.add_nodes_from((i, {"color": color}) for i, color in enumerate(colors))
+    G.add_edges_from(
+        (source, target, {"normalized_name": label})
+        for source, target, label in zip(graph.sources.tolist(), graph.targets.tolist(), graph.edge_normalized_names)
+    )
+    return G
+
+
+def are_isomorphic(graph_1: CompactGraph, graph_2: CompactGraph) -> bool:
+    """
+    True if the normalized graphs are isomorphic with equal node types and names and equal edge
+    labels, i.e. their GED is 0. The fingerprints are compared first; the isomorphism test only
+    runs when they match, with the colors restricting which nodes may correspond.
+    """
+    colors_1, colors_2 = wl_colors(graph_1), wl_colors(graph_2)
+    if graph_1.number_of_edges() != graph_2.number_of_edges() or sorted(colors_1) != sorted(colors_2):
+        return False
+    return nx.is_isomorphic(
+        _colored_digraph(graph_1, colors_1),
+        _colored_digraph(graph_2, colors_2),
+        node_match=lambda a, b: a["color"] == b["color"],
+        edge_match=lambda a, b: a["normalized_name"] == b["normalized_name"],
+    )
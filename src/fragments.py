@@ -0,0 +1,78 @@
+import networkx as nx
+
+from compact_graph import CompactGraph
+
+# Largest fragment the decomposition builds by merging; the exact engines handle this size quickly
+DEFAULT_MAX_FRAGMENT_SIZE = 12
+
+
+def _blocks(graph: CompactGraph) -> tuple[list[set[int]], list[tuple[int, int]]]:
+    """
+    Split the graph at its bridges, the edges whose removal disconnects the undirected graph.
+    Returns the node sets of the remaining connected parts (the 2-edge-connected blocks, which
+    are also separated from other connected components) and the bridges between them.
+    """
+    G = nx.MultiGraph()
+    G.add_nodes_from(range(graph.number_of_nodes()))
+    G.add_edges_from(zip(graph.sources.tolist(), graph.targets.tolist()))
+    bridges = list(nx.bridges(G))
+    G.remove_edges_from(bridges)
+    return [set(block) for block in nx.connected_components(G)], bridges
+
+
+def decompose(graph: CompactGraph, max_size: int = DEFAULT_MAX_FRAGMENT_SIZE) -> list[list[int]]:
+    """
+    Partition the nodes of a graph into fragments for fragment-wise GED.
+    Disconnected parts are never merged, and every fragment boundary is a single edge, so the
+    fragments are single-entry-single-exit regions of the control flow (sequences, or gateway
+    blocks closed by a join). Neighbouring blocks are merged, the smallest pairs first, while
+    the merged fragment has at most `max_size` nodes; larger blocks stay whole.
+    """
+    blocks, bridges = _blocks(graph)
+    parent = list(range(len(blocks)))
+    block_of = {node: i for i, block in enumerate(blocks) for node in block}
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def merged_size(bridge: tuple[int, int]) -> int:
+        first, second = find(block_of[bridge[0]]), find(block_of[bridge[1]])
+        return len(blocks[first]) + len(blocks[second])
+
+    pending = list(bridges)
+    while pending:
+        pending.sort(key=merged_size)
+        source, target = pending.pop(0)
+        if merged_size((source, target)) > max_size:
+            break
+        first, second = find(block_of[source]), find(block_of[target])
+        parent[second] = first
+        blocks[first] |= blocks[second]
+
+    return sorted(
+        (sorted(blocks[i]) for i in range(len(blocks)) if find(i) == i), key=lambda nodes: nodes[0]
+    )
+
+
+def add_decomposition_arguments(parser) -> None:
+    """
+    Add the fragment-wise GED options shared by the command line tools.
+    """
+    parser.add_argument(
+        "--decompose",
+        action="store_true",
+        help="Compute the GED fragment by fragment; the result is an upper bound unless proven optimal",
+    )
+    parser.add_argument(
+        "--max-fragment-size",
+        type=int,
+        default=DEFAULT_MAX_FRAGMENT_SIZE,
+        help=f"Largest number of nodes of a merged fragment (default: {DEFAULT_MAX_FRAGMENT_SIZE})",
+    )
+
+
+def max_fragment_size(args) -> int | None:
+    return args.max_fragment_size if args.decompose else None
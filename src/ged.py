@@ -1,28 +1,29 @@
+import heapq
+import math
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+
 import networkx as nx
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 
+from cache import GED_TABLE, SQLiteCache
+from compact_graph import CompactGraph, as_compact
+from fingerprint import are_isomorphic, wl_fingerprint
+from fragments import DEFAULT_MAX_FRAGMENT_SIZE, decompose
 from schemas import NormalizedBPMNGraph
 
 
-def to_digraph(graph_data: NormalizedBPMNGraph) -> nx.DiGraph:
+def to_digraph(graph_data: NormalizedBPMNGraph | CompactGraph) -> nx.DiGraph:
     """
     Convert the given NormalizedBPMNGraph structure into a directed graph (DiGraph).
     """
-    json_data = graph_data.model_dump()
-
-    G = nx.DiGraph()
-
-    for node in json_data.get("nodes", []):
-        node_id = node["id"]
-        attrs = {k: v for k, v in node.items() if k != "id"}
-        G.add_node(node_id, **attrs)
-
-    for edge in json_data.get("edges", []):
-        source = edge["source"]
-        target = edge["target"]
-        attrs = {k: v for k, v in edge.items() if k not in ["source", "target"]}
-        G.add_edge(source, target, **attrs)
-
-    return G
+    return as_compact(graph_data).to_digraph()
 
 
 
@@ -60,31 +61,881 @@ def node_del_cost(n: dict) -> float:
     return 1.0
 
 
-def compute_ged(json_graph_1: NormalizedBPMNGraph, json_graph_2: NormalizedBPMNGraph) -> float:
+GED_ENGINES = ("exact", "astar", "bipartite")
+
+# Seconds the exact search may run for a single pair before returning its best GED so far
+DEFAULT_TIME_BUDGET = 300.0
+
+# Cost used in the assignment matrix for forbidden cells (e.g. deleting node i via the slot of node k)
+_FORBIDDEN = 1e9
+
+
+@dataclass
+class GEDResult:
+    ged: float
+    rged: float
+    similarity: float
+    elapsed: float
+    lower_bound: float
+    optimal: bool
+    # Fragment counts of both graphs when the GED was computed fragment-wise
+    fragments: tuple[int, int] | None = None
+
+
+@dataclass
+class SearchStats:
     """
-    Compute the Graph Edit Distance (GED) between two graphs given in JSON format.
+    Statistics of one GED computation, filled in by the engines when passed to `compare_graphs`.
+    `expanded` is only known for the A* search; `timed_out` is set when an exact search ran out
+    of its time budget. `to_digraph_s` is the time the networkx engine spent converting the graphs.
+    """
+    expanded: int | None = None
+    timed_out: bool = False
+    to_digraph_s: float = 0.0
+    cached: bool = False
+
+
+@dataclass
+class ThresholdResult:
+    passed: bool | None
+    ged_budget: float
+    lower_bound: float
+    upper_bound: float
+    decided_by: str
+    elapsed: float
+
+
+@dataclass
+class AStarResult:
+    cost: float
+    mapping: dict
+    completed: bool
+    expanded: int
+
+
+def empty_graph_cost(G: CompactGraph) -> float:
+    """
+    GED between a graph and the empty graph: every node and every edge is deleted at cost 1.
+    """
+    return float(G.number_of_nodes() + G.number_of_edges())
+
+
+def estimate_ged_cost(G1: CompactGraph, G2: CompactGraph, engine: str = "exact") -> float:
+    """
+    Rough logarithm of the work a GED computation needs, only meant for ordering pairs.
+    The exact searches branch over the nodes of the larger graph for every node of the smaller one;
+    the bipartite approximation solves an assignment problem cubic in the number of nodes.
+    """
+    n1, n2 = G1.number_of_nodes(), G2.number_of_nodes()
+    cost = 3 * math.log(n1 + n2 + 1) + math.log(G1.number_of_edges() + G2.number_of_edges() + 1)
+    if engine != "bipartite":
+        cost += min(n1, n2) * math.log(max(n1, n2) + 1)
+    return cost
+
+
+def edge_label_cost(labels_1: Counter, labels_2: Counter) -> float:
+    """
+    Minimum cost of transforming one multiset of edge labels into another,
+    where matching labels are free and every substitution, insertion or deletion costs 1.
+    """
+    common = sum((labels_1 & labels_2).values())
+    return float(max(labels_1.total(), labels_2.total()) - common)
+
+
+def _intern(values, table: dict) -> np.ndarray:
+    return np.array([table.setdefault(value, len(table)) for value in values], dtype=np.int64)
+
+
+class _EncodedPair:
+    """
+    Integer encoding of two compact graphs shared by the GED engines.
+    Normalized names, types, (name, type) keys and edge labels are interned to small integers,
+    node substitution costs (the values of `node_subst_cost`) are precomputed as a matrix and
+    edges are stored as label adjacency matrices (-1 where there is no edge).
+    """
+
+    def __init__(self, G1: CompactGraph, G2: CompactGraph):
+        self.G1, self.G2 = G1, G2
+        n1, n2 = G1.number_of_nodes(), G2.number_of_nodes()
+
+        names, types, keys, edge_labels = {}, {}, {}, {}
+        name_1 = _intern(G1.normalized_names, names)
+        name_2 = _intern(G2.normalized_names, names)
+        type_1 = _intern(G1.types, types)
+        type_2 = _intern(G2.types, types)
+        self.key_1 = _intern(zip(name_1.tolist(), type_1.tolist()), keys)
+        self.key_2 = _intern(zip(name_2.tolist(), type_2.tolist()), keys)
+        self.name_1, self.name_2 = name_1, name_2
+        self.key_name = np.array([name for name, _ in keys], dtype=np.int64)
+        self.n_names, self.n_keys = len(names), len(keys)
+
+        name_eq = name_1[:, None] == name_2[None, :]
+        type_eq = type_1[:, None] == type_2[None, :]
+        self.node_costs = np.where(name_eq, np.where(type_eq, 0.0, 0.5), 1.0)
+
+        self.source_1, self.target_1 = G1.sources.astype(np.int64), G1.targets.astype(np.int64)
+        self.source_2, self.target_2 = G2.sources.astype(np.int64), G2.targets.astype(np.int64)
+        self.label_1 = _intern(G1.edge_normalized_names, edge_labels)
+        self.label_2 = _intern(G2.edge_normalized_names, edge_labels)
+        self.n_edge_labels = len(edge_labels)
+
+        self.adjacency_1 = np.full((n1, n1), -1, dtype=np.int64)
+        self.adjacency_1[self.source_1, self.target_1] = self.label_1
+        self.adjacency_2 = np.full((n2, n2), -1, dtype=np.int64)
+        self.adjacency_2[self.source_2, self.target_2] = self.label_2
+
+    def mapping_cost(self, mapping: np.ndarray) -> float:
+        """
+        Exact cost of the edit path induced by `mapping`, where mapping[i] is the G2 node index
+        of G1 node i or -1 if it is deleted. Unmapped G2 nodes and their edges are inserted.
+        """
+        mapped = mapping >= 0
+        node_cost = self.node_costs[np.nonzero(mapped)[0], mapping[mapped]].sum()
+        node_cost += (~mapped).sum() + (len(self.name_2) - mapped.sum())
+
+        images_source = mapping[self.source_1]
+        images_target = mapping[self.target_1]
+        kept = (images_source >= 0) & (images_target >= 0)
+        counterpart = np.full(len(self.label_1), -1, dtype=np.int64)
+        counterpart[kept] = self.adjacency_2[images_source[kept], images_target[kept]]
+        matched = counterpart >= 0
+        edge_cost = (counterpart != self.label_1).sum() + (len(self.label_2) - matched.sum())
+        return float(node_cost + edge_cost)
+
+    def mapping_from_ids(self, mapping: dict) -> np.ndarray:
+        index_2 = {v: j for j, v in enumerate(self.G2.ids)}
+        return np.array(
+            [-1 if mapping.get(u) is None else index_2[mapping[u]] for u in self.G1.ids], dtype=np.int64
+        )
+
+    def mapping_to_ids(self, mapping: np.ndarray) -> dict:
+        return {u: (self.G2.ids[v] if v >= 0 else None) for u, v in zip(self.G1.ids, mapping.tolist())}
+
+    def edit_paths(self, mapping: np.ndarray) -> tuple[list, list]:
+        """
+        Node and edge edit paths of `mapping` in networkx format (pairs of ids, None for insertions and deletions).
+        """
+        ids_1, ids_2 = self.G1.ids, self.G2.ids
+        node_path = [(u, ids_2[v] if v >= 0 else None) for u, v in zip(ids_1, mapping.tolist())]
+        used = set(mapping[mapping >= 0].tolist())
+        node_path.extend((None, ids_2[j]) for j in range(len(ids_2)) if j not in used)
+
+        edge_path = []
+        matched_edges = set()
+        for s, t in zip(self.source_1.tolist(), self.target_1.tolist()):
+            v1, v2 = mapping[s], mapping[t]
+            if v1 >= 0 and v2 >= 0 and self.adjacency_2[v1, v2] >= 0:
+                matched_edges.add((v1, v2))
+                edge_path.append(((ids_1[s], ids_1[t]), (ids_2[v1], ids_2[v2])))
+            else:
+                edge_path.append(((ids_1[s], ids_1[t]), None))
+        for s, t in zip(self.source_2.tolist(), self.target_2.tolist()):
+            if (s, t) not in matched_edges:
+                edge_path.append((None, (ids_2[s], ids_2[t])))
+        return node_path, edge_path
+
+
+def edit_path_cost(G1: CompactGraph, G2: CompactGraph, mapping: dict) -> tuple[float, list, list]:
+    """
+    Compute the exact cost of the edit path induced by a node mapping.
+    `mapping` maps every node id of G1 to a node id of G2 or to None (deletion); unmapped G2 nodes are inserted.
+    Returns the cost together with the node and edge edit paths in networkx format.
+    """
+    enc = _EncodedPair(G1, G2)
+    index_mapping = enc.mapping_from_ids(mapping)
+    return (enc.mapping_cost(index_mapping), *enc.edit_paths(index_mapping))
+
+
+def _local_structure(enc: _EncodedPair, sources: np.ndarray, targets: np.ndarray, labels: np.ndarray, keys: np.ndarray, n: int, n_codes: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Count vectors of the outgoing and incoming edges of every node, each edge described by its
+    label together with the (name, type) key of the node at the other end.
+    """
+    out_codes = labels * enc.n_keys + keys[targets]
+    in_codes = labels * enc.n_keys + keys[sources]
+    out_counts = np.zeros((n, n_codes))
+    in_counts = np.zeros((n, n_codes))
+    np.add.at(out_counts, (sources, out_codes), 1)
+    np.add.at(in_counts, (targets, in_codes), 1)
+    return out_counts, in_counts
+
+
+def _bipartite_mapping(enc: _EncodedPair) -> np.ndarray:
+    n1, n2 = len(enc.name_1), len(enc.name_2)
+    n_codes = max(enc.n_edge_labels * enc.n_keys, 1)
+    out_1, in_1 = _local_structure(enc, enc.source_1, enc.target_1, enc.label_1, enc.key_1, n1, n_codes)
+    out_2, in_2 = _local_structure(enc, enc.source_2, enc.target_2, enc.label_2, enc.key_2, n2, n_codes)
+    degree_1 = out_1.sum(axis=1) + in_1.sum(axis=1)
+    degree_2 = out_2.sum(axis=1) + in_2.sum(axis=1)
+
+    cost_matrix = np.full((n1 + n2, n1 + n2), _FORBIDDEN)
+    cost_matrix[n1:, n2:] = 0.0
+    for i in range(n1):
+        out_cost = np.maximum(out_1[i].sum(), out_2.sum(axis=1)) - np.minimum(out_1[i], out_2).sum(axis=1)
+        in_cost = np.maximum(in_1[i].sum(), in_2.sum(axis=1)) - np.minimum(in_1[i], in_2).sum(axis=1)
+        # Every edge is shared by two nodes, so each node accounts for half of its cost
+        cost_matrix[i, :n2] = enc.node_costs[i] + 0.5 * (out_cost + in_cost)
+    cost_matrix[np.arange(n1), n2 + np.arange(n1)] = 1.0 + 0.5 * degree_1
+    cost_matrix[n1 + np.arange(n2), np.arange(n2)] = 1.0 + 0.5 * degree_2
+
+    rows, cols = linear_sum_assignment(cost_matrix)
+    mapping = np.full(n1, -1, dtype=np.int64)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if row < n1 and col < n2:
+            mapping[row] = col
+    return mapping
+
+
+def branch_lower_bound(G1: CompactGraph, G2: CompactGraph) -> float:
+    """
+    Lower bound on the GED from an optimal assignment of branches: a node together with the
+    labels of its outgoing and incoming edges. Every edge belongs to two branches, so edge costs
+    are halved, and no edit path can be cheaper than the optimal assignment. Tighter than
+    `lower_bound` at the price of one assignment problem.
+    """
+    enc = _EncodedPair(G1, G2)
+    n1, n2 = len(enc.name_1), len(enc.name_2)
+    n_labels = max(enc.n_edge_labels, 1)
+
+    def branches(nodes: np.ndarray, labels: np.ndarray, n: int) -> np.ndarray:
+        counts = np.zeros((n, n_labels))
+        np.add.at(counts, (nodes, labels), 1)
+        return counts
+
+    cost_matrix = np.full((n1 + n2, n1 + n2), _FORBIDDEN)
+    cost_matrix[n1:, n2:] = 0.0
+    degree_1 = np.zeros(n1)
+    degree_2 = np.zeros(n2)
+    edge_costs = np.zeros((n1, n2))
+    for nodes_1, nodes_2 in ((enc.source_1, enc.source_2), (enc.target_1, enc.target_2)):
+        counts_1 = branches(nodes_1, enc.label_1, n1)
+        counts_2 = branches(nodes_2, enc.label_2, n2)
+        sizes_1, sizes_2 = counts_1.sum(axis=1), counts_2.sum(axis=1)
+        common = np.minimum(counts_1[:, None, :], counts_2[None, :, :]).sum(axis=2)
+        edge_costs += np.maximum(sizes_1[:, None], sizes_2[None, :]) - common
+        degree_1 += sizes_1
+        degree_2 += sizes_2
+    cost_matrix[:n1, :n2] = enc.node_costs + 0.5 * edge_costs
+    cost_matrix[np.arange(n1), n2 + np.arange(n1)] = 1.0 + 0.5 * degree_1
+    cost_matrix[n1 + np.arange(n2), np.arange(n2)] = 1.0 + 0.5 * degree_2
+
+    rows, cols = linear_sum_assignment(cost_matrix)
+    return float(cost_matrix[rows, cols].sum())
+
+
+def bipartite_ged(G1: CompactGraph, G2: CompactGraph) -> tuple[float, list, list]:
+    """
+    Approximate the GED with a bipartite assignment of nodes (Riesen & Bunke).
+    Each substitution cost combines `node_subst_cost` with the cost of matching the
+    incident edges (by edge label and neighbour label), and the assignment is solved with `linear_sum_assignment`.
+    The returned cost is the exact cost of the induced edit path, i.e. an upper bound on the GED.
+    """
+    enc = _EncodedPair(G1, G2)
+    mapping = _bipartite_mapping(enc)
+    return (enc.mapping_cost(mapping), *enc.edit_paths(mapping))
+
+
+def node_label_cost(keys_1: Counter, keys_2: Counter) -> float:
+    """
+    Minimum cost of transforming one multiset of (normalized name, type) node keys into another.
+    Nodes with the same normalized name and type can be matched for free and nodes with
+    the same normalized name for 0.5; the remaining nodes cost 1 each. Matching the
+    multisets greedily in this order is optimal when edges are ignored.
+    """
+    exact = keys_1 & keys_2
+
+    names_1 = Counter()
+    for (name, _), count in (keys_1 - exact).items():
+        names_1[name] += count
+    names_2 = Counter()
+    for (name, _), count in (keys_2 - exact).items():
+        names_2[name] += count
+    partial = names_1 & names_2
+
+    return max(keys_1.total(), keys_2.total()) - exact.total() - 0.5 * partial.total()
+
+
+def lower_bound(G1: CompactGraph, G2: CompactGraph) -> float:
     """
-    G1 = to_digraph(json_graph_1)
-    G2 = to_digraph(json_graph_2)
-    return nx.algorithms.similarity.graph_edit_distance(
-        G1, G2, 
+    Cheap lower bound on the GED from the label multisets of both graphs.
+    Nodes are bounded by `node_label_cost`, edges the same way by their normalized names.
+    """
+    node_bound = node_label_cost(
+        Counter(zip(G1.normalized_names, G1.types)), Counter(zip(G2.normalized_names, G2.types))
+    )
+    return node_bound + edge_label_cost(Counter(G1.edge_normalized_names), Counter(G2.edge_normalized_names))
+
+
+def _anytime_search(
+    G1: CompactGraph,
+    G2: CompactGraph,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    on_improvement: Callable[[float], None] | None = None,
+    stats: SearchStats | None = None,
+) -> tuple[float, bool, dict]:
+    enc = _EncodedPair(G1, G2)
+    bipartite_mapping = _bipartite_mapping(enc)
+    best = enc.mapping_cost(bipartite_mapping)
+    best_mapping = enc.mapping_to_ids(bipartite_mapping)
+    if on_improvement is not None:
+        on_improvement(best)
+
+    start = time.perf_counter()
+    digraph_1, digraph_2 = G1.to_digraph(), G2.to_digraph()
+    if stats is not None:
+        stats.to_digraph_s += time.perf_counter() - start
+    for node_path, _, cost in nx.algorithms.similarity.optimize_edit_paths(
+        digraph_1, digraph_2,
         node_subst_cost=node_subst_cost,
         node_ins_cost=node_ins_cost,
         node_del_cost=node_del_cost,
         edge_match=edge_match,
-        timeout=300.0
+        upper_bound=best,
+        timeout=time_budget
+    ):
+        if cost < best:
+            best = cost
+            best_mapping = {u: v for u, v in node_path if u is not None}
+            if on_improvement is not None:
+                on_improvement(best)
+
+    # optimize_edit_paths stops silently on timeout, so the budget tells whether it completed
+    completed = time.perf_counter() - start < time_budget
+    if stats is not None:
+        stats.timed_out = stats.timed_out or not completed
+    return best, completed, best_mapping
+
+
+def anytime_ged(
+    G1: CompactGraph,
+    G2: CompactGraph,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    on_improvement: Callable[[float], None] | None = None,
+) -> tuple[float, bool]:
+    """
+    Run the iterative exact GED search under a time budget.
+    The search is seeded with the bipartite upper bound and every strictly better edit path
+    found is reported through `on_improvement`. Returns the best GED found and whether the
+    search finished within the budget, in which case that GED is optimal.
+    """
+    return _anytime_search(G1, G2, time_budget, on_improvement)[:2]
+
+
+def _search_order(adjacency: np.ndarray) -> list[int]:
+    """
+    Order the nodes of G1 so that each node is as connected as possible to the nodes before it,
+    which lets edge costs be charged early in the search.
+    """
+    connected = (adjacency >= 0) | (adjacency.T >= 0)
+    degree = connected.sum(axis=1)
+    remaining = set(range(len(adjacency)))
+    order = []
+    while remaining:
+        links = connected[:, order].sum(axis=1) if order else np.zeros(len(adjacency), dtype=np.int64)
+        node = max(remaining, key=lambda n: (links[n], degree[n], -n))
+        order.append(node)
+        remaining.remove(node)
+    return order
+
+
+def astar_ged(
+    G1: CompactGraph,
+    G2: CompactGraph,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    on_improvement: Callable[[float], None] | None = None,
+    cutoff: float | None = None,
+) -> AStarResult:
+    """
+    Exact GED with a best-first (A*) search tailored to the BPMN cost model.
+    G1 nodes are mapped one at a time, in connectivity order, onto unused G2 nodes or deleted.
+    The heuristic is the label-multiset lower bound of `lower_bound` restricted to the nodes
+    and edges whose cost is not yet determined, evaluated on the integer encoding.
+    The better of the bipartite solution and a greedy dive is the initial upper bound; states
+    that cannot beat the current upper bound are pruned, so the search is complete once the
+    queue is empty. If the time budget runs out first, the best edit path found so far is
+    returned with `completed=False`.
+    With `cutoff`, the search only looks for an edit path costing at most `cutoff`: states above
+    it are pruned and the search stops at the first such path. `completed` then means that the
+    question was decided, and the GED exceeds `cutoff` exactly when the returned cost does.
+    """
+    start = time.perf_counter()
+    enc = _EncodedPair(G1, G2)
+    n1, n2 = G1.number_of_nodes(), G2.number_of_nodes()
+
+    order = _search_order(enc.adjacency_1)
+    position = np.empty(n1, dtype=np.int64)
+    position[order] = np.arange(n1)
+
+    # The bipartite edit path is the initial upper bound, expressed in search order
+    bipartite_mapping = _bipartite_mapping(enc)
+    best_cost = enc.mapping_cost(bipartite_mapping)
+    best_mapping = tuple(bipartite_mapping[order].tolist())
+    if on_improvement is not None:
+        on_improvement(best_cost)
+
+    # Label counts of the G1 nodes and edges still undetermined at each search depth
+    key_counts_1 = np.zeros((n1 + 1, enc.n_keys))
+    name_counts_1 = np.zeros((n1 + 1, enc.n_names))
+    edge_counts_1 = np.zeros((n1 + 1, enc.n_edge_labels))
+    edge_depth_1 = np.maximum(position[enc.source_1], position[enc.target_1])
+    labels_1 = enc.label_1
+    for depth in range(n1 + 1):
+        remaining = np.array(order[depth:], dtype=np.int64)
+        key_counts_1[depth] = np.bincount(enc.key_1[remaining], minlength=enc.n_keys)
+        name_counts_1[depth] = np.bincount(enc.name_1[remaining], minlength=enc.n_names)
+        edge_counts_1[depth] = np.bincount(labels_1[edge_depth_1 >= depth], minlength=enc.n_edge_labels)
+
+    key_total_2 = np.bincount(enc.key_2, minlength=enc.n_keys)
+    name_total_2 = np.bincount(enc.name_2, minlength=enc.n_names)
+    edge_total_2 = np.bincount(enc.label_2, minlength=enc.n_edge_labels)
+    key_onehot_2 = np.eye(enc.n_keys)[enc.key_2]
+    name_onehot_2 = np.eye(enc.n_names)[enc.name_2]
+    key_name_onehot = np.eye(enc.n_names)[enc.key_name]
+    edge_label_range = np.arange(enc.n_edge_labels)
+
+    def bounds(depth: int, key_counts_2: np.ndarray, name_counts_2: np.ndarray, edge_counts_2: np.ndarray, unused_2: int) -> np.ndarray:
+        # Label-multiset lower bound on the undetermined part of each state (one state per row)
+        exact = np.minimum(key_counts_1[depth], key_counts_2)
+        exact_by_name = exact @ key_name_onehot
+        partial = np.minimum(name_counts_1[depth] - exact_by_name, name_counts_2 - exact_by_name).sum(axis=1)
+        node_bound = np.maximum(n1 - depth, unused_2) - exact.sum(axis=1) - 0.5 * partial
+
+        edges_1 = edge_counts_1[depth]
+        common = np.minimum(edges_1, edge_counts_2).sum(axis=1)
+        edge_bound = np.maximum(edges_1.sum(), edge_counts_2.sum(axis=1)) - common
+        return node_bound + edge_bound
+
+    def expand(g: float, mapping: tuple) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Generate the children of a state: the next G1 node is mapped onto each unused G2 node
+        or deleted. Returns the chosen G2 indices (-1 for deletion), the children's costs and
+        their f-values; for complete edit paths the f-value is the exact total cost.
+        """
+        depth = len(mapping)
+        u = order[depth]
+        processed = np.array(order[:depth], dtype=np.int64)
+        images = np.array(mapping, dtype=np.int64)
+        mapped = images >= 0
+        used = images[mapped]
+        used_mask = np.zeros(n2, dtype=bool)
+        used_mask[used] = True
+        candidates = np.nonzero(~used_mask)[0]
+        unused_2 = len(candidates)
+
+        # Label counts of the G2 nodes and edges that are still undetermined in this state
+        key_counts_2 = key_total_2 - key_onehot_2[used].sum(axis=0)
+        name_counts_2 = name_total_2 - name_onehot_2[used].sum(axis=0)
+        determined = used_mask[enc.source_2] & used_mask[enc.target_2]
+        edge_counts_2 = edge_total_2 - np.bincount(enc.label_2[determined], minlength=enc.n_edge_labels)
+
+        out_1 = enc.adjacency_1[u, processed]
+        in_1 = enc.adjacency_1[processed, u]
+        loop_1 = enc.adjacency_1[u, u]
+
+        # Substitution costs of u -> v for every unused v, including the edges to processed nodes
+        out_2 = np.full((unused_2, depth), -1, dtype=np.int64)
+        out_2[:, mapped] = enc.adjacency_2[np.ix_(candidates, used)]
+        in_2 = np.full((unused_2, depth), -1, dtype=np.int64)
+        in_2[:, mapped] = enc.adjacency_2[np.ix_(used, candidates)].T
+        loop_2 = enc.adjacency_2[candidates, candidates]
+        steps = (
+            enc.node_costs[u, candidates]
+            + (out_2 != out_1).sum(axis=1)
+            + (in_2 != in_1).sum(axis=1)
+            + (loop_2 != loop_1)
+        )
+
+        # Mapping onto v determines the G2 edges between v and the already used nodes
+        new_labels = np.hstack([out_2, in_2, loop_2[:, None]])
+        newly_determined = (new_labels[:, :, None] == edge_label_range).sum(axis=1)
+        child_edge_counts = edge_counts_2 - newly_determined
+
+        deletion_step = 1.0 + (out_1 >= 0).sum() + (in_1 >= 0).sum() + (loop_1 >= 0)
+        children_g = np.append(g + steps, g + deletion_step)
+        children_v = np.append(candidates, -1)
+
+        if depth + 1 == n1:
+            # Complete the edit path by inserting the remaining G2 nodes and edges
+            return children_v, children_g, children_g + np.append(
+                unused_2 - 1 + child_edge_counts.sum(axis=1), unused_2 + edge_counts_2.sum()
+            )
+
+        child_key_counts = key_counts_2 - key_onehot_2[candidates]
+        child_name_counts = name_counts_2 - name_onehot_2[candidates]
+        return children_v, children_g, children_g + np.append(
+            bounds(depth + 1, child_key_counts, child_name_counts, child_edge_counts, unused_2 - 1),
+            bounds(depth + 1, key_counts_2[None, :], name_counts_2[None, :], edge_counts_2[None, :], unused_2),
+        )
+
+    if n1 == 0:
+        return AStarResult(float(n2 + len(enc.label_2)), {}, True, 0)
+
+    # Greedy dive along the most promising child to improve the initial upper bound
+    g, mapping = 0.0, ()
+    while len(mapping) < n1:
+        children_v, children_g, children_f = expand(g, mapping)
+        i = int(np.argmin(children_f))
+        g, mapping = float(children_g[i]), mapping + (int(children_v[i]),)
+    total = float(children_f[i])
+    if total < best_cost:
+        best_cost, best_mapping = total, mapping
+        if on_improvement is not None:
+            on_improvement(best_cost)
+
+    # States are pruned at `limit`: the best cost so far, or just above the cutoff
+    ceiling = math.inf if cutoff is None else math.nextafter(cutoff, math.inf)
+    limit = min(best_cost, ceiling)
+    found = cutoff is not None and best_cost <= cutoff
+
+    initial = bounds(0, key_total_2[None, :], name_total_2[None, :], edge_total_2[None, :], n2)[0]
+    queue = [(initial, 0, 0, 0.0, ())]
+    counter = 1
+    expanded = 0
+    completed = True
+
+    while queue and not found:
+        f, _, _, g, mapping = heapq.heappop(queue)
+        if f >= limit:
+            continue
+        expanded += 1
+        # An expansion of a large graph takes milliseconds, far longer than reading the clock
+        if time.perf_counter() - start > time_budget:
+            completed = False
+            break
+
+        children_v, children_g, children_f = expand(g, mapping)
+        if len(mapping) + 1 == n1:
+            i = int(np.argmin(children_f))
+            if children_f[i] < limit:
+                best_cost = float(children_f[i])
+                best_mapping = mapping + (int(children_v[i]),)
+                limit = min(best_cost, ceiling)
+                found = cutoff is not None and best_cost <= cutoff
+                if on_improvement is not None:
+                    on_improvement(best_cost)
+            continue
+
+        for v, child_g, child_f in zip(children_v.tolist(), children_g.tolist(), children_f.tolist()):
+            if child_f < limit:
+                heapq.heappush(queue, (child_f, -(len(mapping) + 1), counter, child_g, mapping + (v,)))
+                counter += 1
+
+    result_mapping = np.full(n1, -1, dtype=np.int64)
+    result_mapping[order] = best_mapping
+    return AStarResult(best_cost, enc.mapping_to_ids(result_mapping), completed, expanded)
+
+
+def identical_graphs(G1: CompactGraph, G2: CompactGraph) -> bool:
+    """
+    True if the GED of the graphs is 0, i.e. they are isomorphic including all labels.
+    The sizes and label multisets are checked before the fingerprints and the isomorphism test.
+    """
+    if G1.number_of_nodes() != G2.number_of_nodes() or G1.number_of_edges() != G2.number_of_edges():
+        return False
+    return lower_bound(G1, G2) == 0 and are_isomorphic(G1, G2)
+
+
+@lru_cache(maxsize=None)
+def get_ged_cache(path: str) -> SQLiteCache:
+    return SQLiteCache(path, GED_TABLE)
+
+
+def ged_cache_key(G1: CompactGraph, G2: CompactGraph, engine: str, time_budget: float) -> str:
+    """
+    Cache key of a GED computation. The GED is symmetric, so the fingerprints are sorted; the time
+    budget only matters for the exact engines.
+    """
+    budget = None if engine == "bipartite" else time_budget
+    return repr((engine, budget, sorted((wl_fingerprint(G1), wl_fingerprint(G2)))))
+
+
+def _graph_record(G: CompactGraph) -> list:
+    return [
+        list(G.types),
+        list(G.normalized_names),
+        G.sources.tolist(),
+        G.targets.tolist(),
+        list(G.edge_normalized_names),
+    ]
+
+
+def _graph_from_record(record: list) -> CompactGraph:
+    types, names, sources, targets, labels = record
+    ids = [str(i) for i in range(len(types))]
+    return CompactGraph.build(
+        zip(ids, types, names),
+        ((ids[s], ids[t], label) for s, t, label in zip(sources, targets, labels)),
+        names,
+        labels,
     )
 
 
-def compute_rged(json_graph_1: NormalizedBPMNGraph, json_graph_2: NormalizedBPMNGraph) -> float:
+def _cached_ged(cache: SQLiteCache, key: str, G1: CompactGraph, G2: CompactGraph) -> tuple[float, bool] | None:
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    # Fingerprints of graphs that are not isomorphic can collide, so the stored pair is compared as well
+    stored_1, stored_2 = (_graph_from_record(record) for record in entry["graphs"])
+    for first, second in ((G1, G2), (G2, G1)):
+        if identical_graphs(first, stored_1) and identical_graphs(second, stored_2):
+            return entry["ged"], entry["completed"]
+    return None
+
+
+def _graph_edit_distance(
+    G1: CompactGraph,
+    G2: CompactGraph,
+    engine: str = "exact",
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    on_improvement: Callable[[float], None] | None = None,
+    stats: SearchStats | None = None,
+) -> tuple[float, bool]:
+    if identical_graphs(G1, G2):
+        return 0.0, True
+    if engine == "bipartite":
+        return bipartite_ged(G1, G2)[0], False
+    if engine == "astar":
+        result = astar_ged(G1, G2, time_budget, on_improvement)
+        if stats is not None:
+            stats.expanded = (stats.expanded or 0) + result.expanded
+            stats.timed_out = stats.timed_out or not result.completed
+        return result.cost, result.completed
+    if engine != "exact":
+        raise ValueError(f"Unknown GED engine: {engine}. Expected one of {GED_ENGINES}")
+
+    return _anytime_search(G1, G2, time_budget, on_improvement, stats)[:2]
+
+
+def _fragment_search(task: tuple) -> tuple[float, bool, dict]:
+    # Runs in a worker process when the fragment pairs are searched in parallel
+    F1, F2, engine, time_budget = task
+    if engine == "bipartite":
+        enc = _EncodedPair(F1, F2)
+        mapping = _bipartite_mapping(enc)
+        return enc.mapping_cost(mapping), False, enc.mapping_to_ids(mapping)
+    if engine == "astar":
+        result = astar_ged(F1, F2, time_budget)
+        return result.cost, result.completed, result.mapping
+    if engine != "exact":
+        raise ValueError(f"Unknown GED engine: {engine}. Expected one of {GED_ENGINES}")
+    return _anytime_search(F1, F2, time_budget)
+
+
+def _match_fragments(fragments_1: list[CompactGraph], fragments_2: list[CompactGraph]) -> list[tuple[int, int]]:
     """
-    Compute the Relative Graph Edit Distance (Relative GED) between two graphs given in JSON format.
-    Relative GED = (GED(G1, G2) / (GED(G1, Empty) + GED(G2, Empty)))
+    Pair the fragments of both graphs by an optimal assignment on their bipartite GED estimates.
+    A fragment may also stay unmatched at the cost of deleting or inserting it completely.
+    """
+    k1, k2 = len(fragments_1), len(fragments_2)
+    cost_matrix = np.full((k1 + k2, k1 + k2), _FORBIDDEN)
+    cost_matrix[k1:, k2:] = 0.0
+    for i, F1 in enumerate(fragments_1):
+        for j, F2 in enumerate(fragments_2):
+            cost_matrix[i, j] = 0.0 if identical_graphs(F1, F2) else bipartite_ged(F1, F2)[0]
+    cost_matrix[np.arange(k1), k2 + np.arange(k1)] = [empty_graph_cost(F) for F in fragments_1]
+    cost_matrix[k1 + np.arange(k2), np.arange(k2)] = [empty_graph_cost(F) for F in fragments_2]
+
+    rows, cols = linear_sum_assignment(cost_matrix)
+    return [(row, col) for row, col in zip(rows.tolist(), cols.tolist()) if row < k1 and col < k2]
+
+
+def decomposed_ged(
+    G1: CompactGraph,
+    G2: CompactGraph,
+    engine: str = "exact",
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    max_fragment_size: int = DEFAULT_MAX_FRAGMENT_SIZE,
+    workers: int = 1,
+    stats: SearchStats | None = None,
+) -> tuple[float, bool, int, int]:
+    """
+    Fragment-wise GED. Both graphs are split into single-entry-single-exit fragments and
+    disconnected parts (`fragments.decompose`), the fragments are paired by an assignment
+    problem and every pair is searched separately with `engine`, in up to `workers` processes.
+    The fragment mappings are combined into one node mapping of the whole graphs, and the exact
+    cost of its edit path (including the edges between fragments) is the result. That cost is an
+    upper bound on the GED: an optimal edit path may cross fragment boundaries. The search is only
+    reported as completed when neither graph was split and the single search completed.
+    Returns the GED, whether it is proven optimal this way and the fragment counts of both graphs.
     """
-    empty_graph = NormalizedBPMNGraph(nodes=[], edges=[])
+    nodes_1 = decompose(G1, max_fragment_size)
+    nodes_2 = decompose(G2, max_fragment_size)
+    if len(nodes_1) <= 1 and len(nodes_2) <= 1:
+        ged, completed = _graph_edit_distance(G1, G2, engine, time_budget, stats=stats)
+        return ged, completed, len(nodes_1), len(nodes_2)
+
+    fragments_1 = [G1.subgraph(nodes) for nodes in nodes_1]
+    fragments_2 = [G2.subgraph(nodes) for nodes in nodes_2]
+    pairs = _match_fragments(fragments_1, fragments_2)
+    pairs.sort(key=lambda pair: -estimate_ged_cost(fragments_1[pair[0]], fragments_2[pair[1]], engine))
 
-    ged_G1_G2 = compute_ged(json_graph_1, json_graph_2)
-    ged_G1_empty = compute_ged(json_graph_1, empty_graph)
-    ged_G2_empty = compute_ged(json_graph_2, empty_graph)
+    # The searches share the time budget of the pair, so the wall-clock time stays within it
+    parallel = workers > 1 and len(pairs) > 1 and not multiprocessing.current_process().daemon
+    slots = min(workers, len(pairs)) if parallel else 1
+    budget = time_budget * slots / max(len(pairs), 1)
+    tasks = [(fragments_1[i], fragments_2[j], engine, budget) for i, j in pairs]
+    if parallel:
+        with ProcessPoolExecutor(max_workers=slots) as pool:
+            results = list(pool.map(_fragment_search, tasks))
+    else:
+        results = [_fragment_search(task) for task in tasks]
 
-    return ged_G1_G2 / (ged_G1_empty + ged_G2_empty)
+    mapping = {}
+    for _, fragment_completed, fragment_mapping in results:
+        mapping.update(fragment_mapping)
+        if stats is not None and engine != "bipartite":
+            stats.timed_out = stats.timed_out or not fragment_completed
+    ged = edit_path_cost(G1, G2, mapping)[0]
+    # The whole-graph bipartite edit path is another upper bound and occasionally the better one
+    ged = min(ged, bipartite_ged(G1, G2)[0])
+    return ged, False, len(nodes_1), len(nodes_2)
+
+
+def compute_ged(
+    json_graph_1: NormalizedBPMNGraph | CompactGraph,
+    json_graph_2: NormalizedBPMNGraph | CompactGraph,
+    engine: str = "exact",
+    time_budget: float = DEFAULT_TIME_BUDGET,
+) -> float:
+    """
+    Compute the Graph Edit Distance (GED) between two graphs given in JSON format.
+    `engine` selects the exact networkx search or the approximate bipartite assignment (an upper bound).
+    The exact search returns the best GED found once `time_budget` seconds have elapsed.
+    """
+    return _graph_edit_distance(
+        as_compact(json_graph_1), as_compact(json_graph_2), engine, time_budget
+    )[0]
+
+
+def compare_graphs(
+    json_graph_1: NormalizedBPMNGraph | CompactGraph,
+    json_graph_2: NormalizedBPMNGraph | CompactGraph,
+    engine: str = "exact",
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    on_improvement: Callable[[float], None] | None = None,
+    ged_cache: str | None = None,
+    max_fragment_size: int | None = None,
+    fragment_workers: int = 1,
+    search_stats: SearchStats | None = None,
+) -> GEDResult:
+    """
+    Compute GED, RGED and similarity between two graphs with a single GED search.
+    The RGED denominator is obtained in closed form from the node and edge counts.
+    The result records a lower bound on the GED and whether the reported GED is proven optimal.
+    With `ged_cache`, results are stored in that SQLite file under the graph fingerprints and
+    reused for any pair of graphs isomorphic to the stored pair.
+    With `max_fragment_size`, the GED is computed fragment-wise by `decomposed_ged` and the
+    tighter branch lower bound is used to prove optimality.
+    `search_stats` receives the statistics of the search.
+    """
+    start = time.perf_counter()
+    G1 = as_compact(json_graph_1)
+    G2 = as_compact(json_graph_2)
+
+    cache_engine = engine if max_fragment_size is None else f"{engine}/fragments:{max_fragment_size}"
+    fragments = None
+    cached = None
+    if ged_cache:
+        cache = get_ged_cache(ged_cache)
+        key = ged_cache_key(G1, G2, cache_engine, time_budget)
+        cached = _cached_ged(cache, key, G1, G2)
+    if cached is not None:
+        ged, completed = cached
+        if search_stats is not None:
+            search_stats.cached = True
+    else:
+        if max_fragment_size is None:
+            ged, completed = _graph_edit_distance(G1, G2, engine, time_budget, on_improvement, search_stats)
+        else:
+            ged, completed, *fragments = decomposed_ged(
+                G1, G2, engine, time_budget, max_fragment_size, fragment_workers, search_stats
+            )
+            fragments = tuple(fragments)
+        if ged_cache:
+            entry = {"ged": ged, "completed": completed, "graphs": [_graph_record(G1), _graph_record(G2)]}
+            cache.put(key, entry)
+    bound = lower_bound(G1, G2)
+    if max_fragment_size is not None and not completed and ged > bound:
+        bound = max(bound, branch_lower_bound(G1, G2))
+    denominator = empty_graph_cost(G1) + empty_graph_cost(G2)
+    rged = ged / denominator if denominator else 0.0
+
+    return GEDResult(
+        ged=ged,
+        rged=rged,
+        similarity=1 - rged,
+        elapsed=time.perf_counter() - start,
+        lower_bound=bound,
+        optimal=completed or ged <= bound,
+        fragments=fragments,
+    )
+
+
+def ged_budget(G1: CompactGraph, G2: CompactGraph, threshold: float) -> float:
+    """
+    Largest GED at which the similarity of the graphs is still at least `threshold`.
+    similarity = 1 - GED / (|G1| + |G2|), so the budget is (1 - threshold) times the closed-form
+    denominator, rounded down to the half-unit steps in which edit costs come.
+    """
+    denominator = empty_graph_cost(G1) + empty_graph_cost(G2)
+    return max(math.floor(((1 - threshold) * denominator + 1e-9) * 2) / 2, 0.0)
+
+
+def similarity_at_least(
+    json_graph_1: NormalizedBPMNGraph | CompactGraph,
+    json_graph_2: NormalizedBPMNGraph | CompactGraph,
+    threshold: float,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+) -> ThresholdResult:
+    """
+    Decide whether the similarity of two graphs is at least `threshold` without computing it.
+    The threshold becomes a GED budget (`ged_budget`), which is checked against bounds from
+    cheapest to most expensive: the label-multiset lower bound, the fingerprint identity test,
+    the bipartite upper bound and the branch lower bound. Only when all of them are
+    inconclusive does an A* search run, pruned at the budget and stopped at the first edit path
+    within it. `passed` is None if the search runs out of `time_budget` before deciding.
+    """
+    start = time.perf_counter()
+    G1 = as_compact(json_graph_1)
+    G2 = as_compact(json_graph_2)
+    budget = ged_budget(G1, G2, threshold)
+    lower = lower_bound(G1, G2)
+    upper = empty_graph_cost(G1) + empty_graph_cost(G2)
+
+    def decide(passed: bool | None, decided_by: str) -> ThresholdResult:
+        return ThresholdResult(passed, budget, lower, upper, decided_by, time.perf_counter() - start)
+
+    if lower > budget:
+        return decide(False, "lower bound")
+    if identical_graphs(G1, G2):
+        upper = 0.0
+        return decide(True, "identical")
+    upper = bipartite_ged(G1, G2)[0]
+    if upper <= budget:
+        return decide(True, "upper bound")
+    lower = max(lower, branch_lower_bound(G1, G2))
+    if lower > budget:
+        return decide(False, "branch bound")
+
+    result = astar_ged(G1, G2, time_budget, cutoff=budget)
+    upper = min(upper, result.cost)
+    if not result.completed:
+        return decide(None, "timeout")
+    if result.cost <= budget:
+        return decide(True, "search")
+    # Edit costs come in half units, so the GED is at least the next step above the budget
+    lower = max(lower, budget + 0.5)
+    return decide(False, "search")
+
+
+def compute_rged(
+    json_graph_1: NormalizedBPMNGraph | CompactGraph,
+    json_graph_2: NormalizedBPMNGraph | CompactGraph,
+    engine: str = "exact",
+    time_budget: float = DEFAULT_TIME_BUDGET,
+) -> float:
+    """
+    Compute the Relative Graph Edit Distance (Relative GED) between two graphs given in JSON format.
+    Relative GED = (GED(G1, G2) / (GED(G1, Empty) + GED(G2, Empty)))
+    """
+    return compare_graphs(json_graph_1, json_graph_2, engine, time_budget).rged
@@ -0,0 +1,302 @@
+import argparse
+import heapq
+import os
+import pickle
+import tempfile
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from cache import (
+    add_normalization_cache_arguments,
+    add_parse_cache_arguments,
+    normalization_cache_path,
+    parse_cache_dir,
+)
+from compact_graph import CompactGraph
+from ged import (
+    DEFAULT_TIME_BUDGET,
+    GED_ENGINES,
+    branch_lower_bound,
+    compare_graphs,
+    edge_label_cost,
+    node_label_cost,
+)
+from normalize_bpmn import TokenUsage, add_corpus_normalization_arguments, request_corpus_mapping
+from parse_bpmn import parse_bpmn_compact
+from pre_normalize import canonical_label
+
+DEFAULT_K = 5
+
+# Labels outside the index vocabulary are normalized to their canonical form with this prefix,
+# so they only match labels that are equal after canonicalization
+UNKNOWN_LABEL_PREFIX = "~"
+
+
+@dataclass
+class GraphFeatures:
+    """
+    Precomputed summary of an indexed graph for the GED lower bounds: its size, the multisets of
+    (normalized name, type) node keys (which include the type histogram) and edge labels, and the
+    out- and in-degree sequences sorted in descending order.
+    """
+
+    nodes: int
+    edges: int
+    node_keys: Counter
+    edge_labels: Counter
+    out_degrees: np.ndarray
+    in_degrees: np.ndarray
+
+    @classmethod
+    def from_graph(cls, graph: CompactGraph) -> "GraphFeatures":
+        nodes = graph.number_of_nodes()
+        return cls(
+            nodes=nodes,
+            edges=graph.number_of_edges(),
+            node_keys=Counter(zip(graph.normalized_names, graph.types)),
+            edge_labels=Counter(graph.edge_normalized_names),
+            out_degrees=-np.sort(-np.bincount(graph.sources, minlength=nodes)),
+            in_degrees=-np.sort(-np.bincount(graph.targets, minlength=nodes)),
+        )
+
+
+def _degree_cost(degrees_1: np.ndarray, degrees_2: np.ndarray) -> int:
+    # Every edge insertion or deletion changes one degree by 1; pairing sorted sequences minimises the difference
+    size = max(len(degrees_1), len(degrees_2))
+    return int(np.abs(np.pad(degrees_1, (0, size - len(degrees_1))) - np.pad(degrees_2, (0, size - len(degrees_2)))).sum())
+
+
+def features_lower_bound(features_1: GraphFeatures, features_2: GraphFeatures) -> float:
+    """
+    Lower bound on the GED from precomputed features. Node costs are bounded by the node key
+    multisets; edge costs by the larger of the edge label bound and the degree profile bound.
+    """
+    edge_bound = max(
+        edge_label_cost(features_1.edge_labels, features_2.edge_labels),
+        _degree_cost(features_1.out_degrees, features_2.out_degrees),
+        _degree_cost(features_1.in_degrees, features_2.in_degrees),
+    )
+    return node_label_cost(features_1.node_keys, features_2.node_keys) + edge_bound
+
+
+@dataclass
+class Match:
+    name: str
+    similarity: float
+    ged: float
+    optimal: bool
+
+
+class GEDIndex:
+    """
+    Library of normalized graphs for top-k similarity queries. Candidates are visited in order of
+    the similarity bound of their precomputed features, and candidates that survive it are checked
+    against the tighter branch bound before any GED is computed. Labels are normalized through the vocabulary of the library (see `build`), so
+    queries and inserts do not need an LLM call.
+    """
+
+    def __init__(self, vocabulary: dict[str, str] | None = None):
+        self.vocabulary = vocabulary or {}
+        self.names: list[str] = []
+        self.graphs: list[CompactGraph] = []
+        self.features: list[GraphFeatures] = []
+        self.positions: dict[str, int] = {}
+
+    @classmethod
+    def build(cls, named_graphs: list[tuple[str, CompactGraph]], name_mapping: dict | None = None) -> "GEDIndex":
+        """
+        Index the graphs, with a vocabulary taken from a corpus name mapping (see
+        `normalize_bpmn.request_corpus_mapping`). Without one, labels only match when they are
+        equal after canonicalization.
+        """
+        vocabulary = {canonical_label(label): name for label, name in (name_mapping or {}).items()}
+        index = cls(vocabulary)
+        for name, graph in named_graphs:
+            index.add(name, graph)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def normalize(self, graph: CompactGraph) -> CompactGraph:
+        mapping = {}
+        for label in graph.labels():
+            key = canonical_label(label)
+            mapping[label] = self.vocabulary.get(key) or f"{UNKNOWN_LABEL_PREFIX}{key}"
+        return graph.normalize(mapping)
+
+    def add(self, name: str, graph: CompactGraph) -> None:
+        """
+        Insert a graph, replacing an entry with the same name.
+        """
+        graph = self.normalize(graph)
+        features = GraphFeatures.from_graph(graph)
+        position = self.positions.get(name)
+        if position is None:
+            self.positions[name] = len(self.names)
+            self.names.append(name)
+            self.graphs.append(graph)
+            self.features.append(features)
+        else:
+            self.graphs[position] = graph
+            self.features[position] = features
+
+    def query(
+        self,
+        graph: CompactGraph,
+        k: int = DEFAULT_K,
+        engine: str = "bipartite",
+        time_budget: float = DEFAULT_TIME_BUDGET,
+    ) -> tuple[list[Match], int]:
+        """
+        The k most similar indexed graphs, most similar first, and the number of GED computations
+        that were needed. With the bipartite engine the similarities are lower bounds.
+        """
+        graph = self.normalize(graph)
+        features = GraphFeatures.from_graph(graph)
+        denominators = np.array(
+            [f.nodes + f.edges + features.nodes + features.edges for f in self.features], dtype=float
+        )
+        bounds = np.array([features_lower_bound(features, f) for f in self.features], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            upper = np.where(denominators > 0, 1 - bounds / denominators, 1.0)
+
+        # Best-first: once the k-th best similarity reaches the bound of the next candidate, no later one can beat it
+        best: list[tuple[float, int, Match]] = []
+        computed = 0
+        for position in np.argsort(-upper, kind="stable").tolist():
+            if len(best) == k and upper[position] <= best[0][0]:
+                break
+            # The branch bound needs an assignment problem, so it is only computed for the survivors
+            if len(best) == k and denominators[position]:
+                bound = branch_lower_bound(graph, self.graphs[position])
+                if 1 - bound / denominators[position] <= best[0][0]:
+                    continue
+            comparison = compare_graphs(graph, self.graphs[position], engine, time_budget)
+            computed += 1
+            match = Match(self.names[position], comparison.similarity, comparison.ged, comparison.optimal)
+            entry = (comparison.similarity, -position, match)
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry[:2] > best[0][:2]:
+                heapq.heapreplace(best, entry)
+
+        return [match for _, _, match in sorted(best, key=lambda entry: entry[:2], reverse=True)], computed
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "GEDIndex":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def parse_files(paths: list[Path], parse_cache: str | None) -> list[tuple[str, CompactGraph]]:
+    named_graphs = []
+    for path in paths:
+        try:
+            graph = parse_bpmn_compact(str(path), parse_cache)
+        except Exception as e:
+            graph = None
+            print(f"Error parsing {path.name}: {str(e)}")
+        if graph is not None:
+            named_graphs.append((path.name, graph))
+    return named_graphs
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Index BPMN models for top-k similarity queries")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build an index from all BPMN files in a directory")
+    build.add_argument("index", type=str, help="Index file to write")
+    build.add_argument("model_dir", type=str, help="Directory with the BPMN files")
+    build.add_argument(
+        "--no-normalization",
+        action="store_true",
+        help="Do not call the LLM; labels only match when they differ in case, whitespace or punctuation.",
+    )
+    add_corpus_normalization_arguments(build)
+    add_normalization_cache_arguments(build)
+
+    add = commands.add_parser("add", help="Insert BPMN files into an existing index")
+    add.add_argument("index", type=str, help="Index file to update")
+    add.add_argument("files", type=str, nargs="+", help="BPMN files to insert")
+
+    query = commands.add_parser("query", help="Find the indexed models most similar to a BPMN file")
+    query.add_argument("index", type=str, help="Index file")
+    query.add_argument("file", type=str, help="BPMN file to look up")
+    query.add_argument("-k", type=int, default=DEFAULT_K, help=f"Number of results (default: {DEFAULT_K})")
+    query.add_argument(
+        "--ged-engine",
+        choices=GED_ENGINES,
+        default="bipartite",
+        help="GED engine for the candidates that survive the lower bounds (default: bipartite)",
+    )
+    query.add_argument(
+        "--time-budget",
+        type=float,
+        default=DEFAULT_TIME_BUDGET,
+        help=f"Seconds the exact GED search may run per candidate (default: {DEFAULT_TIME_BUDGET:g})",
+    )
+
+    for command in (build, add, query):
+        add_parse_cache_arguments(command)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    parse_cache = parse_cache_dir(args)
+
+    if args.command == "build":
+        named_graphs = parse_files(sorted(Path(args.model_dir).glob("*.bpmn")), parse_cache)
+        name_mapping = None
+        if not args.no_normalization:
+            usage = TokenUsage()
+            name_mapping = request_corpus_mapping(
+                [graph for _, graph in named_graphs],
+                normalization_cache_path(args),
+                args.cache_only,
+                usage,
+                corpus_tokens=args.corpus_tokens,
+            )
+            usage.print()
+        index = GEDIndex.build(named_graphs, name_mapping)
+        index.save(args.index)
+        print(f"Indexed {len(index)} models in {args.index}")
+
+    elif args.command == "add":
+        index = GEDIndex.load(args.index)
+        for name, graph in parse_files([Path(file) for file in args.files], parse_cache):
+            index.add(name, graph)
+        index.save(args.index)
+        print(f"{args.index} now holds {len(index)} models")
+
+    else:
+        index = GEDIndex.load(args.index)
+        graph = parse_bpmn_compact(args.file, parse_cache)
+        if graph is None:
+            raise SystemExit(f"Unable to parse {args.file}")
+        matches, computed = index.query(graph, args.k, args.ged_engine, args.time_budget)
+        for rank, match in enumerate(matches, start=1):
+            optimal = "" if match.optimal else " (GED upper bound)"
+            print(f"{rank}. {match.name} - Similarity: {match.similarity:.5f}, GED: {match.ged}{optimal}")
+        print(f"GED computed for {computed} of {len(index)} models")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import json
+import resource
+import sys
+import time
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+
+# Shared no-op context handed out by disabled instrumentation
+_NULL_STAGE = nullcontext()
+
+
+def reset_peak_rss() -> None:
+    """
+    Reset the peak RSS of this process to its current RSS. Only Linux supports this; elsewhere the
+    peak keeps covering the whole life of the process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process since the last `reset_peak_rss`. Worker processes reset
+    it when a task starts, so in a worker it is the peak during that task. It still includes the
+    memory the worker held at the start, which for a forked worker is what it inherited from the
+    parent. Where the peak cannot be reset, it is the peak over the whole life of the process.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+@dataclass
+class StageTiming:
+    stage: str
+    wall_s: float
+    cpu_s: float | None = None
+    peak_rss_mb: float | None = None
+
+
+class _Stage:
+    __slots__ = ("timings", "name", "wall", "cpu")
+
+    def __init__(self, timings: list[StageTiming], name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    def __exit__(self, *exc_info) -> None:
+        self.timings.append(
+            StageTiming(
+                self.name,
+                time.perf_counter() - self.wall,
+                time.process_time() - self.cpu,
+                peak_rss_mb(),
+            )
+        )
+
+
+class Instrumentation:
+    """
+    Wall time, CPU time and peak RSS of the pipeline stages of one pair, measured with
+    `with instrumentation.stage("parse"): ...`. A disabled instance hands out a shared no-op
+    context, so the stage calls can stay in place at next to no cost.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.timings: list[StageTiming] = []
+
+    def stage(self, name: str):
+        return _Stage(self.timings, name) if self.enabled else _NULL_STAGE
+
+    def record(self, name: str, wall_s: float) -> None:
+        """
+        Record a stage measured elsewhere, e.g. the wait for an asynchronous request, which has no CPU time of its own.
+        """
+        if self.enabled:
+            self.timings.append(StageTiming(name, wall_s))
+
+    def seconds(self, name: str) -> float | None:
+        values = [timing.wall_s for timing in self.timings if timing.stage == name]
+        return round(sum(values), 6) if values else None
+
+
+class RunSummary:
+    """
+    Run-level totals of the stage timings and counters (tokens, GED search statistics) of all pairs.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+        self.counters: dict[str, float] = {}
+
+    def add(self, timing: StageTiming) -> None:
+        stage = self.stages.setdefault(
+            timing.stage, {"pairs": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_peak_rss_mb": None}
+        )
+        stage["pairs"] += 1
+        stage["wall_s"] += timing.wall_s
+        if timing.cpu_s is not None:
+            stage["cpu_s"] += timing.cpu_s
+        if timing.peak_rss_mb is not None:
+            stage["max_peak_rss_mb"] = max(stage["max_peak_rss_mb"] or 0.0, timing.peak_rss_mb)
+
+    def count(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self) -> dict:
+        stages = {
+            name: {
+                **stage,
+                "wall_s": round(stage["wall_s"], 3),
+                "mean_wall_s": round(stage["wall_s"] / stage["pairs"], 4),
+                "cpu_s": round(stage["cpu_s"], 3),
+            }
+            for name, stage in self.stages.items()
+        }
+        return {"stages": stages, **self.counters}
+
+    def print(self) -> None:
+        for name, stage in self.as_dict()["stages"].items():
+            peak = stage["max_peak_rss_mb"]
+            print(
+                f"Stage {name}: {stage['pairs']} pairs, {stage['wall_s']:.3f} s wall "
+                f"({stage['mean_wall_s']:.4f} s per pair), {stage['cpu_s']:.3f} s CPU"
+                + (f", peak RSS {peak:.1f} MB" if peak is not None else "")
+            )
+        for name, value in self.counters.items():
+            print(f"{name}: {value:g}")
+
+
+class TraceWriter:
+    """
+    Appends one JSON line per pair (its stage timings and statistics) to a trace file and flushes it.
+    Without a path, nothing is written.
+    """
+
+    def __init__(self, path: str | None):
+        self.file = open(path, "a") if path else None
+
+    def write(self, filename: str, timings: list[StageTiming], **details) -> None:
+        if self.file is None:
+            return
+        record = {"filename": filename, "stages": [asdict(timing) for timing in timings], **details}
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def write_summary(self, summary: RunSummary) -> None:
+        if self.file is not None:
+            self.file.write(json.dumps({"run_summary": summary.as_dict()}) + "\n")
+            self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def add_instrumentation_arguments(parser) -> None:
+    """
+    Add the instrumentation options shared by the folder tools.
+    """
+    parser.add_argument(
+        "--instrument",
+        action="store_true",
+        help="Measure wall time, CPU time and peak RSS per stage and pair, and print a run summary",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Append a JSONL trace with the measurements of every pair to this file (implies --instrument)",
+    )
+
+
+def instrumentation_enabled(args) -> bool:
+    return args.instrument or args.trace is not None
@@ -1,129 +1,645 @@
-from openai import OpenAI
-from pydantic import BaseModel
+from openai import BadRequestError, ContentFilterFinishReasonError, LengthFinishReasonError, OpenAI
+from pydantic import BaseModel, ValidationError
 from typing import List
-from schemas import BPMNGraph, NormalizedBPMNGraph, NormalizedNode, NormalizedEdge
+from functools import lru_cache
+from itertools import count
+from dataclasses import dataclass
+from cache import DEFAULT_PARSE_CACHE, NORMALIZATION_TABLE, SQLiteCache
+from compact_graph import CompactGraph, as_compact
+from pre_normalize import (
+    DEFAULT_LABEL_SIMILARITY,
+    LOCAL_NAME_PREFIX,
+    PreNormalization,
+    PreNormalizationStats,
+    canonical_representatives,
+    pre_normalize,
+    relabel_graph,
+)
+from schemas import BPMNGraph, NormalizedBPMNGraph
 from parse_bpmn import parse_bpmn
 from dotenv import load_dotenv
 import os
 import json
+import hashlib
+
+class GraphSummary(BaseModel):
+    elements: List[tuple[int, str]]  # (label handle, element type) of the labeled nodes and flows
+    flows: List[tuple[int, int]]  # label handles connected directly or through unlabeled elements
 
 class NormalizationRequest(BaseModel):
-    g1: List[dict]  # first graph nodes
-    g2: List[dict]  # second graph nodes
-    e1: List[dict]  # first graph edges
-    e2: List[dict]  # second graph edges
+    labels: List[str]  # distinct labels; the position of a label is its handle
+    graphs: List[GraphSummary]
+
+class PairNormalizationRequest(NormalizationRequest):
+    pair_id: int
 
+class BatchNormalizationRequest(BaseModel):
+    pairs: List[PairNormalizationRequest]
 
 
 class NormalizationMapping(BaseModel):
-    original_name: str
+    handle: int
     normalized_name: str
 
 class NormalizationResponse(BaseModel):
     name_mappings: List[NormalizationMapping]
 
+class PairNormalization(BaseModel):
+    pair_id: int
+    name_mappings: List[NormalizationMapping]
+
+class BatchNormalizationResponse(BaseModel):
+    pairs: List[PairNormalization]
+
+@dataclass
+class TokenUsage:
+    """
+    Tokens spent on normalization requests; zero for pairs that were cached or resolved locally.
+    """
+    prompt_tokens: int = 0
+    reasoning_tokens: int = 0
+    completion_tokens: int = 0
+
+    @classmethod
+    def from_completion(cls, completion) -> "TokenUsage":
+        usage = completion.usage
+        if usage is None:
+            return cls()
+        details = usage.completion_tokens_details
+        return cls(
+            prompt_tokens=usage.prompt_tokens,
+            reasoning_tokens=(details.reasoning_tokens or 0) if details is not None else 0,
+            completion_tokens=usage.completion_tokens,
+        )
+
+    def add(self, other: "TokenUsage") -> None:
+        self.prompt_tokens += other.prompt_tokens
+        self.reasoning_tokens += other.reasoning_tokens
+        self.completion_tokens += other.completion_tokens
+
+    def split(self, parts: int) -> list["TokenUsage"]:
+        """
+        Distribute the usage of one batch request evenly over its `parts` pairs.
+        """
+        def shares(total: int) -> list[int]:
+            return [total // parts + (i < total % parts) for i in range(parts)]
+
+        return [
+            TokenUsage(*values)
+            for values in zip(
+                shares(self.prompt_tokens), shares(self.reasoning_tokens), shares(self.completion_tokens)
+            )
+        ]
+
+    def print(self) -> None:
+        print(
+            f"Normalization tokens: {self.prompt_tokens} prompt, "
+            f"{self.reasoning_tokens} reasoning, {self.completion_tokens} completion"
+        )
+
 MODEL = "gpt-5-mini"
 
+# Bump whenever the request or response format changes, so that cached mappings are invalidated
+NORMALIZATION_CACHE_VERSION = 2
+
+# Estimated payload tokens of one corpus request; larger corpora are split into several requests
+DEFAULT_CORPUS_TOKENS = 16000
+
+class CacheMissError(LookupError):
+    """
+    Raised in cache-only mode when a normalization is not in the cache.
+    """
+
+class BatchResponseError(ValueError):
+    """
+    Raised when a response does not contain exactly one valid mapping per pair, e.g. after a
+    refusal or truncated output.
+    """
+
+# Errors after which a batch is split in half and requested again
+MALFORMED_BATCH_ERRORS = (
+    BatchResponseError,
+    ValidationError,
+    LengthFinishReasonError,
+    ContentFilterFinishReasonError,
+)
+
+
+def is_context_length_error(exc: Exception) -> bool:
+    return isinstance(exc, BadRequestError) and exc.code == "context_length_exceeded"
+
 PROMPT = """Normalize BPMN task, event, and sequence flow labels by mapping them to simple letter names (A, B, C, etc.):
 - Match semantically similar elements (tasks, events, flows)
 - Use ONLY letters (A, B, C, etc.) as normalized names for ALL elements
 - Same elements get same letters ONLY if they are semantically similar
 - Different/unrelated elements MUST get different letters
-- Consider element sequence via edges
-- Only normalize elements that have labels/names - ignore unlabeled elements
-- Do not normalize IDs, only normalize labels/names
+- Consider element sequence via flows
+- Return exactly one normalized name for every label handle
+
+Input format:
+- "labels" lists every distinct label once; the position of a label (starting at 0) is its handle
+- "graphs" describes each model: "elements" are its labeled elements as [handle, type],
+  "flows" are [from, to] pairs of handles that follow each other directly or through unlabeled elements
+- A sequence flow label is an element of type "sequenceFlow" between its source and target
 
 Examples:
 
 Input:
-{
-  "g1": [
-    {"name": "Submit order", "type": "task", "id": "1"},
-    {"name": "Process payment", "type": "task", "id": "2"}
-  ],
-  "g2": [
-    {"name": "Send order", "type": "task", "id": "task_1"},
-    {"name": "Handle payment", "type": "task", "id": "task_2"}
-  ],
-  "e1": [
-    {"name": "Order submitted", "source": "1", "target": "2"}
-  ],
-  "e2": [
-    {"name": "Order sent", "source": "task_1", "target": "task_2"}
-  ]
-}
+{"labels":["Submit order","Process payment","Order submitted","Send order","Handle payment","Order sent"],
+"graphs":[{"elements":[[0,"task"],[1,"task"],[2,"sequenceFlow"]],"flows":[[0,2],[2,1]]},
+{"elements":[[3,"task"],[4,"task"],[5,"sequenceFlow"]],"flows":[[3,5],[5,4]]}]}
 
 Expected Output:
 {
   "name_mappings": [
-    {"original_name": "Submit order", "normalized_name": "A"},
-    {"original_name": "Send order", "normalized_name": "A"},
-    {"original_name": "Process payment", "normalized_name": "B"},
-    {"original_name": "Handle payment", "normalized_name": "B"},
-    {"original_name": "Order submitted", "normalized_name": "C"},
-    {"original_name": "Order sent", "normalized_name": "C"}
+    {"handle": 0, "normalized_name": "A"},
+    {"handle": 3, "normalized_name": "A"},
+    {"handle": 1, "normalized_name": "B"},
+    {"handle": 4, "normalized_name": "B"},
+    {"handle": 2, "normalized_name": "C"},
+    {"handle": 5, "normalized_name": "C"}
   ]
 }"""
 
-def create_normalized_graph(graph: BPMNGraph, name_mapping: dict) -> NormalizedBPMNGraph:
+BATCH_PROMPT = PROMPT + """
+
+Batch mode: the input contains several independent requests in the format above:
+{"pairs": [{"pair_id": 0, "labels": [...], "graphs": [...]}, ...]}
+- Normalize every pair separately, exactly as described above
+- Handles and letters are only compared within a pair; each pair starts again at A
+- Return one entry per pair with its pair_id:
+{"pairs": [{"pair_id": 0, "name_mappings": [...]}, ...]}"""
+
+def create_normalized_graph(graph: BPMNGraph | CompactGraph, name_mapping: dict) -> NormalizedBPMNGraph:
     """
     Create a normalized graph from the given graph using the provided name mappings.
     """
-    normalized_nodes = []
-    for node in graph.nodes:
-        normalized_node = NormalizedNode(
-            id=node.id,
-            type=node.type,
-            original_name=node.name,
-            normalized_name=name_mapping.get(node.name) if node.name else None
-        )
-        normalized_nodes.append(normalized_node)
-    
-    normalized_edges = []
-    for edge in graph.edges:
-        normalized_edge = NormalizedEdge(
-            source=edge.source,
-            target=edge.target,
-            original_name=edge.name,
-            normalized_name=name_mapping.get(edge.name) if edge.name else None
-        )
-        normalized_edges.append(normalized_edge)
-    
-    return NormalizedBPMNGraph(nodes=normalized_nodes, edges=normalized_edges)
+    return as_compact(graph).normalize(name_mapping).to_normalized_graph()
 
-def normalize_graphs(graph1: BPMNGraph, graph2: BPMNGraph, source_file: str) -> tuple[NormalizedBPMNGraph, NormalizedBPMNGraph]:
-    load_dotenv(override=True)
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-    request = NormalizationRequest(
-        g1=[n.model_dump() for n in graph1.nodes],
-        g2=[n.model_dump() for n in graph2.nodes],
-        e1=[e.model_dump() for e in graph1.edges],
-        e2=[e.model_dump() for e in graph2.edges]
+def summarize_graph(graph: CompactGraph, handles: dict[str, int]) -> GraphSummary:
+    """
+    Condense a graph to its labeled elements and the flows between them. Labeled sequence flows
+    become elements of their own; unlabeled elements are skipped over, so that e.g. two tasks
+    joined by an unlabeled gateway are reported as one flow.
+    """
+    node_count = graph.number_of_nodes()
+    element_handles: list[int | None] = [
+        handles.setdefault(name, len(handles)) if name else None for name in graph.names
+    ]
+    element_types = list(graph.types)
+    successors: list[list[int]] = [[] for _ in range(node_count)]
+    for source, target, name in zip(graph.sources.tolist(), graph.targets.tolist(), graph.edge_names):
+        if name:
+            flow = len(element_handles)
+            element_handles.append(handles.setdefault(name, len(handles)))
+            element_types.append("sequenceFlow")
+            successors.append([target])
+            successors[source].append(flow)
+        else:
+            successors[source].append(target)
+
+    elements = []
+    flows = []
+    for element, handle in enumerate(element_handles):
+        if handle is None:
+            continue
+        elements.append((handle, element_types[element]))
+        # Follow paths through unlabeled elements up to the next labeled ones
+        stack = list(successors[element])
+        visited = set(stack)
+        while stack:
+            successor = stack.pop()
+            if element_handles[successor] is not None:
+                flows.append((handle, element_handles[successor]))
+                continue
+            for following in successors[successor]:
+                if following not in visited:
+                    visited.add(following)
+                    stack.append(following)
+
+    return GraphSummary(elements=sorted(set(elements)), flows=sorted(set(flows)))
+
+
+def build_normalization_request(*graphs: CompactGraph) -> NormalizationRequest:
+    """
+    Compact wire format of the labels of any number of graphs: every distinct label is sent once
+    with a numeric handle, each graph as a summary of its labeled elements and flows.
+    """
+    handles: dict[str, int] = {}
+    summaries = [summarize_graph(graph, handles) for graph in graphs]
+    return NormalizationRequest(labels=list(handles), graphs=summaries)
+
+
+def request_payload(request: NormalizationRequest) -> str:
+    return request.model_dump_json()
+
+
+def expand_mapping(request: NormalizationRequest, name_mappings: List[NormalizationMapping]) -> dict:
+    """
+    Translate handle mappings back to label mappings, ignoring handles that do not exist.
+    """
+    return {
+        request.labels[m.handle]: m.normalized_name
+        for m in name_mappings
+        if 0 <= m.handle < len(request.labels)
+    }
+
+
+def prepare_normalization(
+    graph1: CompactGraph, graph2: CompactGraph, label_similarity: float | None = DEFAULT_LABEL_SIMILARITY
+) -> tuple[PreNormalization, NormalizationRequest | None]:
+    """
+    Match labels locally and build the request, or None when every label was matched and the LLM
+    call can be skipped. Labels matched locally are sent once, as the first label of their match.
+    """
+    pre_normalization = pre_normalize(graph1, graph2, label_similarity)
+    if not pre_normalization.needs_llm:
+        return pre_normalization, None
+    representatives = pre_normalization.representatives
+    request = build_normalization_request(
+        relabel_graph(graph1, representatives), relabel_graph(graph2, representatives)
     )
+    return pre_normalization, request
+
+
+def combine_mappings(pre_normalization: PreNormalization, name_mapping: dict) -> dict:
+    # Matched labels share the name of their representative; local names only fill in labels the LLM left out
+    matched = {
+        label: name_mapping[representative]
+        for label, representative in pre_normalization.representatives.items()
+        if representative in name_mapping
+    }
+    return {**pre_normalization.mapping, **name_mapping, **matched}
+
 
-    completion_args = {
+@lru_cache(maxsize=None)
+def get_normalization_cache(path: str) -> SQLiteCache:
+    """
+    Open the normalization cache at `path` once per process.
+    """
+    return SQLiteCache(path, NORMALIZATION_TABLE)
+
+
+def normalization_cache_key(request: NormalizationRequest, prompt: str = PROMPT) -> str:
+    """
+    Content address of a normalization: the cache version, the model, the prompt the mapping was
+    requested with and the canonical request payload.
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    payload = json.dumps(request.model_dump(), sort_keys=True, separators=(",", ":"))
+    key = f"{NORMALIZATION_CACHE_VERSION}\n{MODEL}\n{prompt_hash}\n{payload}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def lookup_prompts(batch_tokens: int = 0) -> tuple[str, ...]:
+    """
+    Prompts whose cached mappings a run may reuse, the prompt of its own mode first. Both prompts
+    ask for the same mapping, so single-pair and cache-only runs also reuse batched mappings, and
+    batched runs the single-pair mappings of oversized pairs and split batches.
+    """
+    return (BATCH_PROMPT, PROMPT) if batch_tokens else (PROMPT, BATCH_PROMPT)
+
+
+def cached_name_mapping(
+    request: NormalizationRequest,
+    cache_path: str | None,
+    cache_only: bool = False,
+    prompts: tuple[str, ...] = lookup_prompts(),
+) -> dict | None:
+    """
+    Look up the mapping of a request, as requested with any of `prompts`, in the persistent cache.
+    The lookup counts as one hit or miss however many prompts are probed.
+    In cache-only mode a miss raises CacheMissError instead of returning None.
+    """
+    if cache_path is None:
+        if cache_only:
+            raise ValueError("Cache-only normalization requires a cache path.")
+        return None
+    cache = get_normalization_cache(cache_path)
+    name_mapping = None
+    for prompt in prompts:
+        name_mapping = cache.get(normalization_cache_key(request, prompt), count=False)
+        if name_mapping is not None:
+            break
+    cache.count_lookup(name_mapping is not None)
+    if name_mapping is None and cache_only:
+        raise CacheMissError("Normalization not found in cache (cache-only mode).")
+    return name_mapping
+
+
+def store_name_mapping(
+    request: NormalizationRequest, cache_path: str | None, name_mapping: dict, prompt: str = PROMPT
+) -> None:
+    if cache_path is not None:
+        get_normalization_cache(cache_path).put(normalization_cache_key(request, prompt), name_mapping)
+
+
+def completion_arguments(request: NormalizationRequest) -> dict:
+    return {
         "model": MODEL,
         "messages": [
             {"role": "system", "content": PROMPT},
-            {"role": "user", "content": str(request.model_dump())}
+            {"role": "user", "content": request_payload(request)}
         ],
         "response_format": NormalizationResponse
     }
 
 
-    completion = client.beta.chat.completions.parse(**completion_args)
+def mapping_from_completion(completion, request: NormalizationRequest) -> tuple[dict, TokenUsage]:
+    """
+    Raises BatchResponseError when the response could not be parsed, e.g. after a refusal.
+    """
+    message = completion.choices[0].message
+    if message.parsed is None:
+        reason = f": {message.refusal}" if getattr(message, "refusal", None) else "."
+        raise BatchResponseError(f"Response could not be parsed{reason}")
+    return expand_mapping(request, message.parsed.name_mappings), TokenUsage.from_completion(completion)
 
-    # print(f"Input tokens: {completion.usage.prompt_tokens}")
-    # print(f"Reasoning tokens: {completion.usage.completion_tokens_details.reasoning_tokens}")
-    print(f"Output tokens: {completion.usage.completion_tokens}")
 
-    # Create normalized graphs using the mappings from LLM
-    name_mapping = {m.original_name: m.normalized_name for m in completion.choices[0].message.parsed.name_mappings}
+def estimate_tokens(request: NormalizationRequest) -> int:
+    # Roughly four characters per token for the serialized payload
+    return len(request_payload(request)) // 4 + 1
+
+
+def pack_batches(requests: list[NormalizationRequest], batch_tokens: int) -> list[list[int]]:
+    """
+    Group request indices into consecutive batches whose estimated payload stays within `batch_tokens`.
+    A pair larger than the budget forms a batch of its own; a budget of 0 disables batching.
+    """
+    batches: list[list[int]] = []
+    batch_size = 0
+    for index, request in enumerate(requests):
+        tokens = estimate_tokens(request)
+        if batches and batch_size + tokens <= batch_tokens:
+            batches[-1].append(index)
+            batch_size += tokens
+        else:
+            batches.append([index])
+            batch_size = tokens
+    return batches
+
+
+def batch_completion_arguments(requests: list[NormalizationRequest]) -> dict:
+    batch = BatchNormalizationRequest(
+        pairs=[
+            PairNormalizationRequest(pair_id=pair_id, labels=request.labels, graphs=request.graphs)
+            for pair_id, request in enumerate(requests)
+        ]
+    )
+    return {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": BATCH_PROMPT},
+            {"role": "user", "content": batch.model_dump_json()}
+        ],
+        "response_format": BatchNormalizationResponse
+    }
+
+
+def mappings_from_batch_completion(
+    completion, requests: list[NormalizationRequest]
+) -> list[tuple[dict, TokenUsage]]:
+    """
+    Split a batch response into one mapping per request, in request order, with the token usage
+    of the call shared evenly between the pairs.
+    Raises BatchResponseError unless every pair is answered exactly once and maps exactly its own handles.
+    """
+    parsed = completion.choices[0].message.parsed
+    if parsed is None:
+        raise BatchResponseError("Batch response could not be parsed.")
+
+    pairs: dict[int, PairNormalization] = {}
+    for pair in parsed.pairs:
+        if pair.pair_id in pairs or not 0 <= pair.pair_id < len(requests):
+            raise BatchResponseError(f"Unexpected or duplicate pair_id {pair.pair_id}.")
+        pairs[pair.pair_id] = pair
+    if len(pairs) != len(requests):
+        raise BatchResponseError(f"Batch response covers {len(pairs)} of {len(requests)} pairs.")
+
+    for pair_id, request in enumerate(requests):
+        handles = [m.handle for m in pairs[pair_id].name_mappings]
+        if sorted(handles) != list(range(len(request.labels))):
+            raise BatchResponseError(f"Handles of pair {pair_id} do not match its request.")
+
+    usages = TokenUsage.from_completion(completion).split(len(requests))
+    return [
+        (expand_mapping(request, pairs[pair_id].name_mappings), usages[pair_id])
+        for pair_id, request in enumerate(requests)
+    ]
+
+
+def request_batch(
+    client: OpenAI, requests: list[NormalizationRequest]
+) -> list[tuple[dict, TokenUsage, str]]:
+    """
+    Normalize several pairs with one request. A malformed response is split in half and
+    requested again, down to the single-pair prompt. Every mapping comes with the prompt
+    it was requested with.
+    """
+    if len(requests) == 1:
+        completion = client.beta.chat.completions.parse(**completion_arguments(requests[0]))
+        return [(*mapping_from_completion(completion, requests[0]), PROMPT)]
+    try:
+        completion = client.beta.chat.completions.parse(**batch_completion_arguments(requests))
+        return [
+            (*result, BATCH_PROMPT) for result in mappings_from_batch_completion(completion, requests)
+        ]
+    except MALFORMED_BATCH_ERRORS as e:
+        print(f"Malformed batch response for {len(requests)} pairs, splitting: {e}")
+    half = len(requests) // 2
+    return request_batch(client, requests[:half]) + request_batch(client, requests[half:])
+
+
+def request_name_mapping(
+    graph1: CompactGraph,
+    graph2: CompactGraph,
+    cache_path: str | None = None,
+    cache_only: bool = False,
+    label_similarity: float | None = DEFAULT_LABEL_SIMILARITY,
+    stats: PreNormalizationStats | None = None,
+    usage: TokenUsage | None = None,
+) -> dict:
+    """
+    Ask the LLM to map the labels of both graphs to normalized letter names.
+    Labels matched by the local pre-pass (see `pre_normalize`) are sent once per match, and the call
+    is skipped when every label is matched; `stats` accumulates the savings and `usage` the tokens spent.
+    With `cache_path`, mappings are looked up in and stored to the persistent cache;
+    `cache_only` raises CacheMissError instead of calling the API on a miss.
+    """
+    pre_normalization, request = prepare_normalization(graph1, graph2, label_similarity)
+    if stats is not None:
+        stats.add(pre_normalization)
+    if request is None:
+        return pre_normalization.mapping
+
+    name_mapping = cached_name_mapping(request, cache_path, cache_only)
+    if name_mapping is not None:
+        return combine_mappings(pre_normalization, name_mapping)
+
+    load_dotenv(override=True)
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    completion = client.beta.chat.completions.parse(**completion_arguments(request))
+
+    name_mapping, completion_usage = mapping_from_completion(completion, request)
+    if usage is not None:
+        usage.add(completion_usage)
+    store_name_mapping(request, cache_path, name_mapping)
+    return combine_mappings(pre_normalization, name_mapping)
+
+
+def merge_chunk_mappings(chunk_mappings: list[dict]) -> dict:
+    """
+    Combine the name mappings of separately normalized corpus chunks. Names are only comparable
+    within a chunk, so they are qualified by their chunk, and a label that occurs in several chunks
+    joins the names it got in each of them.
+    """
+    if len(chunk_mappings) == 1:
+        return chunk_mappings[0]
+    parent: dict = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for chunk, name_mapping in enumerate(chunk_mappings):
+        for label, name in name_mapping.items():
+            parent[find(("label", label))] = find((chunk, name))
+
+    names: dict = {}
+    merged = {}
+    for chunk, name_mapping in enumerate(chunk_mappings):
+        for label, name in name_mapping.items():
+            merged[label] = names.setdefault(find(("label", label)), f"{name}/{chunk}")
+    return merged
 
-    graph1_normalized = create_normalized_graph(graph1, name_mapping)
-    graph2_normalized = create_normalized_graph(graph2, name_mapping)
 
+def request_corpus_mapping(
+    graphs: list[CompactGraph],
+    cache_path: str | None = None,
+    cache_only: bool = False,
+    usage: TokenUsage | None = None,
+    use_llm: bool = True,
+    corpus_tokens: int = DEFAULT_CORPUS_TOKENS,
+) -> dict:
+    """
+    One name mapping for all labels of a corpus, so that every pair of its graphs is compared with
+    the same vocabulary. Labels that are equal after canonicalization are sent once and share their
+    name; labels the LLM leaves out, or all labels when `use_llm` is False, get local names.
+    The graphs are sent in chunks of at most `corpus_tokens` estimated payload tokens (0: a single
+    request); a chunk whose response is truncated or malformed, or that exceeds the context length,
+    is split in half and requested again. The chunk mappings are merged by `merge_chunk_mappings`.
+    """
+    representatives = canonical_representatives(graphs)
+    graphs = [relabel_graph(graph, representatives) for graph in graphs]
+    labels = build_normalization_request(*graphs).labels
+    client = None
+
+    def request_chunk(chunk: list[CompactGraph]) -> list[dict]:
+        nonlocal client
+        request = build_normalization_request(*chunk)
+        if not request.labels:
+            return []
+        name_mapping = cached_name_mapping(request, cache_path, cache_only)
+        if name_mapping is not None:
+            return [name_mapping]
+        if client is None:
+            load_dotenv(override=True)
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        try:
+            completion = client.beta.chat.completions.parse(**completion_arguments(request))
+            name_mapping, completion_usage = mapping_from_completion(completion, request)
+        except (*MALFORMED_BATCH_ERRORS, BadRequestError) as e:
+            if len(chunk) == 1 or (isinstance(e, BadRequestError) and not is_context_length_error(e)):
+                raise
+            print(f"Corpus request for {len(chunk)} models failed, splitting: {e}")
+            half = len(chunk) // 2
+            return request_chunk(chunk[:half]) + request_chunk(chunk[half:])
+        if usage is not None:
+            usage.add(completion_usage)
+        store_name_mapping(request, cache_path, name_mapping)
+        return [name_mapping]
+
+    name_mapping = {}
+    if use_llm and labels:
+        if corpus_tokens:
+            chunks = pack_batches([build_normalization_request(graph) for graph in graphs], corpus_tokens)
+        else:
+            chunks = [list(range(len(graphs)))]
+        chunk_mappings = [
+            mapping for chunk in chunks for mapping in request_chunk([graphs[i] for i in chunk])
+        ]
+        name_mapping = merge_chunk_mappings(chunk_mappings) if chunk_mappings else {}
+
+    local_names = count(1)
+    representative_names = {
+        label: name_mapping.get(label) or f"{LOCAL_NAME_PREFIX}{next(local_names)}" for label in labels
+    }
+    return {label: representative_names[representative] for label, representative in representatives.items()}
+
+
+def add_corpus_normalization_arguments(parser) -> None:
+    """
+    Add the corpus normalization options shared by the corpus tools.
+    """
+    parser.add_argument(
+        "--corpus-tokens",
+        type=int,
+        default=DEFAULT_CORPUS_TOKENS,
+        help=f"Estimated payload tokens per corpus normalization request; larger corpora are split into several requests, 0 sends a single request (default: {DEFAULT_CORPUS_TOKENS})",
+    )
+
+
+def request_name_mappings(
+    graph_pairs: list[tuple[CompactGraph, CompactGraph]],
+    cache_path: str | None = None,
+    cache_only: bool = False,
+    batch_tokens: int = 0,
+    label_similarity: float | None = DEFAULT_LABEL_SIMILARITY,
+    stats: PreNormalizationStats | None = None,
+    usage: TokenUsage | None = None,
+) -> list[dict]:
+    """
+    Name mappings for many graph pairs. Pairs that are not cached are packed into batch requests
+    of at most `batch_tokens` estimated payload tokens each (0: one request per pair).
+    Batch results are cached per pair, under the same keys as single-pair requests.
+    """
+    prepared = [prepare_normalization(graph1, graph2, label_similarity) for graph1, graph2 in graph_pairs]
+    if stats is not None:
+        for pre_normalization, _ in prepared:
+            stats.add(pre_normalization)
+
+    requests = [request for _, request in prepared]
+    prompts = lookup_prompts(batch_tokens)
+    name_mappings = [
+        cached_name_mapping(request, cache_path, cache_only, prompts) if request is not None else {}
+        for request in requests
+    ]
+    missing = [i for i, name_mapping in enumerate(name_mappings) if name_mapping is None]
+    if not missing:
+        return [combine_mappings(pre, name_mapping) for (pre, _), name_mapping in zip(prepared, name_mappings)]
+
+    load_dotenv(override=True)
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    for batch in pack_batches([requests[i] for i in missing], batch_tokens):
+        indices = [missing[i] for i in batch]
+        batch_mappings = request_batch(client, [requests[i] for i in indices])
+        for i, (name_mapping, pair_usage, prompt) in zip(indices, batch_mappings):
+            if usage is not None:
+                usage.add(pair_usage)
+            store_name_mapping(requests[i], cache_path, name_mapping, prompt)
+            name_mappings[i] = name_mapping
+    return [combine_mappings(pre, name_mapping) for (pre, _), name_mapping in zip(prepared, name_mappings)]
+
+
+def write_normalized_graphs(
+    graph1_normalized: CompactGraph, graph2_normalized: CompactGraph, name_mapping: dict, source_file: str
+) -> None:
     # Create normalized_graphs directory if it doesn't exist
     output_dir = "normalized_graphs"
     os.makedirs(output_dir, exist_ok=True)
@@ -133,18 +649,82 @@ def normalize_graphs(graph1: BPMNGraph, graph2: BPMNGraph, source_file: str) ->
     filename = os.path.join(output_dir, f"{base_filename}_normalized.json")
     
     output_data = {
-        "graph1": graph1_normalized.model_dump(),
-        "graph2": graph2_normalized.model_dump(),
+        "graph1": graph1_normalized.to_normalized_graph().model_dump(),
+        "graph2": graph2_normalized.to_normalized_graph().model_dump(),
         "mappings": name_mapping
     }
     
     with open(filename, "w") as f:
         json.dump(output_data, f, indent=2)
-    
+
+
+def normalize_compact_graphs(
+    graph1: BPMNGraph | CompactGraph,
+    graph2: BPMNGraph | CompactGraph,
+    source_file: str,
+    cache_path: str | None = None,
+    cache_only: bool = False,
+    label_similarity: float | None = DEFAULT_LABEL_SIMILARITY,
+    stats: PreNormalizationStats | None = None,
+    usage: TokenUsage | None = None,
+) -> tuple[CompactGraph, CompactGraph]:
+    graph1 = as_compact(graph1)
+    graph2 = as_compact(graph2)
+
+    # Create normalized graphs using the mappings from LLM
+    name_mapping = request_name_mapping(
+        graph1, graph2, cache_path, cache_only, label_similarity, stats, usage
+    )
+
+    graph1_normalized = graph1.normalize(name_mapping)
+    graph2_normalized = graph2.normalize(name_mapping)
+    write_normalized_graphs(graph1_normalized, graph2_normalized, name_mapping, source_file)
+
     return graph1_normalized, graph2_normalized
 
 
+def normalize_graph_pairs(
+    graph_pairs: list[tuple[BPMNGraph | CompactGraph, BPMNGraph | CompactGraph]],
+    source_files: list[str],
+    cache_path: str | None = None,
+    cache_only: bool = False,
+    batch_tokens: int = 0,
+    label_similarity: float | None = DEFAULT_LABEL_SIMILARITY,
+    stats: PreNormalizationStats | None = None,
+    usage: TokenUsage | None = None,
+) -> list[tuple[NormalizedBPMNGraph, NormalizedBPMNGraph]]:
+    """
+    Batched counterpart of `normalize_graphs` for many pairs, see `request_name_mappings`.
+    """
+    graph_pairs = [(as_compact(graph1), as_compact(graph2)) for graph1, graph2 in graph_pairs]
+    name_mappings = request_name_mappings(
+        graph_pairs, cache_path, cache_only, batch_tokens, label_similarity, stats, usage
+    )
+
+    normalized_pairs = []
+    for (graph1, graph2), name_mapping, source_file in zip(graph_pairs, name_mappings, source_files):
+        graph1_normalized = graph1.normalize(name_mapping)
+        graph2_normalized = graph2.normalize(name_mapping)
+        write_normalized_graphs(graph1_normalized, graph2_normalized, name_mapping, source_file)
+        normalized_pairs.append((graph1_normalized.to_normalized_graph(), graph2_normalized.to_normalized_graph()))
+    return normalized_pairs
+
+
+def normalize_graphs(
+    graph1: BPMNGraph | CompactGraph,
+    graph2: BPMNGraph | CompactGraph,
+    source_file: str,
+    cache_path: str | None = None,
+    cache_only: bool = False,
+    label_similarity: float | None = DEFAULT_LABEL_SIMILARITY,
+) -> tuple[NormalizedBPMNGraph, NormalizedBPMNGraph]:
+    graph1_normalized, graph2_normalized = normalize_compact_graphs(
+        graph1, graph2, source_file, cache_path, cache_only, label_similarity
+    )
+    return graph1_normalized.to_normalized_graph(), graph2_normalized.to_normalized_graph()
+
+
 if __name__ == "__main__":
-    graph1 = parse_bpmn("models/first.bpmn")
-    graph2 = parse_bpmn("models/second.bpmn")
+    graph1 = parse_bpmn("models/first.bpmn", DEFAULT_PARSE_CACHE)
+    graph2 = parse_bpmn("models/second.bpmn", DEFAULT_PARSE_CACHE)
     _, _ = normalize_graphs(graph1, graph2, "models/first.bpmn")
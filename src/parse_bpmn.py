@@ -1,42 +1,191 @@
+import hashlib
 import json
+import mmap
+import os
+import re
 import xml.etree.ElementTree as ET
-from typing import Optional
+from functools import lru_cache
+from typing import Iterator, Optional
 import argparse
 
+from cache import PickleDirCache
+from compact_graph import CompactGraph
 from schemas import BPMNGraph
 
 
-def parse_bpmn(file_path: str) -> Optional[BPMNGraph]:
-    tree = ET.parse(file_path)
-    root = tree.getroot()
+# Bump whenever the graphs produced by the parser change, so that cached graphs are invalidated
+PARSER_VERSION = 2
+
+BPMN_NAMESPACE = "{http://www.omg.org/spec/BPMN/20100524/MODEL}"
+
+# Activities whose tag does not end in "Task", "Event" or "Gateway"
+ACTIVITY_TAGS = {"task", "subProcess", "adHocSubProcess", "transaction", "callActivity"}
+
+CHUNK_SIZE = 1 << 20
+
+_DI_PREFIX = re.compile(rb"""xmlns:([\w.-]+)\s*=\s*["']http://www\.omg\.org/spec/BPMN/20100524/DI["']""")
+
+
+def is_flow_node(tag: str) -> bool:
+    return tag in ACTIVITY_TAGS or tag.endswith(("Task", "Event", "Gateway"))
+
+
+class _GraphBuilder:
+    """
+    Parser target that collects the flow nodes and flows of every process without building a tree.
+    Elements outside the BPMN namespace (the bpmndi diagram interchange section) and the content of
+    flow nodes (sub-process internals, documentation, extensions) are skipped as a whole.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.sequence_flows = []
+        self.message_flows = []
+        self.processes = 0
+        self.path = []
+        self.skip_depth = 0
+
+    def start(self, tag, attrib, nsmap=None):
+        if self.skip_depth:
+            self.skip_depth += 1
+            return
+        if not tag.startswith(BPMN_NAMESPACE):
+            self.skip_depth = 1
+            return
+        tag = tag[len(BPMN_NAMESPACE) :]
+        parent = self.path[-1] if self.path else None
+        if parent == "process":
+            if tag == "sequenceFlow":
+                self.sequence_flows.append((attrib["sourceRef"], attrib["targetRef"], attrib.get("name")))
+            elif is_flow_node(tag):
+                self.nodes.append((attrib["id"], tag, attrib.get("name")))
+            self.skip_depth = 1
+            return
+        if parent == "collaboration":
+            if tag == "messageFlow":
+                self.message_flows.append((attrib["sourceRef"], attrib["targetRef"], attrib.get("name")))
+            self.skip_depth = 1
+            return
+        if tag == "process":
+            self.processes += 1
+        self.path.append(tag)
+
+    def end(self, tag):
+        if self.skip_depth:
+            self.skip_depth -= 1
+        else:
+            self.path.pop()
 
-    # Define the namespaces used in the XML
-    namespaces = {"bpmn": "http://www.omg.org/spec/BPMN/20100524/MODEL"}
+    def close(self):
+        return self
 
-    process = root.find("bpmn:process", namespaces)
-    if process is None:
-        print("No process found in the BPMN file.")
-        return None
 
-    graph_data = {"nodes": [], "edges": []}
-
-    for element in process:
-        tag = element.tag.split("}")[-1]  # Remove namespace
-        if tag == "sequenceFlow":
-            edge = {
-                "source": element.attrib["sourceRef"],
-                "target": element.attrib["targetRef"],
-            }
-            if "name" in element.attrib:
-                edge["name"] = element.attrib["name"]
-            graph_data["edges"].append(edge)
+def _xml_parser(target):
+    try:
+        from lxml import etree
+    except ImportError:
+        return ET.XMLParser(target=target)
+    # "internal" expands character and internal entities such as &amp; like the standard library
+    # parser does, but never loads external entities
+    return etree.XMLParser(target=target, resolve_entities="internal", huge_tree=True)
+
+
+def _content_spans(data) -> Iterator[tuple[int, int]]:
+    """
+    Byte ranges of the document outside its BPMNDiagram elements. The diagram interchange section
+    makes up most of a typical exported file, so cutting it out before the XML parser runs avoids
+    tokenizing it. Documents that declare the DI namespace elsewhere than on the root are passed
+    through whole; the parser target skips their diagram elements instead.
+    """
+    match = _DI_PREFIX.search(data, 0, CHUNK_SIZE)
+    if match is None:
+        yield 0, len(data)
+        return
+    prefix = re.escape(match.group(1))
+    diagram = re.compile(rb"<" + prefix + rb":BPMNDiagram[\s/>]")
+    closing = re.compile(rb"</" + prefix + rb":BPMNDiagram\s*>")
+
+    position = 0
+    while (match := diagram.search(data, position)) is not None:
+        start_tag_end = data.find(b">", match.start()) + 1
+        if data[start_tag_end - 2 : start_tag_end] == b"/>":
+            end = start_tag_end
         else:
-            node = {"id": element.attrib["id"], "type": tag}
-            if "name" in element.attrib:
-                node["name"] = element.attrib["name"]
-            graph_data["nodes"].append(node)
+            match_end = closing.search(data, start_tag_end)
+            if match_end is None:
+                break
+            end = match_end.end()
+        yield position, match.start()
+        position = end
+    yield position, len(data)
+
+
+def _parse(data) -> Optional[CompactGraph]:
+    builder = _GraphBuilder()
+    parser = _xml_parser(builder)
+    for start, end in _content_spans(data):
+        for chunk_start in range(start, end, CHUNK_SIZE):
+            parser.feed(data[chunk_start : min(chunk_start + CHUNK_SIZE, end)])
+    parser.close()
+
+    if not builder.processes:
+        print("No process found in the BPMN file.")
+        return None
 
-    return BPMNGraph(**graph_data)
+    node_ids = {node_id for node_id, _, _ in builder.nodes}
+    message_flows = [
+        flow for flow in builder.message_flows if flow[0] in node_ids and flow[1] in node_ids
+    ]
+    return CompactGraph.build(builder.nodes, builder.sequence_flows + message_flows)
+
+
+@lru_cache(maxsize=None)
+def get_parse_cache(directory: str) -> PickleDirCache:
+    return PickleDirCache(directory)
+
+
+def parse_cache_key(data) -> str:
+    """
+    Hash of the file content and the parser version.
+    """
+    digest = hashlib.blake2b(f"parse_bpmn:{PARSER_VERSION}:".encode(), digest_size=20)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def parse_bpmn_compact(file_path: str, cache_dir: str | None = None) -> Optional[CompactGraph]:
+    """
+    Stream the BPMN file into a compact graph. The flow nodes of all processes become nodes, sequence
+    flows and message flows between them become edges; lanes, data objects, annotations and
+    associations are ignored. Message flows from or to a pool instead of a flow node are dropped.
+    With `cache_dir`, graphs are looked up in and stored to a parse cache keyed by the file content.
+    """
+    with open(file_path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return _parse(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if not cache_dir:
+                return _parse(data)
+            cache = get_parse_cache(cache_dir)
+            key = parse_cache_key(data)
+            graph = cache.get(key)
+            if graph is None:
+                graph = _parse(data)
+                if graph is not None:
+                    cache.put(key, graph)
+            return graph
+
+
+def parse_cache_stats(cache_dir: str | None) -> dict | None:
+    """
+    Statistics of the parse cache, with the hits and misses of this process.
+    """
+    return get_parse_cache(cache_dir).stats() if cache_dir else None
+
+
+def parse_bpmn(file_path: str, cache_dir: str | None = None) -> Optional[BPMNGraph]:
+    graph = parse_bpmn_compact(file_path, cache_dir)
+    return graph.to_bpmn_graph() if graph is not None else None
 
 
 def display_graph_info(graph_data: BPMNGraph) -> None:
@@ -0,0 +1,220 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from itertools import count
+
+from compact_graph import CompactGraph
+
+# Minimum difflib ratio between canonical labels for a near-exact match
+DEFAULT_LABEL_SIMILARITY = 0.95
+
+# Minimum difflib ratio between two differing words of a near-exact match; words may also differ
+# by at most one character in length, so an added prefix such as "in" or "un" is never a typo
+WORD_SIMILARITY = 0.8
+
+# Names assigned locally start with this prefix, so they never collide with the LLM's letters
+LOCAL_NAME_PREFIX = "#"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def canonical_label(label: str) -> str:
+    """
+    Case-, whitespace- and punctuation-insensitive form of a label.
+    """
+    label = unicodedata.normalize("NFKC", label).casefold()
+    label = _PUNCTUATION.sub(" ", label)
+    return _WHITESPACE.sub(" ", label).strip()
+
+
+def graph_labels(graph: CompactGraph) -> list[str]:
+    """
+    Distinct node and edge labels of the graph in order of appearance.
+    """
+    return list(dict.fromkeys(name for name in graph.names + graph.edge_names if name))
+
+
+@dataclass
+class PreNormalization:
+    """
+    Result of the local pre-pass for one graph pair. `mapping` holds the local names of the labels
+    resolved locally, `representatives` the label each of them is sent to the LLM as, and
+    `unresolved` the labels without a counterpart (empty when the call can be skipped).
+    """
+
+    mapping: dict[str, str]
+    unresolved: set[str]
+    labels: int
+    representatives: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def needs_llm(self) -> bool:
+        return bool(self.unresolved)
+
+
+@dataclass
+class PreNormalizationStats:
+    pairs: int = 0
+    labels: int = 0
+    resolved_labels: int = 0
+    skipped_calls: int = 0
+
+    def add(self, pre_normalization: PreNormalization) -> None:
+        self.pairs += 1
+        self.labels += pre_normalization.labels
+        self.resolved_labels += pre_normalization.labels - len(pre_normalization.unresolved)
+        self.skipped_calls += not pre_normalization.needs_llm
+
+    def print(self) -> None:
+        if self.pairs:
+            print(
+                f"Pre-normalization: {self.resolved_labels}/{self.labels} labels resolved locally, "
+                f"{self.skipped_calls}/{self.pairs} LLM calls skipped"
+            )
+
+
+def spelling_variants(key1: str, key2: str) -> bool:
+    """
+    Whether two canonical labels have the same words up to typos: the same number of words, and
+    every word that differs is a close spelling of the word at the same position. A word present
+    in only one label, such as "not", rules the match out however long the rest of the label is.
+    """
+    words1 = key1.split(" ")
+    words2 = key2.split(" ")
+    if len(words1) != len(words2):
+        return False
+    for word1, word2 in zip(words1, words2):
+        if word1 == word2:
+            continue
+        if abs(len(word1) - len(word2)) > 1:
+            return False
+        if SequenceMatcher(None, word1, word2, autojunk=False).ratio() < WORD_SIMILARITY:
+            return False
+    return True
+
+
+def _near_matches(
+    keys1: list[str], keys2: list[str], label_similarity: float
+) -> list[tuple[str, str]]:
+    # Greedy one-to-one matching of the most similar canonical labels above the threshold
+    candidates = []
+    for key1 in keys1:
+        matcher = SequenceMatcher(None, b=key1, autojunk=False)
+        for key2 in keys2:
+            matcher.set_seq1(key2)
+            if matcher.real_quick_ratio() < label_similarity or matcher.quick_ratio() < label_similarity:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= label_similarity and spelling_variants(key1, key2):
+                candidates.append((-ratio, key1, key2))
+
+    matches = []
+    used1: set[str] = set()
+    used2: set[str] = set()
+    for _, key1, key2 in sorted(candidates):
+        if key1 not in used1 and key2 not in used2:
+            matches.append((key1, key2))
+            used1.add(key1)
+            used2.add(key2)
+    return matches
+
+
+def pre_normalize(
+    graph1: CompactGraph, graph2: CompactGraph, label_similarity: float | None = DEFAULT_LABEL_SIMILARITY
+) -> PreNormalization:
+    """
+    Match labels of the two graphs that are equal after canonicalization, or whose canonical forms
+    have a difflib ratio of at least `label_similarity` and differ only by typos within words
+    (`spelling_variants`), and give every match a local name.
+    Labels without a counterpart stay unresolved. While any label is unresolved the LLM is still
+    called, with each match sent as its first label, so that unresolved labels can be mapped onto
+    matched ones; the local names are only used when every label is matched.
+    `label_similarity=None` disables the pre-pass and leaves every label to the LLM.
+    """
+    labels1 = graph_labels(graph1)
+    labels2 = graph_labels(graph2)
+    labels = set(labels1) | set(labels2)
+    if label_similarity is None:
+        return PreNormalization(mapping={}, unresolved=labels, labels=len(labels))
+
+    groups1: dict[str, list[str]] = {}
+    for label in labels1:
+        groups1.setdefault(canonical_label(label), []).append(label)
+    groups2: dict[str, list[str]] = {}
+    for label in labels2:
+        groups2.setdefault(canonical_label(label), []).append(label)
+
+    matches = [(key, key) for key in groups1 if key in groups2]
+    if label_similarity < 1:
+        matches += _near_matches(
+            [key for key in groups1 if key not in groups2],
+            [key for key in groups2 if key not in groups1],
+            label_similarity,
+        )
+
+    mapping: dict[str, str] = {}
+    representatives: dict[str, str] = {}
+    local_names = count(1)
+    for key1, key2 in matches:
+        group = groups1[key1] + groups2[key2]
+        name = f"{LOCAL_NAME_PREFIX}{next(local_names)}"
+        for label in group:
+            if label not in mapping:
+                mapping[label] = name
+                representatives[label] = group[0]
+
+    return PreNormalization(
+        mapping=mapping,
+        unresolved=labels - mapping.keys(),
+        labels=len(labels),
+        representatives=representatives,
+    )
+
+
+def canonical_representatives(graphs: list[CompactGraph]) -> dict[str, str]:
+    """
+    Map every label of the graphs to the first label with the same canonical form.
+    """
+    first: dict[str, str] = {}
+    representatives: dict[str, str] = {}
+    for graph in graphs:
+        for label in graph_labels(graph):
+            representatives[label] = first.setdefault(canonical_label(label), label)
+    return representatives
+
+
+def relabel_graph(graph: CompactGraph, mapping: dict[str, str]) -> CompactGraph:
+    """
+    Copy of the graph with its node and edge labels replaced through `mapping`.
+    """
+    return CompactGraph(
+        ids=graph.ids,
+        types=graph.types,
+        names=tuple(mapping.get(name, name) if name else name for name in graph.names),
+        sources=graph.sources,
+        targets=graph.targets,
+        edge_names=tuple(mapping.get(name, name) if name else name for name in graph.edge_names),
+    )
+
+
+def add_pre_normalization_arguments(parser) -> None:
+    """
+    Add the local pre-normalization options shared by the command line tools.
+    """
+    parser.add_argument(
+        "--label-similarity",
+        type=float,
+        default=DEFAULT_LABEL_SIMILARITY,
+        help=f"Minimum string similarity for matching labels locally before calling the LLM; 1 matches only labels that differ in case, whitespace or punctuation (default: {DEFAULT_LABEL_SIMILARITY})",
+    )
+    parser.add_argument(
+        "--no-pre-normalization",
+        action="store_true",
+        help="Do not match labels locally before calling the LLM.",
+    )
+
+
+def label_similarity_from_args(args) -> float | None:
+    return None if args.no_pre_normalization else args.label_similarity
@@ -0,0 +1,211 @@
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from instrumentation import reset_peak_rss
+
+DEFAULT_WORKERS = 4
+
+
+class TaskLimitError(RuntimeError):
+    """
+    A task exceeded its time or memory limit, or its worker process died.
+    """
+
+
+# Workers are started through a fork server where the platform has one. Forking the main process,
+# which runs the event loop and helper threads, could copy locks held by those threads into a worker.
+# The price is that tasks and results are pickled and every new worker imports the main module once;
+# workers are persistent, so this is paid per worker and not per task.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+
+
+def _serve(connection, memory_limit: int | None) -> None:
+    # Entry point of a worker process: runs (fn, args) tasks received through the pipe until it is
+    # closed and reports ("result" | "memory" | "error", value) for each
+    if memory_limit:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    while True:
+        try:
+            fn, args = connection.recv()
+        except EOFError:
+            break
+        except Exception as e:
+            connection.send(("error", f"Unable to load task: {type(e).__name__}: {e}"))
+            continue
+        reset_peak_rss()
+        try:
+            message = ("result", fn(args))
+        except MemoryError:
+            message = ("memory", f"memory limit of {memory_limit / 2**20:g} MB exceeded")
+        except Exception as e:
+            message = ("error", f"{type(e).__name__}: {e}")
+        del fn, args
+        try:
+            connection.send(message)
+        except Exception as e:
+            connection.send(("error", f"Unable to send result: {type(e).__name__}: {e}"))
+    connection.close()
+
+
+class _Worker:
+    """
+    A persistent worker process and the parent's end of its pipe.
+    """
+
+    def __init__(self, context, memory_limit: int | None):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, memory_limit), daemon=True)
+        self.process.start()
+        child.close()
+
+    def call(self, fn: Callable[[Any], Any], args: Any, time_limit: float | None) -> tuple[str, Any]:
+        # Runs in a helper thread; killing the process closes the pipe, which also ends a waiting call
+        self.connection.send((fn, args))
+        if not self.connection.poll(time_limit):
+            raise TaskLimitError(f"time limit of {time_limit:g} s exceeded")
+        try:
+            return self.connection.recv()
+        except EOFError:
+            self.process.join()
+            raise TaskLimitError(f"worker process exited with code {self.process.exitcode}") from None
+
+    def stop(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class Scheduler:
+    """
+    Runs CPU-bound tasks in a pool of `workers` persistent worker processes. Pending tasks are
+    dispatched largest estimated cost first (LPT), so that expensive pairs do not start last and
+    dominate the wall-clock time. A worker that runs a task longer than `time_limit` seconds is
+    killed; `memory_limit` caps the address space of every worker in bytes. Only workers that hit a
+    limit or die are replaced, by a fresh process started for the next task. A task that hits a limit
+    is retried once with its fallback arguments (e.g. a cheaper GED engine).
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        time_limit: float | None = None,
+        memory_limit: int | None = None,
+    ):
+        self.workers = workers
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.context = multiprocessing.get_context(START_METHOD)
+        self.sequence = itertools.count()
+        self.queue: asyncio.PriorityQueue | None = None
+        self.runners: list[asyncio.Task] = []
+        self.pool: list[_Worker | None] = []
+        # Threads only start workers and wait on their pipes
+        self.threads = ThreadPoolExecutor(max_workers=workers)
+
+    async def __aenter__(self) -> "Scheduler":
+        self.queue = asyncio.PriorityQueue()
+        self.pool = [None] * self.workers
+        self.runners = [asyncio.create_task(self._runner(slot)) for slot in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        for runner in self.runners:
+            runner.cancel()
+        await asyncio.gather(*self.runners, return_exceptions=True)
+        for slot in range(len(self.pool)):
+            self._retire(slot)
+        self.threads.shutdown()
+
+    async def submit(
+        self, fn: Callable[[Any], Any], args: Any, cost: float = 0.0, fallback_args: Any = None
+    ) -> Any:
+        """
+        Queue `fn(args)` with its estimated cost and wait for the result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((-cost, next(self.sequence), fn, args, fallback_args, future))
+        return await future
+
+    async def _runner(self, slot: int) -> None:
+        while True:
+            _, _, fn, args, fallback_args, future = await self.queue.get()
+            try:
+                try:
+                    result = await self._run(slot, fn, args)
+                except TaskLimitError as e:
+                    if fallback_args is None:
+                        raise
+                    print(f"Task stopped ({e}), retrying with fallback")
+                    result = await self._run(slot, fn, fallback_args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    def _retire(self, slot: int) -> None:
+        worker, self.pool[slot] = self.pool[slot], None
+        if worker is not None:
+            worker.stop()
+
+    async def _run(self, slot: int, fn: Callable[[Any], Any], args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        worker = self.pool[slot]
+        if worker is None or not worker.process.is_alive():
+            self._retire(slot)
+            worker = self.pool[slot] = await loop.run_in_executor(
+                self.threads, _Worker, self.context, self.memory_limit
+            )
+        try:
+            kind, value = await loop.run_in_executor(self.threads, worker.call, fn, args, self.time_limit)
+        except BaseException:
+            # The worker may still be running the task, or hold half a message in its pipe
+            self._retire(slot)
+            raise
+
+        if kind == "memory":
+            # A worker that ran out of memory may be left fragmented, so the next task gets a fresh one
+            self._retire(slot)
+            raise TaskLimitError(value)
+        if kind == "error":
+            raise RuntimeError(value)
+        return value
+
+
+def add_scheduler_arguments(parser) -> None:
+    """
+    Add the worker pool options shared by the folder tools.
+    """
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Number of parallel worker processes (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--task-timeout",
+        type=float,
+        default=None,
+        help="Kill a worker process after it spent this many seconds on one task (default: no limit)",
+    )
+    parser.add_argument(
+        "--task-memory",
+        type=float,
+        default=None,
+        help="Address space limit of every worker process in MB (default: no limit)",
+    )
+
+
+def scheduler_from_args(args) -> Scheduler:
+    return Scheduler(
+        workers=args.workers,
+        time_limit=args.task_timeout,
+        memory_limit=int(args.task_memory * 2**20) if args.task_memory else None,
+    )
@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import csv
+import math
+from pathlib import Path
+
+import numpy as np
+
+from cache import (
+    GED_TABLE,
+    NORMALIZATION_TABLE,
+    add_ged_cache_arguments,
+    add_normalization_cache_arguments,
+    add_parse_cache_arguments,
+    cache_stats,
+    ged_cache_path,
+    normalization_cache_path,
+    parse_cache_dir,
+    print_cache_stats,
+)
+from compact_graph import CompactGraph
+from ged import (
+    DEFAULT_TIME_BUDGET,
+    GED_ENGINES,
+    compare_graphs,
+    empty_graph_cost,
+    estimate_ged_cost,
+    identical_graphs,
+    lower_bound,
+)
+from fingerprint import wl_fingerprint
+from normalize_bpmn import TokenUsage, add_corpus_normalization_arguments, request_corpus_mapping
+from parse_bpmn import parse_bpmn_compact, parse_cache_stats
+from scheduler import Scheduler, add_scheduler_arguments, scheduler_from_args
+
+# Pairs per worker task; every task is pickled to a worker process and back, so single pairs would mostly measure that round trip
+DEFAULT_CHUNK_SIZE = 32
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compute the pairwise similarity matrix of all BPMN files in a directory"
+    )
+    parser.add_argument("model_dir", type=str, help="Directory with the BPMN files")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="similarity_matrix.npy",
+        help="Output file: a dense .npy matrix (with a .files.txt list of the rows) or a .csv edge list (default: similarity_matrix.npy)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Only compute pairs whose similarity can reach this value; pruned pairs are NaN in the matrix and missing from the edge list",
+    )
+    parser.add_argument(
+        "--ged-engine",
+        choices=GED_ENGINES,
+        default="bipartite",
+        help="GED engine (default: bipartite, the exact engines are only practical for small corpora)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=DEFAULT_TIME_BUDGET,
+        help=f"Seconds the exact GED search may run per pair (default: {DEFAULT_TIME_BUDGET:g})",
+    )
+    parser.add_argument(
+        "--fallback-engine",
+        choices=GED_ENGINES + ("none",),
+        default="bipartite",
+        help="GED engine used to retry a chunk whose worker hit --task-timeout or --task-memory (default: bipartite)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Pairs compared by one worker task (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--no-normalization",
+        action="store_true",
+        help="Do not call the LLM; only labels that differ in case, whitespace or punctuation are matched.",
+    )
+    add_corpus_normalization_arguments(parser)
+    add_normalization_cache_arguments(parser)
+    add_parse_cache_arguments(parser)
+    add_ged_cache_arguments(parser)
+    add_scheduler_arguments(parser)
+    return parser.parse_args()
+
+
+def max_similarity(graph1: CompactGraph, graph2: CompactGraph) -> float:
+    """
+    Upper bound on the similarity of two graphs, from the label multiset lower bound on their GED.
+    """
+    denominator = empty_graph_cost(graph1) + empty_graph_cost(graph2)
+    return 1 - lower_bound(graph1, graph2) / denominator if denominator else 1.0
+
+
+def compare_chunk(args: dict) -> list[tuple[int, int, float, float, bool]]:
+    # Runs in a worker process: (i, j, ged, similarity, optimal) for every pair of the chunk
+    graphs = args["graphs"]
+    results = []
+    for i, j in args["pairs"]:
+        comparison = compare_graphs(
+            graphs[i], graphs[j], args["ged_engine"], args["time_budget"], ged_cache=args["ged_cache"]
+        )
+        results.append((i, j, comparison.ged, comparison.similarity, comparison.optimal))
+    return results
+
+
+async def compare_pairs(
+    graphs: list[CompactGraph],
+    pairs: list[tuple[int, int]],
+    ged_engine: str,
+    time_budget: float,
+    scheduler: Scheduler,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    fallback_engine: str | None = "bipartite",
+    ged_cache: str | None = None,
+) -> list[tuple[int, int, float, float, bool]]:
+    """
+    Compare the given pairs in chunks of similar cost, the most expensive chunks first.
+    Pairs of a chunk that fails are reported and left out of the results.
+    """
+    costs = {pair: estimate_ged_cost(graphs[pair[0]], graphs[pair[1]], ged_engine) for pair in pairs}
+    ordered = sorted(pairs, key=costs.__getitem__, reverse=True)
+    chunks = [ordered[start : start + chunk_size] for start in range(0, len(ordered), chunk_size)]
+    completed = 0
+
+    async def run(chunk: list[tuple[int, int]]) -> list[tuple[int, int, float, float, bool]]:
+        nonlocal completed
+        indices = {index for pair in chunk for index in pair}
+        args = {
+            "graphs": {index: graphs[index] for index in indices},
+            "pairs": chunk,
+            "ged_engine": ged_engine,
+            "time_budget": time_budget,
+            "ged_cache": ged_cache,
+        }
+        fallback_args = (
+            {**args, "ged_engine": fallback_engine}
+            if fallback_engine and fallback_engine != ged_engine else None
+        )
+        # Costs are logarithmic; the chunk cost is the log of the summed pair costs
+        cost = float(np.logaddexp.reduce([costs[pair] for pair in chunk]))
+        try:
+            results = await scheduler.submit(compare_chunk, args, cost, fallback_args)
+        except Exception as e:
+            print(f"Error comparing {len(chunk)} pairs: {str(e)}")
+            results = []
+        completed += len(chunk)
+        print(f"[{completed}/{len(pairs)}] pairs compared")
+        return results
+
+    async with scheduler:
+        chunk_results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+    return [result for results in chunk_results for result in results]
+
+
+def write_matrix(output_file: str, filenames: list[str], matrix: np.ndarray) -> None:
+    # np.save appends .npy to other names; the printed path and the row list follow the saved file
+    if not output_file.endswith(".npy"):
+        output_file += ".npy"
+    np.save(output_file, matrix)
+    names_file = Path(output_file).with_suffix(".files.txt")
+    names_file.write_text("".join(f"{filename}\n" for filename in filenames))
+    print(f"Matrix saved to: {output_file} (rows: {names_file})")
+
+
+def write_edge_list(
+    output_file: str,
+    filenames: list[str],
+    matrix: np.ndarray,
+    geds: np.ndarray,
+    optimal: np.ndarray,
+    threshold: float | None,
+) -> None:
+    with open(output_file, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["file_1", "file_2", "ged", "similarity", "optimal"])
+        for i, j in zip(*np.triu_indices(len(filenames), k=1)):
+            similarity = matrix[i, j]
+            if math.isnan(similarity) or (threshold is not None and similarity < threshold):
+                continue
+            writer.writerow([filenames[i], filenames[j], geds[i, j], round(float(similarity), 5), optimal[i, j]])
+    print(f"Edge list saved to: {output_file}")
+
+
+def main() -> None:
+    args = parse_arguments()
+    cache_path = normalization_cache_path(args)
+    parse_cache = parse_cache_dir(args)
+    parse_stats_before = parse_cache_stats(parse_cache)
+    stats_before = cache_stats(cache_path, NORMALIZATION_TABLE)
+    ged_cache = ged_cache_path(args)
+    ged_stats_before = cache_stats(ged_cache, GED_TABLE)
+
+    filenames = []
+    graphs = []
+    for path in sorted(Path(args.model_dir).glob("*.bpmn")):
+        try:
+            graph = parse_bpmn_compact(str(path), parse_cache)
+        except Exception as e:
+            graph = None
+            print(f"Error parsing {path.name}: {str(e)}")
+        if graph is not None:
+            filenames.append(path.name)
+            graphs.append(graph)
+    if len(graphs) < 2:
+        raise SystemExit("At least two BPMN files are needed for a similarity matrix.")
+
+    # One vocabulary for the whole corpus instead of one normalization per pair
+    usage = TokenUsage()
+    name_mapping = request_corpus_mapping(
+        graphs, cache_path, args.cache_only, usage, use_llm=not args.no_normalization, corpus_tokens=args.corpus_tokens
+    )
+    graphs = [graph.normalize(name_mapping) for graph in graphs]
+
+    # Isomorphic graphs are compared once; `unique[k]` lists the files with the k-th distinct graph.
+    # Graphs are grouped by fingerprint, and an isomorphism test confirms every match.
+    by_fingerprint: dict[str, list[int]] = {}
+    unique: list[list[int]] = []
+    for index, graph in enumerate(graphs):
+        candidates = by_fingerprint.setdefault(wl_fingerprint(graph), [])
+        for k in candidates:
+            if identical_graphs(graphs[unique[k][0]], graph):
+                unique[k].append(index)
+                break
+        else:
+            candidates.append(len(unique))
+            unique.append([index])
+    unique_graphs = [graphs[members[0]] for members in unique]
+
+    # GED is symmetric, so only pairs i < j are computed
+    pairs = []
+    pruned = 0
+    for i in range(len(unique_graphs)):
+        for j in range(i + 1, len(unique_graphs)):
+            if args.threshold is not None and max_similarity(unique_graphs[i], unique_graphs[j]) < args.threshold:
+                pruned += 1
+            else:
+                pairs.append((i, j))
+    print(
+        f"{len(graphs)} models, {len(unique_graphs)} distinct graphs: "
+        f"{len(pairs)} pairs to compare, {pruned} pruned by the threshold"
+    )
+
+    results = asyncio.run(
+        compare_pairs(
+            unique_graphs,
+            pairs,
+            args.ged_engine,
+            args.time_budget,
+            scheduler_from_args(args),
+            args.chunk_size,
+            None if args.fallback_engine == "none" else args.fallback_engine,
+            ged_cache,
+        )
+    )
+
+    size = len(graphs)
+    matrix = np.full((size, size), np.nan)
+    geds = np.full((size, size), np.nan)
+    optimal = np.zeros((size, size), dtype=bool)
+    for members in unique:
+        rows = np.array(members)
+        matrix[np.ix_(rows, rows)] = 1.0
+        geds[np.ix_(rows, rows)] = 0.0
+        optimal[np.ix_(rows, rows)] = True
+    for i, j, ged, similarity, is_optimal in results:
+        rows, columns = np.array(unique[i]), np.array(unique[j])
+        for target in (np.ix_(rows, columns), np.ix_(columns, rows)):
+            matrix[target] = similarity
+            geds[target] = ged
+            optimal[target] = is_optimal
+
+    if args.output.endswith(".csv"):
+        write_edge_list(args.output, filenames, matrix, geds, optimal, args.threshold)
+    else:
+        write_matrix(args.output, filenames, matrix)
+    print_cache_stats("Parse", parse_stats_before, parse_cache_stats(parse_cache))
+    print_cache_stats("Normalization", stats_before, cache_stats(cache_path, NORMALIZATION_TABLE))
+    print_cache_stats("GED", ged_stats_before, cache_stats(ged_cache, GED_TABLE))
+    usage.print()
+
+
+if __name__ == "__main__":
+    main()
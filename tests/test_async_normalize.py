@@ -0,0 +1,195 @@
+import asyncio
+import json
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from async_normalize import AsyncNormalizer
+from cache import NORMALIZATION_TABLE, cache_stats
+from compact_graph import CompactGraph
+from normalize_bpmn import BATCH_PROMPT
+
+
+class StubServer:
+    """
+    Local OpenAI-compatible chat completions endpoint. Every request is answered by the next entry
+    of `script` that matches its prompt ("single" or "batch"), or with a valid mapping once the
+    script is exhausted. Script entries are a status code, or "malformed" for a batch response
+    that misses a pair.
+    """
+
+    def __init__(self, script=(), delay: float = 0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, payload, headers = server.respond(body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def respond(self, body: dict):
+        kind = "batch" if body["messages"][0]["content"] == BATCH_PROMPT else "single"
+        with self.lock:
+            self.requests.append(kind)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            entry = next((entry for entry in self.script if entry[0] == kind), None)
+            if entry is not None:
+                self.script.remove(entry)
+        try:
+            time.sleep(self.delay)
+            payload = json.loads(body["messages"][1]["content"])
+            if entry is not None and isinstance(entry[1], int):
+                error = {"error": {"message": "stub error", "type": "stub", "code": None}}
+                return entry[1], error, {"Retry-After": "0"}
+            if kind == "single":
+                content = {"name_mappings": letters(payload["labels"])}
+            else:
+                pairs = [
+                    {"pair_id": pair["pair_id"], "name_mappings": letters(pair["labels"])}
+                    for pair in payload["pairs"]
+                ]
+                content = {"pairs": pairs[:-1] if entry is not None else pairs}
+            return 200, completion(json.dumps(content)), {}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def letters(labels: list[str]) -> list[dict]:
+    # Labels with the same first word get the same letter
+    names: dict[str, str] = {}
+    return [
+        {"handle": handle, "normalized_name": names.setdefault(label.split()[0], string.ascii_uppercase[len(names)])}
+        for handle, label in enumerate(labels)
+    ]
+
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content, "refusal": None},
+            }
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+def pair(index: int) -> tuple[CompactGraph, CompactGraph, str]:
+    graph1 = CompactGraph.build(
+        [("a", "task", f"Receive order {index}"), ("b", "task", f"Ship goods {index}")], [("a", "b", None)]
+    )
+    graph2 = CompactGraph.build(
+        [("a", "task", f"Receive request {index}"), ("b", "task", f"Deliver parcel {index}")], [("a", "b", None)]
+    )
+    return graph1, graph2, f"pair_{index}.bpmn"
+
+
+def normalize(server: StubServer, pairs, **options) -> dict:
+    async def run():
+        normalizer = AsyncNormalizer(
+            base_url=server.base_url, requests_per_minute=60000, label_similarity=None, **options
+        )
+        async with normalizer:
+            results = {index: result async for index, result, _, _ in normalizer.normalize_pairs(pairs)}
+        return normalizer, results
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    # Normalized graphs are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.delenv("OPENAI_BASE_URL", raising=False)
+
+
+def test_rate_limit_and_server_errors_are_retried():
+    with StubServer(script=[("single", 429), ("single", 503)]) as server:
+        normalizer, results = normalize(server, [pair(0)], max_retries=3)
+
+    assert server.requests == ["single"] * 3
+    assert normalizer.requests == 1
+    graph1, graph2 = results[0]
+    assert graph1.normalized_names == ("A", "B")
+    assert graph2.normalized_names == ("A", "C")
+
+
+def test_retries_are_bounded():
+    with StubServer(script=[("single", 429)] * 3) as server:
+        _, results = normalize(server, [pair(0)], max_retries=1)
+
+    assert server.requests == ["single"] * 2
+    assert isinstance(results[0], Exception)
+
+
+def test_malformed_batch_is_split_and_results_are_cached(tmp_path):
+    cache_path = str(tmp_path / "normalization.sqlite")
+    pairs = [pair(i) for i in range(2)]
+    with StubServer(script=[("batch", "malformed")]) as server:
+        _, results = normalize(server, pairs, cache_path=cache_path, batch_tokens=100000)
+
+    assert server.requests == ["batch", "single", "single"]
+    assert all(not isinstance(result, Exception) for result in results.values())
+
+    # A cache-only run finds every mapping without calling the API
+    with StubServer() as server:
+        _, cached = normalize(server, pairs, cache_path=cache_path, cache_only=True)
+    assert server.requests == []
+    for index, (graph1, graph2) in cached.items():
+        assert graph1.normalized_names == results[index][0].normalized_names
+        assert graph2.normalized_names == results[index][1].normalized_names
+    stats = cache_stats(cache_path, NORMALIZATION_TABLE)
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+
+
+def test_concurrent_requests_are_bounded():
+    with StubServer(delay=0.1) as server:
+        _, results = normalize(server, [pair(i) for i in range(6)], max_in_flight=2)
+
+    assert len(server.requests) == 6
+    assert server.max_in_flight == 2
+    assert all(not isinstance(result, Exception) for result in results.values())
+
@@ -0,0 +1,42 @@
+import sys
+
+import pytest
+
+import parse_bpmn
+
+BPMN = b"""<?xml version="1.0" encoding="UTF-8"?>
+<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL"
+    xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI" id="Definitions_1">
+  <bpmn:process id="Process_1">
+    <bpmn:startEvent id="Start" name="Order &amp; invoice received" />
+    <bpmn:task id="Task" name="Check &amp; approve &lt;order&gt; &#38; &quot;invoice&quot;" />
+    <bpmn:sequenceFlow id="Flow" sourceRef="Start" targetRef="Task" name="R&amp;D" />
+  </bpmn:process>
+  <bpmndi:BPMNDiagram id="Diagram_1" />
+</bpmn:definitions>
+"""
+
+
+def parse(path, use_lxml):
+    if use_lxml:
+        pytest.importorskip("lxml")
+        return parse_bpmn.parse_bpmn_compact(str(path))
+    with pytest.MonkeyPatch.context() as patch:
+        # A None entry in sys.modules makes `from lxml import etree` raise ImportError
+        patch.setitem(sys.modules, "lxml", None)
+        return parse_bpmn.parse_bpmn_compact(str(path))
+
+
+def test_escaped_labels_match_on_lxml_and_stdlib_parsers(tmp_path):
+    path = tmp_path / "model.bpmn"
+    path.write_bytes(BPMN)
+
+    with_lxml = parse(path, use_lxml=True).to_bpmn_graph()
+    with_stdlib = parse(path, use_lxml=False).to_bpmn_graph()
+
+    assert with_lxml == with_stdlib
+    assert [node.name for node in with_lxml.nodes] == [
+        "Order & invoice received",
+        'Check & approve <order> & "invoice"',
+    ]
+    assert [edge.name for edge in with_lxml.edges] == ["R&D"]
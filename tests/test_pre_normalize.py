@@ -0,0 +1,25 @@
+from compact_graph import CompactGraph
+from pre_normalize import pre_normalize, spelling_variants
+
+
+def graph(*labels: str) -> CompactGraph:
+    return CompactGraph.build([(str(i), "task", label) for i, label in enumerate(labels)], [])
+
+
+def test_labels_differing_by_a_word_are_not_merged():
+    approved = "Check whether the supplier invoice for the quarterly order is approved"
+    rejected = "Check whether the supplier invoice for the quarterly order is not approved"
+    result = pre_normalize(graph(approved), graph(rejected))
+
+    assert result.mapping == {}
+    assert result.unresolved == {approved, rejected}
+    assert not spelling_variants("validate the customer order", "invalidate the customer order")
+
+
+def test_misspelled_labels_are_merged():
+    result = pre_normalize(graph("Recieve customer order", "Ship goods"), graph("Receive customer order", "ship  goods!"))
+
+    assert not result.needs_llm
+    assert result.mapping["Recieve customer order"] == result.mapping["Receive customer order"]
+    assert result.mapping["Ship goods"] == result.mapping["ship  goods!"]
+    assert result.mapping["Recieve customer order"] != result.mapping["Ship goods"]